@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+SectoolBox Archive Listing Test Script
+Tests ZIP listings read from the central directory, without a running server
+"""
+import functools
+import io
+import os
+import struct
+import sys
+import tempfile
+import zipfile
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+import archives
+from archives import analyze_archive_path, list_archive
+from security import SecurityConfig
+
+
+def archive_tree_of(data):
+    """analyze_archive_path result for the given file contents"""
+    with tempfile.NamedTemporaryFile(delete=False) as f:
+        f.write(data)
+    try:
+        return analyze_archive_path(f.name)
+    finally:
+        os.unlink(f.name)
+
+
+def listing_of(data):
+    """list_archive result for the given file contents"""
+    with tempfile.NamedTemporaryFile(delete=False) as f:
+        f.write(data)
+    try:
+        return list_archive(f.name)
+    finally:
+        os.unlink(f.name)
+
+
+def zip64_archive(members):
+    """A stored ZIP whose sizes, offsets and counts are all in ZIP64 records"""
+    body = b''
+    directory = b''
+    for name, data in members:
+        name = name.encode()
+        crc = zlib.crc32(data)
+        extra = struct.pack('<2H3Q', 0x0001, 24, len(data), len(data), len(body))
+        directory += struct.pack('<4s4B4HL2L5H2L', b'PK\x01\x02', 45, 3, 45, 0, 0, 0, 0, 0x21,
+                                 crc, 0xFFFFFFFF, 0xFFFFFFFF, len(name), len(extra), 0, 0, 0, 0,
+                                 0xFFFFFFFF) + name + extra
+        body += struct.pack('<4s5H3L2H', b'PK\x03\x04', 45, 0, 0, 0, 0x21, crc,
+                            len(data), len(data), len(name), 0) + name + data
+    record = struct.pack('<4sQ2H2L4Q', b'PK\x06\x06', 44, 45, 45, 0, 0,
+                         len(members), len(members), len(directory), len(body))
+    locator = struct.pack('<4sLQL', b'PK\x06\x07', 0, len(body) + len(directory), 1)
+    end = struct.pack('<4s4H2LH', b'PK\x05\x06', 0, 0, 0xFFFF, 0xFFFF, 0xFFFFFFFF, 0xFFFFFFFF, 0)
+    return body + directory + record + locator + end
+
+
+def small_zip():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('readme.txt', b'hello ' * 100)
+        archive.writestr('docs/', b'')
+    return buffer.getvalue()
+
+
+def test_zip64_listing():
+    """Sizes and counts are read from the ZIP64 extra fields and end record"""
+    print("\n=== Testing ZIP64 Listing ===")
+    data = zip64_archive([('first.bin', b'A' * 300), ('second.bin', b'B' * 700)])
+    assert zipfile.ZipFile(io.BytesIO(data)).namelist() == ['first.bin', 'second.bin']
+    listing = listing_of(data)
+    print(f"Listing: {listing}")
+    assert listing["archive"] == 'zip'
+    assert listing["entry_count"] == 2
+    assert [(entry["name"], entry["size"], entry["compressed_size"]) for entry in listing["entries"]] == [
+        ('first.bin', 300, 300), ('second.bin', 700, 700)
+    ]
+    assert listing["warnings"] == []
+    assert not listing["bomb"]
+    print("✅ ZIP64 archive listed")
+    return True
+
+
+def test_prepended_data():
+    """Archives behind a self-extractor stub are listed with their offsets shifted"""
+    print("\n=== Testing Prepended Data ===")
+    stub = b'MZ' + b'\x90' * 4094
+    for data in (stub + small_zip(), stub + zip64_archive([('payload.bin', b'C' * 500)])):
+        assert zipfile.ZipFile(io.BytesIO(data)).testzip() is None
+        listing = listing_of(data)
+        print(f"Listing: {listing}")
+        assert listing is not None and listing["archive"] == 'zip'
+        assert listing["entry_count"] == len(zipfile.ZipFile(io.BytesIO(data)).namelist())
+        assert listing["warnings"] == []
+        assert not listing["bomb"]
+    print("✅ Prepended archives listed")
+    return True
+
+
+def test_overlapping_members():
+    """Central directory entries sharing one member's data mark a bomb"""
+    print("\n=== Testing Overlapping Members ===")
+    data = small_zip()
+    end = data.rfind(b'PK\x05\x06')
+    start = data.find(b'PK\x01\x02')
+    first_entry = data[start:data.find(b'PK\x01\x02', start + 4)]
+    name_length = struct.unpack_from('<H', first_entry, 28)[0]
+    copies = [first_entry[:46] + f'copy{n:06d}'.encode()[:name_length] + first_entry[46 + name_length:]
+              for n in range(3)]
+    directory = data[start:end] + b''.join(copies)
+    record = bytearray(data[end:])
+    struct.pack_into('<2HL', record, 8, 5, 5, len(directory))
+    listing = listing_of(data[:start] + directory + bytes(record))
+    print(f"Listing: {listing}")
+    assert listing["entry_count"] == 5
+    assert listing["bomb"]
+    assert "3 members overlap another member's data" in listing["warnings"]
+    print("✅ Overlapping members detected")
+    return True
+
+
+def test_short_zip64_extra_field():
+    """A ZIP64 extra field claiming more bytes than the entry carries is ignored"""
+    print("\n=== Testing Short ZIP64 Extra Field ===")
+    data = small_zip()
+    start = data.find(b'PK\x01\x02')
+    end = data.rfind(b'PK\x05\x06')
+    entry = bytearray(data[start:data.find(b'PK\x01\x02', start + 4)])
+    name_length = struct.unpack_from('<H', entry, 28)[0]
+    # The ZIP64 field header says 16 bytes follow, but the extra field ends there
+    extra = struct.pack('<2H', 0x0001, 16)
+    struct.pack_into('<H', entry, 30, len(extra))
+    entry = bytes(entry[:46 + name_length]) + extra
+    directory = entry + data[data.find(b'PK\x01\x02', start + 4):end]
+    record = bytearray(data[end:])
+    struct.pack_into('<L', record, 12, len(directory))
+    listing = listing_of(data[:start] + directory + bytes(record))
+    print(f"Listing: {listing}")
+    assert listing["entry_count"] == 2
+    assert listing["entries"][0]["name"] == 'readme.txt'
+    assert listing["entries"][0]["size"] == 600
+    print("✅ Short extra field ignored")
+    return True
+
+
+def test_listing_limits():
+    """Directories with more entries or bytes than the listing budget are read partially"""
+    print("\n=== Testing Listing Limits ===")
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for index in range(50):
+            archive.writestr(f'file{index:02d}.txt', b'')
+    data = buffer.getvalue()
+
+    limits = SecurityConfig.MAX_LISTING_ENTRIES, SecurityConfig.MAX_LISTING_DIRECTORY_SIZE
+    try:
+        SecurityConfig.MAX_LISTING_ENTRIES = 10
+        listing = listing_of(data)
+        print(f"Entry limit: {listing['entry_count']} entries, {listing['warnings']}")
+        assert listing["entry_count"] == 10
+        assert listing["warnings"] == ["Listing stopped after 10 entries"]
+
+        SecurityConfig.MAX_LISTING_ENTRIES = limits[0]
+        SecurityConfig.MAX_LISTING_DIRECTORY_SIZE = 20 * 56  # 46-byte entry headers, 10-byte names
+        listing = listing_of(data)
+        print(f"Directory limit: {listing['entry_count']} entries, {listing['warnings']}")
+        assert listing["entry_count"] == 20
+        assert listing["warnings"] == ["Listing stopped after 20 entries"]
+    finally:
+        SecurityConfig.MAX_LISTING_ENTRIES, SecurityConfig.MAX_LISTING_DIRECTORY_SIZE = limits
+    assert listing_of(data)["entry_count"] == 50
+    print("✅ Listing limits applied")
+    return True
+
+
+def test_solid_seven_zip():
+    """Members of a solid 7z are analyzed in one pass and cut off at the byte budget"""
+    print("\n=== Testing Solid 7z Archive ===")
+    if archives.py7zr is None:
+        print("⚠️ py7zr not installed, skipping")
+        return True
+    nested = io.BytesIO()
+    with zipfile.ZipFile(nested, 'w') as archive:
+        archive.writestr('deep.txt', b'flag{nested}')
+    buffer = io.BytesIO()
+    with archives.py7zr.SevenZipFile(buffer, 'w') as archive:
+        archive.writestr(nested.getvalue(), 'nested.zip')
+        for index in range(5):
+            archive.writestr(bytes([index]) * 1000, f'part{index}.bin')
+    data = buffer.getvalue()
+
+    tree = archive_tree_of(data)
+    names = [member['name'] for member in tree['members']]
+    print(f"Members: {names}, {tree['bytes_analyzed']} bytes")
+    assert names == ['nested.zip'] + [f'part{index}.bin' for index in range(5)]
+    assert tree['members'][0]['members'][0]['strings_sample'] == ['flag{nested}']
+    assert [member['size'] for member in tree['members'][1:]] == [1000] * 5
+    assert tree['limits_reached'] == []
+
+    budget = archives.ArchiveBudget
+    try:
+        archives.ArchiveBudget = functools.partial(budget, max_bytes=tree['bytes_analyzed'] - 2500)
+        tree = archive_tree_of(data)
+    finally:
+        archives.ArchiveBudget = budget
+    sizes = [(member['size'], member['truncated']) for member in tree['members'][1:]]
+    print(f"Byte limit: {sizes}, {tree['limits_reached']}")
+    assert sizes == [(1000, False), (1000, False), (500, True)]
+    assert tree['limits_reached'] == ['bytes']
+    print("✅ Solid 7z members analyzed within the byte budget")
+    return True
+
+
+def test_not_an_archive():
+    """Data that only happens to contain an end record signature is not listed"""
+    print("\n=== Testing Non-Archive Data ===")
+    data = os.urandom(4096) + b'PK\x05\x06' + os.urandom(64)
+    assert listing_of(data) is None
+    assert listing_of(b'plain text, no archive here') is None
+    print("✅ Non-archive data ignored")
+    return True
+
+
+def main():
+    """Main test function"""
+    print("Testing SectoolBox archive listings")
+    print("=" * 80)
+
+    results = {}
+    results["ZIP64 Listing"] = test_zip64_listing()
+    results["Prepended Data"] = test_prepended_data()
+    results["Overlapping Members"] = test_overlapping_members()
+    results["Short ZIP64 Extra Field"] = test_short_zip64_extra_field()
+    results["Listing Limits"] = test_listing_limits()
+    results["Solid 7z Archive"] = test_solid_seven_zip()
+    results["Non-Archive Data"] = test_not_an_archive()
+
+    print("\n" + "=" * 80)
+    print("TEST RESULTS SUMMARY")
+    print("=" * 80)
+
+    all_passed = True
+    for test_name, passed in results.items():
+        status = "✅ PASSED" if passed else "❌ FAILED"
+        print(f"{test_name}: {status}")
+        if not passed:
+            all_passed = False
+
+    print("\nOVERALL RESULT:", "✅ ALL TESTS PASSED" if all_passed else "❌ SOME TESTS FAILED")
+    print("=" * 80)
+
+    return 0 if all_passed else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,434 @@
+"""
+Streaming file analysis engine for SectoolBox
+"""
+import mmap
+import os
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+
+import numpy as np
+
+from carving import SignatureScanner, carve_file, drop_nested
+from entropy import ByteHistogram, EntropyProfile, RandomnessTests, entropy_regions
+from filetype import detect_mime_type
+from formats import validate_structure
+from hashing import MultiHasher, DEFAULT_DIGESTS, hash_bytes
+from iocs import IOCScanner, MAX_IOC_LENGTH, merge_iocs
+from metadata import exif_summary, read_metadata, read_metadata_bytes
+from security import SecurityConfig, SecurityValidator, ScriptContentScanner
+from strings import StringExtractor, MAX_RUN_BYTES
+
+# Bump whenever the report produced by analyze_path changes, so cached
+# reports from older pipelines are not served
+ANALYZER_VERSION = "12"
+
+# Size of the blocks read from an upload and fed through the analyzers
+ANALYSIS_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+# Leading bytes kept in memory for MIME sniffing and header checks
+HEADER_SIZE = 64 * 1024
+
+# Leading bytes kept in a report for SecurityValidator.validate_file_summary
+VALIDATION_HEADER_SIZE = 1024
+
+# Most strings returned with an analysis; the count covers all of them
+MAX_REPORTED_STRINGS = 1000
+
+# Files are split into segments of at least this size for parallel analysis
+MIN_SEGMENT_SIZE = 16 * 1024 * 1024
+
+# Bytes read on either side of a segment so strings and script patterns
+# crossing its edges are found whole; longer runs are split by the string
+# scanner anyway
+SEGMENT_CONTEXT = 2 * MAX_RUN_BYTES
+
+# Default block size of the entropy profile. It is doubled for big files so
+# that a profile never has more than MAX_PROFILE_BLOCKS blocks
+ENTROPY_BLOCK_SIZE = 4096
+MAX_PROFILE_BLOCKS = 65536
+
+# Lets the kernel reclaim mapped pages once they have been analyzed (not on every platform)
+_MADV_DONTNEED = getattr(mmap, 'MADV_DONTNEED', None)
+
+
+class StreamingAnalyzer:
+    """Single-pass analysis of a byte stream.
+
+    Every chunk is fed to the hashes, the byte histogram, the randomness
+    tests, the string, indicator, script pattern and file signature scanners
+    together,
+    so memory use depends on the chunk size rather than on the size of the
+    file.
+
+    To analyze one segment of a file, pass its bounds and the file offset of
+    the first byte fed: the string scanner then only reports strings starting
+    inside the bounds, and feed_context() gives it the bytes around the
+    segment so strings crossing its edges are whole. Embedded files are
+    likewise reported by the segment they start in.
+    """
+
+    def __init__(self, min_string_length: int = 4, max_strings: int = MAX_REPORTED_STRINGS,
+                 digests: Iterable[str] = DEFAULT_DIGESTS, offset: int = 0,
+                 bounds: Optional[Tuple[int, int]] = None,
+                 entropy_block_size: int = ENTROPY_BLOCK_SIZE):
+        self.size = 0
+        self.header = b''
+        self._hasher = MultiHasher(digests)
+        self._histogram = ByteHistogram()
+        self._profile = EntropyProfile(entropy_block_size)
+        self._randomness = RandomnessTests(offset=bounds[0] if bounds else offset)
+        self._strings = StringExtractor(
+            min_length=min_string_length, max_strings=max_strings,
+            offset=offset, bounds=bounds
+        )
+        self._iocs = IOCScanner(offset=offset, bounds=bounds)
+        self._script_scanner = ScriptContentScanner()
+        self._signatures = SignatureScanner(offset=offset, bounds=bounds)
+
+    def update(self, chunk: bytes) -> None:
+        """Feed the next chunk of the stream to every analyzer"""
+        if not chunk:
+            return
+
+        if len(self.header) < HEADER_SIZE:
+            self.header += chunk[:HEADER_SIZE - len(self.header)]
+        self.size += len(chunk)
+
+        self._hasher.update(chunk)
+        # The block histograms of the entropy profile add up to the chunk's histogram
+        self._histogram.counts += self._profile.update(chunk)
+        self._randomness.update(chunk)
+        self._strings.feed(chunk)
+        self._iocs.feed(chunk)
+        self._script_scanner.feed(chunk)
+        self._signatures.feed(chunk)
+
+    def feed_context(self, chunk: bytes, scan_patterns: bool = False) -> None:
+        """Feed bytes outside the analyzed segment to the string, indicator, signature (and pattern) scanners"""
+        self._strings.feed(chunk)
+        self._iocs.feed(chunk)
+        self._signatures.feed(chunk)
+        if scan_patterns:
+            self._script_scanner.feed(chunk)
+
+    @property
+    def script_matches(self) -> List[Dict[str, Any]]:
+        return self._script_scanner.matches
+
+    def hashes(self) -> Dict[str, str]:
+        return self._hasher.hexdigests()
+
+    def entropy(self) -> float:
+        return self._histogram.entropy()
+
+    def byte_stats(self) -> Dict[str, Any]:
+        return self._histogram.stats()
+
+    @property
+    def strings_count(self) -> int:
+        return self._strings.count
+
+    def strings(self) -> List[Dict[str, Any]]:
+        """Reported strings with offsets, encodings and sanitized values"""
+        reported = []
+        for entry in self._strings.finish():
+            safe_value = SecurityValidator.sanitize_text_input(entry['value'], max_length=1000)
+            if safe_value:
+                reported.append({**entry, 'value': safe_value})
+        return reported
+
+    def iocs(self) -> Dict[str, Any]:
+        """Indicator counts per type and the distinct indicators, with sanitized values"""
+        result = self._iocs.finish()
+        indicators = []
+        for indicator in result['indicators']:
+            safe_value = SecurityValidator.sanitize_text_input(indicator['value'], max_length=MAX_IOC_LENGTH)
+            if safe_value:
+                indicators.append({**indicator, 'value': safe_value})
+        return {'counts': result['counts'], 'indicators': indicators}
+
+    def randomness(self) -> Dict[str, Any]:
+        return self._randomness.results(self._histogram.counts)
+
+    def randomness_state(self) -> Dict[str, Any]:
+        return self._randomness.state()
+
+    def embedded_files(self, path: str) -> List[Dict[str, Any]]:
+        """Validate the signature matches against the analyzed file"""
+        return carve_file(path, self._signatures.finish())
+
+    def histogram(self) -> List[int]:
+        return self._histogram.counts.tolist()
+
+    def entropy_profile(self) -> Dict[str, Any]:
+        """Block size and float16 block entropies (as little-endian bytes)"""
+        return {
+            "block_size": self._profile.block_size,
+            "values": self._profile.values.astype('<f2').tobytes(),
+        }
+
+
+def iter_file_chunks(path: str, start: int = 0, end: Optional[int] = None,
+                     chunk_size: int = ANALYSIS_CHUNK_SIZE):
+    """Yield memoryview slices of the [start, end) range of a memory-mapped file.
+
+    Nothing is copied out of the page cache, and pages already analyzed are
+    dropped from the mapping as the scan moves on, so resident memory stays
+    around one chunk however large the file is. start and chunk_size must be
+    multiples of the page size, and each slice is only valid until the next
+    one is requested.
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        end = size if end is None else min(end, size)
+        if start >= end:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if hasattr(mapped, 'madvise'):
+                mapped.madvise(mmap.MADV_SEQUENTIAL, start, end - start)
+            view = memoryview(mapped)
+            try:
+                for offset in range(start, end, chunk_size):
+                    length = min(chunk_size, end - offset)
+                    with view[offset:offset + length] as chunk:
+                        yield chunk
+                    if _MADV_DONTNEED is not None:
+                        mapped.madvise(_MADV_DONTNEED, offset, length)
+            finally:
+                view.release()
+
+
+def profile_block_size(file_size: int, block_size: int = ENTROPY_BLOCK_SIZE) -> int:
+    """Entropy profile block size for a file, a power of two dividing ANALYSIS_CHUNK_SIZE"""
+    if block_size & (block_size - 1) or not 0 < block_size <= ANALYSIS_CHUNK_SIZE:
+        raise ValueError("Entropy block size must be a power of two up to the analysis chunk size")
+    while file_size > block_size * MAX_PROFILE_BLOCKS and block_size < ANALYSIS_CHUNK_SIZE:
+        block_size *= 2
+    return block_size
+
+
+def calculate_hashes(file_content: bytes, digests: Iterable[str] = DEFAULT_DIGESTS) -> Dict[str, str]:
+    """Calculate the requested digests (MD5, SHA1 and SHA256 by default) of file content"""
+    return hash_bytes(file_content, digests)
+
+
+def extract_exif_data(image_data) -> Dict[str, Any]:
+    """EXIF tags (image, EXIF and GPS IFDs) of image bytes or a binary file object, sanitized"""
+    if not isinstance(image_data, (bytes, bytearray)):
+        image_data = image_data.read()
+    return exif_summary(read_metadata_bytes(image_data))
+
+
+def summarize_path(path: str, carve: bool = False) -> Dict[str, Any]:
+    """Size, MIME type, header and script content matches of a file.
+
+    This is the subset of the analysis report needed by
+    SecurityValidator.validate_file_summary, for uploads that are stored
+    rather than analyzed. With carve, the files embedded in it are located in
+    the same pass and added as "embedded_files".
+    """
+    size = 0
+    header = b''
+    scanner = ScriptContentScanner()
+    signatures = SignatureScanner() if carve else None
+    for chunk in iter_file_chunks(path):
+        if not header:
+            header = bytes(chunk[:HEADER_SIZE])
+        size += len(chunk)
+        scanner.feed(chunk)
+        if signatures is not None:
+            signatures.feed(chunk)
+
+    summary = {
+        "file_size": size,
+        "mime_type": detect_mime_type(header),
+        "header": header[:VALIDATION_HEADER_SIZE],
+        "script_matches": scanner.matches,
+    }
+    if signatures is not None:
+        summary["embedded_files"] = carve_file(path, signatures.finish())
+    return summary
+
+
+def analyze_path(path: str, digests: Iterable[str] = DEFAULT_DIGESTS,
+                 entropy_block_size: int = ENTROPY_BLOCK_SIZE) -> Dict[str, Any]:
+    """Run the whole analysis pipeline over a spooled upload.
+
+    This is the entry point executed in the analysis worker processes, so it
+    takes a path rather than the upload bytes and returns plain data. The
+    file is memory-mapped, so it may be far larger than available memory. The
+    report does not depend on the upload's filename and can be cached by
+    content hash; filename-dependent validation is done by the caller.
+    """
+    block_size = profile_block_size(os.path.getsize(path), entropy_block_size)
+    analyzer = StreamingAnalyzer(digests=digests, entropy_block_size=block_size)
+    for chunk in iter_file_chunks(path):
+        analyzer.update(chunk)
+
+    file_format = analyze_format(path)
+    profile = analyzer.entropy_profile()
+
+    return {
+        "analyzer_version": ANALYZER_VERSION,
+        "file_size": analyzer.size,
+        "mime_type": file_format["mime_type"],
+        "header": file_format["header"],
+        "script_matches": analyzer.script_matches,
+        "hashes": analyzer.hashes(),
+        "entropy": analyzer.entropy(),
+        "byte_stats": analyzer.byte_stats(),
+        "randomness": analyzer.randomness(),
+        "entropy_profile": profile,
+        "entropy_regions": entropy_regions(
+            np.frombuffer(profile["values"], dtype='<f2'), block_size, analyzer.size
+        ),
+        "strings": analyzer.strings(),
+        "strings_count": analyzer.strings_count,
+        "iocs": analyzer.iocs(),
+        "embedded_files": analyzer.embedded_files(path),
+        "structure": file_format["structure"],
+        "image_metadata": file_format["image_metadata"],
+        "exif_data": file_format["exif_data"],
+    }
+
+
+def plan_segments(file_size: int, parts: int) -> List[Tuple[int, int]]:
+    """Split a file into at most parts block-aligned [start, end) segments.
+
+    Segments are never smaller than MIN_SEGMENT_SIZE, so small files give a
+    single segment and are better served by analyze_path.
+    """
+    blocks = -(-file_size // ANALYSIS_CHUNK_SIZE)
+    min_blocks = MIN_SEGMENT_SIZE // ANALYSIS_CHUNK_SIZE
+    parts = max(1, min(parts, blocks // min_blocks))
+    per_part = max(-(-blocks // parts), 1)
+    return [
+        (start * ANALYSIS_CHUNK_SIZE, min((start + per_part) * ANALYSIS_CHUNK_SIZE, file_size))
+        for start in range(0, blocks, per_part)
+    ]
+
+
+def analyze_segment(path: str, start: int, end: int,
+                    entropy_block_size: int = ENTROPY_BLOCK_SIZE) -> Dict[str, Any]:
+    """Analyze the [start, end) segment of a file (worker entry point).
+
+    The string scanner also reads SEGMENT_CONTEXT bytes on either side, so
+    strings crossing the segment edges are reported whole, by the segment
+    they start in. Script patterns starting in the segment and ending past it
+    are found the same way. Hashes are not computed here: they have to run
+    over the whole file in order.
+    """
+    context_start = max(start - SEGMENT_CONTEXT, 0)
+    block_size = profile_block_size(os.path.getsize(path), entropy_block_size)
+    analyzer = StreamingAnalyzer(digests=(), offset=context_start, bounds=(start, end),
+                                 entropy_block_size=block_size)
+    for chunk in iter_file_chunks(path, context_start, start):
+        analyzer.feed_context(chunk)
+    for chunk in iter_file_chunks(path, start, end):
+        analyzer.update(chunk)
+    for chunk in iter_file_chunks(path, end, end + SEGMENT_CONTEXT):
+        analyzer.feed_context(chunk, scan_patterns=True)
+
+    return {
+        "start": start,
+        "end": end,
+        "histogram": analyzer.histogram(),
+        "randomness": analyzer.randomness_state(),
+        "entropy_profile": analyzer.entropy_profile(),
+        "script_matches": [
+            {**match, 'offset': start + match['offset']}
+            for match in analyzer.script_matches
+            if match['offset'] < end - start
+        ],
+        "strings": analyzer.strings(),
+        "strings_count": analyzer.strings_count,
+        "iocs": analyzer.iocs(),
+        "embedded_files": analyzer.embedded_files(path),
+    }
+
+
+def hash_path(path: str, digests: Iterable[str] = DEFAULT_DIGESTS) -> Dict[str, str]:
+    """Digests of a file, read through its memory map"""
+    hasher = MultiHasher(digests)
+    for chunk in iter_file_chunks(path):
+        hasher.update(chunk)
+    return hasher.hexdigests()
+
+
+def analyze_format(path: str) -> Dict[str, Any]:
+    """File type, structure and metadata of a file (worker entry point).
+
+    These parsers read the header and whatever offsets it points to rather
+    than the whole file, so a segmented analysis runs them as one more job
+    alongside its segments.
+    """
+    with open(path, 'rb') as f:
+        header = f.read(HEADER_SIZE)
+
+    # The format parsers take untrusted offsets and lengths; a failure in one
+    # is recorded in the report rather than failing the whole analysis
+    try:
+        structure = validate_structure(path)
+    except Exception as e:
+        error = f"Structure parsing failed: {str(e)[:200]}"
+        structure = {"valid": False, "error": error, "entries": [], "entry_count": 0,
+                     "trailing_data": None, "polyglot": [], "issues": [error]}
+    try:
+        image_metadata = read_metadata(path)
+    except Exception as e:
+        image_metadata = {"errors": [f"Metadata parsing failed: {str(e)[:200]}"]}
+
+    return {
+        "mime_type": detect_mime_type(header),
+        "header": header[:VALIDATION_HEADER_SIZE],
+        "structure": structure,
+        "image_metadata": image_metadata,
+        "exif_data": exif_summary(image_metadata),
+    }
+
+
+def merge_segments(hashes: Dict[str, str], file_format: Dict[str, Any],
+                   segments: List[Dict[str, Any]],
+                   max_strings: int = MAX_REPORTED_STRINGS) -> Dict[str, Any]:
+    """Combine analyze_format and analyze_segment results (in file order) into an analyze_path report"""
+    histogram = ByteHistogram()
+    randomness = RandomnessTests()
+    profile_values = []
+    script_matches = []
+    strings = []
+    strings_count = 0
+    embedded_files = []
+    for segment in segments:
+        histogram.counts += np.asarray(segment["histogram"], dtype=np.int64)
+        randomness.merge(RandomnessTests.from_state(segment["randomness"]))
+        profile_values.append(segment["entropy_profile"]["values"])
+        script_matches.extend(segment["script_matches"])
+        strings.extend(segment["strings"][:max_strings - len(strings)])
+        strings_count += segment["strings_count"]
+        embedded_files.extend(segment["embedded_files"])
+
+    block_size = segments[0]["entropy_profile"]["block_size"] if segments else ENTROPY_BLOCK_SIZE
+    profile = {"block_size": block_size, "values": b''.join(profile_values)}
+
+    return {
+        "analyzer_version": ANALYZER_VERSION,
+        "file_size": histogram.total,
+        "mime_type": file_format["mime_type"],
+        "header": file_format["header"],
+        "script_matches": script_matches[:SecurityConfig.MAX_SCRIPT_MATCHES],
+        "hashes": hashes,
+        "entropy": histogram.entropy(),
+        "byte_stats": histogram.stats(),
+        "randomness": randomness.results(histogram.counts),
+        "entropy_profile": profile,
+        "entropy_regions": entropy_regions(
+            np.frombuffer(profile["values"], dtype='<f2'), block_size, histogram.total
+        ),
+        "strings": strings,
+        "strings_count": strings_count,
+        "iocs": merge_iocs(segment["iocs"] for segment in segments),
+        # A member found by one segment may contain same-type matches found by the next
+        "embedded_files": drop_nested(embedded_files),
+        "structure": file_format["structure"],
+        "image_metadata": file_format["image_metadata"],
+        "exif_data": file_format["exif_data"],
+    }
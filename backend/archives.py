@@ -0,0 +1,729 @@
+"""
+Recursive archive analysis for SectoolBox
+"""
+import bz2
+import gzip
+import io
+import lzma
+import os
+import struct
+import tarfile
+import tempfile
+import zipfile
+import zlib
+from datetime import datetime, timezone
+from pathlib import PurePosixPath
+from typing import List, Dict, Any, Optional, Tuple
+
+try:
+    import py7zr
+except ImportError:  # 7z members are then listed as unsupported
+    py7zr = None
+
+from analysis import StreamingAnalyzer, ANALYSIS_CHUNK_SIZE
+from filetype import detect_mime_type
+from security import SecurityConfig, SecurityValidator
+
+# Leading bytes read from a member to tell whether it is itself an archive
+ARCHIVE_SNIFF_SIZE = 512
+
+# Strings kept per member; the count covers all of them
+MEMBER_STRINGS = 10
+
+# Decompressed 7z members are spooled in memory up to this size, then to disk
+SEVEN_ZIP_SPOOL_SIZE = 8 * 1024 * 1024
+
+# ZIP records read by the listing fast path (layouts as in zipfile)
+ZIP_EOCD = struct.Struct('<4s4H2LH')
+ZIP64_EOCD_LOCATOR = struct.Struct('<4sLQL')
+ZIP64_EOCD = struct.Struct('<4sQ2H2L4Q')
+ZIP_CENTRAL_ENTRY = struct.Struct('<4s4B4HL2L5H2L')
+ZIP_LOCAL_HEADER_SIZE = 30
+ZIP_MAX_COMMENT = 0xFFFF
+
+# Errors raised by the container and decompressor modules on damaged,
+# truncated or unsupported input
+ARCHIVE_ERRORS = (
+    OSError, EOFError, ValueError, RuntimeError, NotImplementedError, struct.error,
+    zlib.error, lzma.LZMAError, tarfile.TarError, zipfile.BadZipFile,
+)
+
+
+def archive_kind(header: bytes) -> Optional[str]:
+    """Container format of a file from its leading bytes, if it is one we can open"""
+    if header.startswith((b'PK\x03\x04', b'PK\x05\x06')):
+        return 'zip'
+    if header.startswith(b'ustar', 257):
+        return 'tar'
+    if header.startswith(b'\x1f\x8b'):
+        return 'gzip'
+    if header.startswith(b'BZh'):
+        return 'bzip2'
+    if header.startswith(b'\xfd7zXZ\x00'):
+        return 'xz'
+    if header.startswith(b'7z\xbc\xaf\x27\x1c'):
+        return '7z'
+    return None
+
+
+class ArchiveBudget:
+    """Limits shared by every level of one archive tree.
+
+    Once a limit is reached, readers see the end of their data and listings
+    stop, so a zip bomb is cut off after MAX_ARCHIVE_BYTES of output rather
+    than decompressed in full.
+    """
+
+    def __init__(self, max_depth: int = SecurityConfig.MAX_ARCHIVE_DEPTH,
+                 max_members: int = SecurityConfig.MAX_ARCHIVE_MEMBERS,
+                 max_bytes: int = SecurityConfig.MAX_ARCHIVE_BYTES):
+        self.max_depth = max_depth
+        self.max_members = max_members
+        self.max_bytes = max_bytes
+        self.members = 0
+        self.bytes = 0
+        self.limits_reached: List[str] = []
+
+    def _reached(self, limit: str) -> None:
+        if limit not in self.limits_reached:
+            self.limits_reached.append(limit)
+
+    def take_member(self) -> bool:
+        if self.members >= self.max_members:
+            self._reached('members')
+            return False
+        self.members += 1
+        return True
+
+    def allowed_bytes(self, wanted: int) -> int:
+        """How many of wanted more bytes may be read"""
+        allowed = max(min(wanted, self.max_bytes - self.bytes), 0)
+        if allowed < wanted:
+            self._reached('bytes')
+        return allowed
+
+    def allows_depth(self, depth: int) -> bool:
+        if depth > self.max_depth:
+            self._reached('depth')
+            return False
+        return True
+
+
+class AnalyzedStream(io.RawIOBase):
+    """Read-only stream that feeds everything read through it to an analyzer.
+
+    The member's bytes are decompressed once: a nested container parser reads
+    them through this stream while they are analyzed, and drain() analyzes
+    whatever the parser left unread. Reads beyond the byte budget see end of
+    file, and truncated is set.
+    """
+
+    def __init__(self, raw, analyzer: StreamingAnalyzer, budget: ArchiveBudget):
+        self._raw = raw
+        self._analyzer = analyzer
+        self._budget = budget
+        self._buffer = b''
+        self.truncated = False
+
+    def readable(self) -> bool:
+        return True
+
+    def _read_raw(self, size: int) -> bytes:
+        allowed = self._budget.allowed_bytes(size)
+        if not allowed:
+            self.truncated = True
+            return b''
+        data = self._raw.read(allowed)
+        if data:
+            self._budget.bytes += len(data)
+            self._analyzer.update(data)
+        return data
+
+    def peek(self, size: int) -> bytes:
+        """Up to size leading bytes, without consuming them"""
+        while len(self._buffer) < size:
+            data = self._read_raw(size - len(self._buffer))
+            if not data:
+                break
+            self._buffer += data
+        return self._buffer[:size]
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            return self.read_all()
+        if self._buffer:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+            return data
+        return self._read_raw(size)
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def read_all(self, limit: Optional[int] = None) -> Optional[bytes]:
+        """The rest of the stream, or None past limit bytes (the rest is still analyzed)"""
+        parts = [self._buffer]
+        size = len(self._buffer)
+        self._buffer = b''
+        while True:
+            data = self._read_raw(ANALYSIS_CHUNK_SIZE)
+            if not data:
+                return b''.join(parts)
+            size += len(data)
+            if limit is not None and size > limit:
+                self.drain()
+                return None
+            parts.append(data)
+
+    def drain(self) -> None:
+        self._buffer = b''
+        while self._read_raw(ANALYSIS_CHUNK_SIZE):
+            pass
+
+
+def _safe_name(name: str) -> str:
+    return SecurityValidator.sanitize_text_input(name, max_length=255) or "(unnamed)"
+
+
+def _decompressed_name(name: str, kind: str) -> str:
+    """Name of the data inside a single-stream compressed file"""
+    path = PurePosixPath(name)
+    if path.suffix in ('.tgz', '.tbz2', '.txz'):
+        return str(path.with_suffix('.tar'))
+    if path.suffix in ('.gz', '.bz2', '.xz') and path.stem:
+        return str(path.with_suffix(''))
+    return f"{name} ({kind} data)".strip()
+
+
+def _analyze_member(name: str, raw, budget: ArchiveBudget, depth: int,
+                    declared_size: Optional[int] = None) -> Dict[str, Any]:
+    """Analyze one member read from raw, recursing if it is itself an archive"""
+    analyzer = StreamingAnalyzer(max_strings=MEMBER_STRINGS)
+    stream = AnalyzedStream(raw, analyzer, budget)
+    node: Dict[str, Any] = {"name": _safe_name(name)}
+    if declared_size is not None:
+        node["declared_size"] = declared_size
+
+    try:
+        kind = archive_kind(stream.peek(ARCHIVE_SNIFF_SIZE))
+        if kind and budget.allows_depth(depth + 1):
+            node["archive"] = kind
+            node["members"] = []
+            _archive_members(kind, stream, name, budget, depth + 1, node["members"])
+        stream.drain()
+    except ARCHIVE_ERRORS as e:
+        node["error"] = str(e)[:200]
+
+    # strings() flushes the scanner, so it has to come before strings_count
+    strings = analyzer.strings()
+    node.update({
+        "size": analyzer.size,
+        "truncated": stream.truncated,
+        "mime_type": detect_mime_type(analyzer.header),
+        "hashes": analyzer.hashes(),
+        "entropy": analyzer.entropy(),
+        "strings_count": analyzer.strings_count,
+        "strings_sample": [entry["value"] for entry in strings],
+        "ioc_counts": analyzer.iocs()["counts"],
+        "script_matches": analyzer.script_matches,
+    })
+    return node
+
+
+def _seekable_archive(stream, name: str) -> Optional[io.BytesIO]:
+    """Load a nested ZIP or 7z archive into memory (they cannot be read front to back)"""
+    if not isinstance(stream, AnalyzedStream):
+        return stream
+    data = stream.read_all(limit=SecurityConfig.MAX_NESTED_ARCHIVE_SIZE)
+    return None if data is None else io.BytesIO(data)
+
+
+def _zip_members(stream, budget: ArchiveBudget, depth: int, members: List[Dict[str, Any]]) -> None:
+    with zipfile.ZipFile(stream) as archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            if not budget.take_member():
+                break
+            if info.flag_bits & 0x1:
+                members.append({"name": _safe_name(info.filename), "declared_size": info.file_size,
+                                "error": "Encrypted member"})
+                continue
+            try:
+                with archive.open(info) as member:
+                    members.append(_analyze_member(info.filename, member, budget, depth, info.file_size))
+            except ARCHIVE_ERRORS as e:
+                members.append({"name": _safe_name(info.filename), "declared_size": info.file_size,
+                                "error": str(e)[:200]})
+
+
+def _tar_members(stream, budget: ArchiveBudget, depth: int, members: List[Dict[str, Any]]) -> None:
+    # Stream mode: members are read in order and never seeked back to
+    with tarfile.open(fileobj=stream, mode='r|') as archive:
+        for info in archive:
+            if not info.isfile():
+                continue
+            if not budget.take_member():
+                break
+            members.append(_analyze_member(info.name, archive.extractfile(info), budget, depth, info.size))
+
+
+class _BudgetExhausted(Exception):
+    """Stops a 7z extraction once the member or byte budget is used up"""
+
+
+class _SevenZipSpool:
+    """py7zr writer for one member, keeping at most what is left of the byte budget"""
+
+    def __init__(self, filename: str, budget: ArchiveBudget, on_close):
+        self.filename = filename
+        self.file = tempfile.SpooledTemporaryFile(max_size=SEVEN_ZIP_SPOOL_SIZE)
+        self.written = 0
+        self.truncated = False
+        self._budget = budget
+        self._on_close = on_close
+
+    def write(self, data) -> int:
+        # Bytes are charged to the budget when the member is analyzed
+        allowed = self._budget.allowed_bytes(self.written + len(data)) - self.written
+        if allowed < len(data):
+            self.truncated = True
+            self.file.write(data[:allowed])
+            self.written += allowed
+            raise _BudgetExhausted()
+        self.file.write(data)
+        self.written += len(data)
+        return len(data)
+
+    def read(self, size: Optional[int] = None) -> bytes:
+        return self.file.read(size)
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self.file.seek(offset, whence)
+
+    def flush(self) -> None:
+        self.file.flush()
+
+    def size(self) -> int:
+        return self.written
+
+    def close(self) -> None:
+        # Newer py7zr versions call this when the member is complete
+        self._on_close()
+
+
+class _SevenZipMembers:
+    """py7zr writer factory analyzing each member as the archive is decompressed.
+
+    py7zr decompresses the archive front to back in one pass (a solid block
+    only once) and asks for a writer for each member in turn. A member is
+    analyzed when it is complete, or at the latest when the next one starts,
+    so only one member is spooled at a time.
+    """
+
+    def __init__(self, infos, budget: ArchiveBudget, depth: int, members: List[Dict[str, Any]]):
+        self._declared = {info.filename: info.uncompressed for info in infos}
+        self._budget = budget
+        self._depth = depth
+        self._members = members
+        self._current: Optional[_SevenZipSpool] = None
+
+    def create(self, filename: str) -> _SevenZipSpool:
+        self.finish()
+        if not self._budget.take_member():
+            raise _BudgetExhausted()
+        self._current = _SevenZipSpool(filename, self._budget, self.finish)
+        return self._current
+
+    def finish(self) -> None:
+        """Analyze the member being spooled, if any"""
+        spool, self._current = self._current, None
+        if spool is None:
+            return
+        with spool.file:
+            spool.file.seek(0)
+            node = _analyze_member(spool.filename, spool.file, self._budget, self._depth,
+                                   self._declared.get(spool.filename))
+        node["truncated"] = node["truncated"] or spool.truncated
+        self._members.append(node)
+
+
+def _seven_zip_members(stream, budget: ArchiveBudget, depth: int, members: List[Dict[str, Any]]) -> None:
+    with py7zr.SevenZipFile(stream, mode='r') as archive:
+        writers = _SevenZipMembers(archive.list(), budget, depth, members)
+        try:
+            archive.extractall(factory=writers)
+        except _BudgetExhausted:
+            pass
+        finally:
+            writers.finish()
+
+
+def _archive_members(kind: str, stream, name: str, budget: ArchiveBudget, depth: int,
+                     members: List[Dict[str, Any]]) -> None:
+    """Analyze the members of an archive of the given kind read from stream into members.
+
+    Members analyzed before an error are kept in the list.
+    """
+    if kind in ('zip', '7z'):
+        if kind == '7z' and py7zr is None:
+            raise NotImplementedError("7z support requires py7zr")
+        seekable = _seekable_archive(stream, name)
+        if seekable is None:
+            raise ValueError("Nested archive too large to open")
+        (_zip_members if kind == 'zip' else _seven_zip_members)(seekable, budget, depth, members)
+    elif kind == 'tar':
+        _tar_members(stream, budget, depth, members)
+    elif budget.take_member():
+        # Single-stream compressors: the decompressed data is the only member
+        opener = {'gzip': gzip.GzipFile, 'bzip2': bz2.BZ2File, 'xz': lzma.LZMAFile}[kind]
+        with opener(fileobj=stream) if kind == 'gzip' else opener(stream) as decompressed:
+            members.append(_analyze_member(_decompressed_name(name, kind), decompressed, budget, depth))
+
+
+def analyze_archive_path(path: str) -> Optional[Dict[str, Any]]:
+    """Tree of per-member analyses of an archive (worker entry point).
+
+    Members are streamed out of their container straight into the analyzers
+    and nested archives are opened from those streams. 7z members come out
+    of a single decompression pass into spool files holding at most what is
+    left of the byte budget. Only nested ZIP and 7z archives, which need
+    random access, are held in memory. Like analyze_path's report, the tree does not depend on
+    the upload's filename. Returns None if the file is not a supported archive.
+    """
+    with open(path, 'rb') as f:
+        kind = archive_kind(f.read(ARCHIVE_SNIFF_SIZE))
+        if kind is None:
+            return None
+        f.seek(0)
+
+        budget = ArchiveBudget()
+        result: Dict[str, Any] = {"archive": kind, "members": []}
+        try:
+            _archive_members(kind, f, "", budget, 1, result["members"])
+        except ARCHIVE_ERRORS as e:
+            result["error"] = str(e)[:200]
+
+    result.update({
+        "member_count": budget.members,
+        "bytes_analyzed": budget.bytes,
+        "limits_reached": budget.limits_reached,
+    })
+    return result
+
+
+def _ratio(size: Optional[int], compressed_size: Optional[int]) -> Optional[float]:
+    if size is None or not compressed_size:
+        return None
+    return round(size / compressed_size, 2)
+
+
+def _dos_datetime(date: int, time: int) -> Optional[str]:
+    try:
+        return datetime(1980 + (date >> 9), (date >> 5) & 0xF, date & 0x1F,
+                        time >> 11, (time >> 5) & 0x3F, (time & 0x1F) * 2).isoformat()
+    except ValueError:
+        return None
+
+
+def _unix_datetime(timestamp: Optional[float]) -> Optional[str]:
+    try:
+        return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None
+
+
+def _listing_entry(name: str, size: Optional[int], compressed_size: Optional[int],
+                   encrypted: bool = False, modified: Optional[str] = None,
+                   is_dir: bool = False) -> Dict[str, Any]:
+    return {
+        "name": name,
+        "size": size,
+        "compressed_size": compressed_size,
+        "ratio": _ratio(size, compressed_size),
+        "encrypted": encrypted,
+        "modified": modified,
+        "is_dir": is_dir,
+    }
+
+
+def _zip_directory(f, file_size: int) -> Tuple[int, int, int, int]:
+    """Start, size, offset shift and declared entry count of a ZIP file's central directory"""
+    tail_size = min(file_size, ZIP_EOCD.size + ZIP_MAX_COMMENT)
+    f.seek(file_size - tail_size)
+    tail = f.read(tail_size)
+    position = tail.rfind(b'PK\x05\x06')
+    if position < 0 or position + ZIP_EOCD.size > len(tail):
+        raise zipfile.BadZipFile("End of central directory record not found")
+    eocd_offset = file_size - tail_size + position
+    _, _, _, _, declared_count, cd_size, cd_offset, _ = ZIP_EOCD.unpack_from(tail, position)
+
+    # ZIP64 archives keep the real values in a second record just before the
+    # locator; like zipfile, find it there rather than at its recorded offset,
+    # which prepended data would shift
+    cd_end = eocd_offset
+    locator_position = position - ZIP64_EOCD_LOCATOR.size
+    record_offset = eocd_offset - ZIP64_EOCD_LOCATOR.size - ZIP64_EOCD.size
+    if record_offset >= 0 and tail.startswith(b'PK\x06\x07', locator_position):
+        f.seek(record_offset)
+        record = f.read(ZIP64_EOCD.size)
+        if record.startswith(b'PK\x06\x06'):
+            _, _, _, _, _, _, _, declared_count, cd_size, cd_offset = ZIP64_EOCD.unpack(record)
+            cd_end = record_offset
+
+    # Data prepended to the archive (self-extractors) shifts every recorded offset
+    cd_start = cd_end - cd_size
+    if cd_start < 0:
+        raise zipfile.BadZipFile("Central directory outside the file")
+    return cd_start, cd_size, cd_start - cd_offset, declared_count
+
+
+def _is_prepended_zip(f, file_size: int) -> bool:
+    """Whether a file not starting like an archive ends with a ZIP, as self-extractors do"""
+    try:
+        cd_start, cd_size, shift, _ = _zip_directory(f, file_size)
+    except zipfile.BadZipFile:
+        return False
+    f.seek(cd_start)
+    return shift > 0 and cd_size > 0 and f.read(4) == b'PK\x01\x02'
+
+
+def _zip_listing(f, file_size: int) -> Dict[str, Any]:
+    """Entries of a ZIP file from its end of central directory record and central directory"""
+    cd_start, cd_size, shift, declared_count = _zip_directory(f, file_size)
+    f.seek(cd_start)
+    # The directory size and entry count come from the file, so both are capped
+    directory = f.read(min(cd_size, SecurityConfig.MAX_LISTING_DIRECTORY_SIZE))
+
+    entries = []
+    spans = []
+    position = 0
+    while (position + ZIP_CENTRAL_ENTRY.size <= len(directory)
+           and len(entries) < SecurityConfig.MAX_LISTING_ENTRIES):
+        (signature, _, _, _, _, flags, method, time, date, _, compressed_size, size,
+         name_length, extra_length, comment_length, _, _, _, header_offset) = ZIP_CENTRAL_ENTRY.unpack_from(directory, position)
+        if signature != b'PK\x01\x02':
+            break
+        name_start = position + ZIP_CENTRAL_ENTRY.size
+        raw_name = directory[name_start:name_start + name_length]
+        extra = directory[name_start + name_length:name_start + name_length + extra_length]
+        position = name_start + name_length + extra_length + comment_length
+
+        # ZIP64 extra field: only the values saturated in the fixed fields are present
+        extra_position = 0
+        while extra_position + 4 <= len(extra):
+            tag, length = struct.unpack_from('<2H', extra, extra_position)
+            if extra_position + 4 + length > len(extra):
+                break  # Field claims more data than the entry carries
+            if tag == 0x0001:
+                values = iter(struct.unpack_from(f'<{length // 8}Q', extra, extra_position + 4))
+                if size == 0xFFFFFFFF:
+                    size = next(values, size)
+                if compressed_size == 0xFFFFFFFF:
+                    compressed_size = next(values, compressed_size)
+                if header_offset == 0xFFFFFFFF:
+                    header_offset = next(values, header_offset)
+                break
+            extra_position += 4 + length
+
+        name = raw_name.decode('utf-8' if flags & 0x800 else 'cp437', errors='replace')
+        # Bit 0 is traditional or strong encryption, method 99 is WinZip AES
+        entries.append(_listing_entry(name, size, compressed_size, bool(flags & 0x1) or method == 99,
+                                      _dos_datetime(date, time), name.endswith('/')))
+        local_offset = header_offset + shift
+        spans.append((local_offset, local_offset + ZIP_LOCAL_HEADER_SIZE + name_length + compressed_size))
+
+    # Members whose data overlaps another's reuse the same compressed bytes
+    # (the overlapping-file zip bomb). Local extra fields are not counted, so
+    # spans are lower bounds and any overlap found is real
+    overlapping = 0
+    furthest = 0
+    for start, end in sorted(spans):
+        if start < furthest:
+            overlapping += 1
+        furthest = max(furthest, end)
+
+    warnings = []
+    if cd_size > len(directory) or len(entries) == SecurityConfig.MAX_LISTING_ENTRIES:
+        warnings.append(f"Listing stopped after {len(entries)} entries")
+    elif len(entries) != declared_count:
+        warnings.append(f"Central directory lists {len(entries)} entries, end record declares {declared_count}")
+    if overlapping:
+        warnings.append(f"{overlapping} members overlap another member's data")
+    return {"entries": entries, "overlapping": overlapping, "warnings": warnings}
+
+
+def _tar_listing(path: str) -> Dict[str, Any]:
+    """Entries of an uncompressed tar file from its headers, seeking over member data"""
+    entries = []
+    with tarfile.open(path, mode='r:') as archive:
+        while True:
+            info = archive.next()
+            if info is None:
+                break
+            if info.isfile() or info.isdir():
+                entries.append(_listing_entry(info.name, info.size, info.size, False,
+                                              _unix_datetime(info.mtime), info.isdir()))
+            # TarFile keeps every header it has read; the listing does not need them
+            archive.members.clear()
+            if len(entries) == SecurityConfig.MAX_LISTING_ENTRIES:
+                return {"entries": entries, "warnings": [f"Listing stopped after {len(entries)} entries"]}
+    return {"entries": entries, "warnings": []}
+
+
+def _gzip_listing(f, file_size: int) -> Dict[str, Any]:
+    """Single entry of a gzip file from its header and ISIZE trailer.
+
+    ISIZE holds the size of the last member modulo 4GB, so it understates
+    multi-member files and members over 4GB.
+    """
+    f.seek(0)
+    header = f.read(ARCHIVE_SNIFF_SIZE)
+    if len(header) < 10 or file_size < 18:
+        raise EOFError("Truncated gzip file")
+    flags = header[3]
+    mtime = struct.unpack_from('<L', header, 4)[0]
+    position = 10
+    if flags & 0x04:  # FEXTRA
+        position += 2 + struct.unpack_from('<H', header, position)[0] if position + 2 <= len(header) else 0
+    name = ""
+    if flags & 0x08:  # FNAME
+        end = header.find(b'\0', position)
+        if end >= 0:
+            name = header[position:end].decode('latin-1')
+    f.seek(file_size - 4)
+    size = struct.unpack('<L', f.read(4))[0]
+    entry = _listing_entry(name or "(gzip data)", size, file_size, False, _unix_datetime(mtime or None))
+    return {"entries": [entry], "warnings": []}
+
+
+def _read_xz_varint(data: bytes, position: int) -> Tuple[int, int]:
+    value = 0
+    for shift in range(0, 63, 7):
+        if position >= len(data):
+            break
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, position
+    raise lzma.LZMAError("Invalid xz index")
+
+
+def _xz_listing(f, file_size: int) -> Dict[str, Any]:
+    """Single entry of an xz file, sized from the index of its last stream"""
+    if file_size < 24:
+        raise EOFError("Truncated xz file")
+    f.seek(file_size - 12)
+    footer = f.read(12)
+    if footer[10:] != b'YZ':
+        raise lzma.LZMAError("xz stream footer not found (padded or damaged file)")
+    index_size = (struct.unpack_from('<L', footer, 4)[0] + 1) * 4
+    if index_size > file_size - 12:
+        raise lzma.LZMAError("Invalid xz index size")
+    f.seek(file_size - 12 - index_size)
+    index = f.read(index_size)
+    if not index.startswith(b'\0'):
+        raise lzma.LZMAError("Invalid xz index")
+    records, position = _read_xz_varint(index, 1)
+    size = 0
+    for _ in range(records):
+        _, position = _read_xz_varint(index, position)
+        block_size, position = _read_xz_varint(index, position)
+        size += block_size
+    return {"entries": [_listing_entry("(xz data)", size, file_size)], "warnings": []}
+
+
+def _seven_zip_listing(path: str) -> Dict[str, Any]:
+    """Entries of a 7z file from its header (which py7zr decompresses, but not the members)"""
+    entries = []
+    warnings = []
+    with py7zr.SevenZipFile(path, mode='r') as archive:
+        encrypted = archive.needs_password()
+        infos = archive.list()
+        if len(infos) > SecurityConfig.MAX_LISTING_ENTRIES:
+            infos = infos[:SecurityConfig.MAX_LISTING_ENTRIES]
+            warnings.append(f"Listing stopped after {len(infos)} entries")
+        for info in infos:
+            entries.append(_listing_entry(
+                info.filename, info.uncompressed, info.compressed, encrypted,
+                info.creationtime.isoformat() if info.creationtime else None, info.is_directory,
+            ))
+    return {"entries": entries, "warnings": warnings}
+
+
+def list_archive(path: str) -> Optional[Dict[str, Any]]:
+    """Listing of an archive's members read from its directory structures only.
+
+    Nothing is decompressed (except a 7z header), so this is cheap enough to
+    run inline for every upload: ZIP listings come from the central directory,
+    tar listings from the member headers, gzip and xz from their trailers.
+    Members whose declared size is more than MAX_COMPRESSION_RATIO times their
+    compressed size, and ZIP members sharing compressed data, mark the archive
+    as a possible decompression bomb. bzip2 streams record no size and list no
+    entries. Returns None if the file is not a supported archive.
+    """
+    file_size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        kind = archive_kind(f.read(ARCHIVE_SNIFF_SIZE))
+        if kind is None and _is_prepended_zip(f, file_size):
+            kind = 'zip'
+        if kind is None:
+            return None
+
+        listing: Dict[str, Any] = {"entries": [], "warnings": []}
+        try:
+            if kind == 'zip':
+                listing = _zip_listing(f, file_size)
+            elif kind == 'tar':
+                listing = _tar_listing(path)
+            elif kind == 'gzip':
+                listing = _gzip_listing(f, file_size)
+            elif kind == 'xz':
+                listing = _xz_listing(f, file_size)
+            elif kind == '7z' and py7zr is not None:
+                listing = _seven_zip_listing(path)
+        except ARCHIVE_ERRORS as e:
+            listing["error"] = str(e)[:200]
+        except Exception as e:  # py7zr raises its own exception types
+            if kind != '7z':
+                raise
+            listing["error"] = str(e)[:200]
+
+    entries = listing.pop("entries")
+    overlapping = listing.pop("overlapping", 0)
+    sizes = [entry["size"] for entry in entries if entry["size"] is not None]
+    compressed_sizes = [entry["compressed_size"] for entry in entries if entry["compressed_size"] is not None]
+    total_size = sum(sizes)
+    total_compressed_size = sum(compressed_sizes)
+
+    suspicious = 0
+    for entry in entries:
+        if (entry["ratio"] is not None and entry["ratio"] > SecurityConfig.MAX_COMPRESSION_RATIO
+                and entry["size"] >= SecurityConfig.COMPRESSION_RATIO_MIN_SIZE):
+            entry["suspicious"] = True
+            suspicious += 1
+    if suspicious:
+        listing["warnings"].append(
+            f"{suspicious} members compressed more than {SecurityConfig.MAX_COMPRESSION_RATIO}:1"
+        )
+    if total_size > SecurityConfig.MAX_ARCHIVE_BYTES:
+        listing["warnings"].append(f"Declared size {total_size} bytes exceeds the analysis budget")
+
+    encrypted_count = sum(1 for entry in entries if entry["encrypted"])
+    reported = entries[:SecurityConfig.MAX_LISTED_MEMBERS]
+    for entry in reported:
+        entry["name"] = _safe_name(entry["name"])
+    return {
+        "archive": kind,
+        "entries": reported,
+        "entry_count": len(entries),
+        "truncated": len(entries) > SecurityConfig.MAX_LISTED_MEMBERS,
+        "total_size": total_size if entries else None,
+        "total_compressed_size": total_compressed_size if entries else None,
+        "ratio": _ratio(total_size, total_compressed_size) if entries else None,
+        "encrypted_count": encrypted_count,
+        "bomb": bool(suspicious or overlapping),
+        **listing,
+    }
@@ -0,0 +1,91 @@
+"""
+Content-addressed cache of file analysis reports
+"""
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisCache:
+    """Two-tier cache of analysis reports keyed by SHA-256 and analyzer version.
+
+    An in-process LRU answers repeat uploads without a database round trip;
+    misses fall through to a Mongo collection with a unique index on the key,
+    so reports survive restarts and are shared between API processes.
+    """
+
+    def __init__(self, collection, analyzer_version: str, max_entries: int = 256):
+        self.analyzer_version = analyzer_version
+        self.max_entries = max_entries
+        self.memory_hits = 0
+        self.database_hits = 0
+        self.misses = 0
+        self._collection = collection
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    async def ensure_indexes(self) -> None:
+        await self._collection.create_index(
+            [("sha256", 1), ("analyzer_version", 1)], unique=True
+        )
+
+    def _remember(self, sha256: str, report: Dict[str, Any]) -> None:
+        self._entries[sha256] = report
+        self._entries.move_to_end(sha256)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, sha256: str) -> Optional[Dict[str, Any]]:
+        """Return the stored report for this content, if any"""
+        report = self._entries.get(sha256)
+        if report is not None:
+            self._entries.move_to_end(sha256)
+            self.memory_hits += 1
+            return report
+
+        try:
+            document = await self._collection.find_one(
+                {"sha256": sha256, "analyzer_version": self.analyzer_version}
+            )
+        except PyMongoError as e:
+            logger.error(f"Analysis cache lookup failed: {str(e)[:200]}")
+            document = None
+
+        if document is None:
+            self.misses += 1
+            return None
+
+        self.database_hits += 1
+        self._remember(sha256, document["report"])
+        return document["report"]
+
+    async def put(self, sha256: str, report: Dict[str, Any]) -> None:
+        """Store a freshly computed report"""
+        self._remember(sha256, report)
+        try:
+            await self._collection.update_one(
+                {"sha256": sha256, "analyzer_version": self.analyzer_version},
+                {"$setOnInsert": {"report": report, "created_at": datetime.utcnow()}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            pass  # A concurrent upload of the same content stored it first
+        except PyMongoError as e:
+            logger.error(f"Analysis cache store failed: {str(e)[:200]}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.database_hits + self.misses
+        hits = self.memory_hits + self.database_hits
+        return {
+            "analyzer_version": self.analyzer_version,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "memory_hits": self.memory_hits,
+            "database_hits": self.database_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,878 @@
+"""
+Embedded file carving for SectoolBox
+"""
+import mmap
+import re
+import struct
+import zlib
+from typing import Callable, Dict, Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Most embedded files reported for one file
+MAX_CARVED_FILES = 1000
+
+# Most signature matches kept for validation. A file made of repeated magic
+# bytes yields a match at every position, so past MAX_CANDIDATES_PER_PREFIX
+# matches of the same two leading bytes those are no longer looked for, and
+# past MAX_CANDIDATES the scan stops recording
+MAX_CANDIDATES = 100000
+MAX_CANDIDATES_PER_PREFIX = 10000
+
+
+def _check(condition) -> None:
+    if not condition:
+        raise ValueError("Signature header does not validate")
+
+
+class _Reader:
+    """Random access to the scanned data, with memoized forward searches.
+
+    Several parsers look for a terminator (an end-of-central-directory
+    record, %%EOF, ...) after their header. A search that found nothing, or
+    found a terminator past the next header, answers the next search too, so
+    a file full of headers without terminators is not rescanned for each.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.size = len(data)
+        self._found: Dict[bytes, Tuple[int, int]] = {}
+
+    def find(self, needle: bytes, start: int) -> int:
+        searched_from, found = self._found.get(needle, (None, None))
+        if searched_from is not None and searched_from <= start and (found < 0 or found >= start):
+            return found
+        found = self.data.find(needle, start)
+        self._found[needle] = (start, found)
+        return found
+
+
+def _walked(walk: Callable[..., Optional[int]], reader: _Reader, start: int) -> Optional[int]:
+    """Run a structure walk, giving an unknown size if it runs off the data"""
+    try:
+        return walk(reader, start)
+    except (IndexError, struct.error, ValueError):
+        return None
+
+
+# Parsers: given a match at start, raise (ValueError or struct.error) if the
+# header does not validate, otherwise return the member's size in bytes or
+# None when it cannot be told without decoding the whole member
+
+def _png(reader: _Reader, start: int) -> Optional[int]:
+    _check(reader.data[start + 12:start + 16] == b'IHDR')
+    return _walked(_png_chunks, reader, start)
+
+
+def _png_chunks(reader: _Reader, start: int) -> Optional[int]:
+    pos = start + 8
+    while pos < reader.size:
+        length, kind = struct.unpack_from('>I4s', reader.data, pos)
+        _check(kind.isalpha() and length < 1 << 31)
+        pos += 12 + length
+        if kind == b'IEND':
+            return pos - start
+    return None
+
+
+_JPEG_FIRST_MARKERS = set(range(0xe0, 0xf0)) | {0xc0, 0xc1, 0xc2, 0xc4, 0xdb, 0xfe}
+
+
+def _jpeg(reader: _Reader, start: int) -> Optional[int]:
+    data = reader.data
+    length, = struct.unpack_from('>H', data, start + 4)
+    # First segment: APPn, DQT, DHT, SOFn or a comment, followed by another marker
+    _check(data[start + 3] in _JPEG_FIRST_MARKERS and length >= 2 and data[start + 4 + length] == 0xff)
+    return _walked(_jpeg_segments, reader, start)
+
+
+def _jpeg_segments(reader: _Reader, start: int) -> Optional[int]:
+    data = reader.data
+    pos = start + 2
+    while True:
+        marker, length = struct.unpack_from('>HH', data, pos)
+        _check(marker >> 8 == 0xff)
+        if marker == 0xffd9:
+            return pos + 2 - start
+        if 0xffd0 <= marker <= 0xffd7 or marker == 0xff01:
+            pos += 2
+            continue
+        _check(length >= 2)
+        pos += 2 + length
+        if marker == 0xffda:
+            # Entropy-coded data runs until the next marker other than a
+            # stuffed 0xff00 or a restart marker
+            while True:
+                pos = data.find(b'\xff', pos)
+                if pos < 0:
+                    return None
+                following = data[pos + 1]
+                if following == 0 or 0xd0 <= following <= 0xd7:
+                    pos += 2
+                elif following == 0xff:
+                    pos += 1
+                else:
+                    break
+
+
+def _gif(reader: _Reader, start: int) -> Optional[int]:
+    _check(reader.data[start + 3:start + 6] in (b'87a', b'89a'))
+    width, height = struct.unpack_from('<HH', reader.data, start + 6)
+    _check(width and height)
+    return _walked(_gif_blocks, reader, start)
+
+
+def _gif_blocks(reader: _Reader, start: int) -> Optional[int]:
+    data = reader.data
+    flags = data[start + 10]
+    pos = start + 13 + (3 << ((flags & 7) + 1) if flags & 0x80 else 0)
+    while True:
+        kind = data[pos]
+        if kind == 0x3b:
+            return pos + 1 - start
+        if kind == 0x2c:
+            flags = data[pos + 9]
+            pos += 11 + (3 << ((flags & 7) + 1) if flags & 0x80 else 0)
+        else:
+            _check(kind == 0x21)
+            pos += 2
+        while True:
+            length = data[pos]
+            pos += 1 + length
+            if not length:
+                break
+
+
+def _pdf(reader: _Reader, start: int) -> Optional[int]:
+    _check(re.match(rb'%PDF-\d\.\d', reader.data[start:start + 8]))
+    end = reader.find(b'%%EOF', start)
+    if end < 0:
+        return None
+    # Incremental updates append more %%EOF markers, up to the next document
+    next_document = reader.find(b'%PDF-', start + 5)
+    while True:
+        following = reader.data.find(b'%%EOF', end + 5)
+        if following < 0 or 0 <= next_document < following:
+            return end + 5 - start
+        end = following
+
+
+_ZIP_METHODS = {0, 1, 6, 8, 9, 12, 14, 93, 95, 98, 99}
+
+
+def _zip(reader: _Reader, start: int) -> Optional[int]:
+    version, _, method = struct.unpack_from('<HHH', reader.data, start + 4)
+    name_length, = struct.unpack_from('<H', reader.data, start + 26)
+    _check(version < 100 and method in _ZIP_METHODS and 0 < name_length <= 4096)
+    end = reader.find(b'PK\x05\x06', start)
+    if end < 0:
+        return None
+    comment_length, = struct.unpack_from('<H', reader.data, end + 20)
+    return end + 22 + comment_length - start
+
+
+def _elf(reader: _Reader, start: int) -> Optional[int]:
+    data = reader.data
+    elf_class, encoding, version = data[start + 4], data[start + 5], data[start + 6]
+    _check(elf_class in (1, 2) and encoding in (1, 2) and version == 1)
+    order = '<' if encoding == 1 else '>'
+    address = 'I' if elf_class == 1 else 'Q'
+    (_, _, version, _, program_offset, section_offset, _, header_size, program_entry_size,
+     program_count, section_entry_size, section_count, _) = struct.unpack_from(
+        order + 'HHI' + address * 3 + 'IHHHHHH', data, start + 16)
+    _check(version == 1 and header_size in (52, 64))
+
+    size = max(header_size, section_offset + section_entry_size * section_count,
+               program_offset + program_entry_size * program_count)
+    segment = order + ('IIIIII' if elf_class == 1 else 'IIQQQQ')
+    for index in range(program_count):
+        fields = struct.unpack_from(segment, data, start + program_offset + index * program_entry_size)
+        offset, file_size = (fields[1], fields[4]) if elf_class == 1 else (fields[2], fields[5])
+        size = max(size, offset + file_size)
+    return size
+
+
+def _pe(reader: _Reader, start: int) -> Optional[int]:
+    data = reader.data
+    pe_offset, = struct.unpack_from('<I', data, start + 0x3c)
+    _check(0x40 <= pe_offset < 0x10000)
+    header = start + pe_offset
+    _check(data[header:header + 4] == b'PE\x00\x00')
+    section_count, = struct.unpack_from('<H', data, header + 6)
+    optional_size, = struct.unpack_from('<H', data, header + 20)
+    _check(0 < section_count <= 96)
+
+    table = header + 24 + optional_size
+    size = table + 40 * section_count - start
+    for index in range(section_count):
+        raw_size, raw_offset = struct.unpack_from('<II', data, table + 40 * index + 16)
+        if raw_size:
+            size = max(size, raw_offset + raw_size)
+    return size
+
+
+def _gzip(reader: _Reader, start: int) -> Optional[int]:
+    flags, extra_flags, system = reader.data[start + 3], reader.data[start + 8], reader.data[start + 9]
+    _check(not flags & 0xe0 and extra_flags in (0, 2, 4) and (system <= 13 or system == 255))
+    return None
+
+
+def _bzip2(reader: _Reader, start: int) -> Optional[int]:
+    _check(0x31 <= reader.data[start + 3] <= 0x39)
+    _check(reader.data[start + 4:start + 10] in (b'1AY&SY', b'\x17rE8P\x90'))
+    return None
+
+
+def _xz(reader: _Reader, start: int) -> Optional[int]:
+    flags = reader.data[start + 6:start + 8]
+    stored_crc, = struct.unpack_from('<I', reader.data, start + 8)
+    _check(flags[0] == 0 and zlib.crc32(flags) == stored_crc)
+    return None
+
+
+def _zstd(reader: _Reader, start: int) -> Optional[int]:
+    _check(not reader.data[start + 4] & 0x08)
+    return None
+
+
+def _lz4(reader: _Reader, start: int) -> Optional[int]:
+    _check(reader.data[start + 4] >> 6 == 1)
+    return None
+
+
+def _seven_zip(reader: _Reader, start: int) -> Optional[int]:
+    data = reader.data
+    stored_crc, = struct.unpack_from('<I', data, start + 8)
+    _check(data[start + 6] == 0 and zlib.crc32(data[start + 12:start + 32]) == stored_crc)
+    next_offset, next_size = struct.unpack_from('<QQ', data, start + 12)
+    return 32 + next_offset + next_size
+
+
+def _rar(reader: _Reader, start: int) -> Optional[int]:
+    _check(reader.data[start + 6] == 0 or reader.data[start + 6:start + 8] == b'\x01\x00')
+    return None
+
+
+def _cab(reader: _Reader, start: int) -> Optional[int]:
+    size, = struct.unpack_from('<I', reader.data, start + 8)
+    minor, major = reader.data[start + 24], reader.data[start + 25]
+    _check(major == 1 and minor == 3 and size > 36)
+    return size
+
+
+def _tar_header_valid(header: bytes) -> bool:
+    stored = header[148:156].strip(b'\x00 ')
+    return (len(header) == 512 and stored.isdigit()
+            and int(stored, 8) == sum(header) - sum(header[148:156]) + 8 * 0x20)
+
+
+def _tar(reader: _Reader, start: int) -> Optional[int]:
+    _check(_tar_header_valid(reader.data[start:start + 512]))
+    return _walked(_tar_entries, reader, start)
+
+
+def _tar_entries(reader: _Reader, start: int) -> Optional[int]:
+    pos = start
+    while pos + 512 <= reader.size:
+        header = reader.data[pos:pos + 512]
+        if not header.strip(b'\x00'):
+            # End-of-archive: two zero blocks
+            return min(pos + 1024, reader.size) - start
+        if not _tar_header_valid(header):
+            break
+        size = int(header[124:136].strip(b'\x00 ') or b'0', 8)
+        pos += 512 + -(-size // 512) * 512
+    return pos - start
+
+
+def _cpio(reader: _Reader, start: int) -> Optional[int]:
+    _check(reader.data[start + 5] in b'12')
+    _check(re.fullmatch(rb'[0-9A-Fa-f]{104}', reader.data[start + 6:start + 110]))
+    return _walked(_cpio_entries, reader, start)
+
+
+def _cpio_entries(reader: _Reader, start: int) -> Optional[int]:
+    pos = start
+    while True:
+        header = reader.data[pos:pos + 110]
+        _check(header[:6] in (b'070701', b'070702'))
+        file_size, name_size = int(header[54:62], 16), int(header[94:102], 16)
+        name = reader.data[pos + 110:pos + 110 + name_size]
+        pos += -(-(110 + name_size) // 4) * 4
+        pos += -(-file_size // 4) * 4
+        if name.rstrip(b'\x00') == b'TRAILER!!!':
+            return pos - start
+
+
+def _ar(reader: _Reader, start: int) -> Optional[int]:
+    _check(reader.data[start + 66:start + 68] == b'`\n')
+    return _walked(_ar_members, reader, start)
+
+
+def _ar_members(reader: _Reader, start: int) -> Optional[int]:
+    pos = start + 8
+    while pos + 60 <= reader.size:
+        header = reader.data[pos:pos + 60]
+        if header[58:60] != b'`\n':
+            break
+        size = int(header[48:58])
+        pos += 60 + size + (size & 1)
+    return pos - start
+
+
+def _sqlite(reader: _Reader, start: int) -> Optional[int]:
+    page_size, = struct.unpack_from('>H', reader.data, start + 16)
+    page_size = 65536 if page_size == 1 else page_size
+    _check(page_size >= 512 and not page_size & (page_size - 1))
+    page_count, = struct.unpack_from('>I', reader.data, start + 28)
+    return page_size * page_count or None
+
+
+def _ole(reader: _Reader, start: int) -> Optional[int]:
+    major, byte_order = struct.unpack_from('<HH', reader.data, start + 26)
+    _check(major in (3, 4) and byte_order == 0xfffe)
+    return None
+
+
+def _fat_macho(reader: _Reader, start: int) -> Optional[int]:
+    count, = struct.unpack_from('>I', reader.data, start + 4)
+    _check(0 < count < 20)
+    size = 8 + 20 * count
+    for index in range(count):
+        _, _, offset, length, align = struct.unpack_from('>IIIII', reader.data, start + 8 + 20 * index)
+        _check(align < 32)
+        size = max(size, offset + length)
+    return size
+
+
+def _java_class(reader: _Reader, start: int) -> Optional[int]:
+    major, = struct.unpack_from('>H', reader.data, start + 6)
+    _check(45 <= major < 100)
+    return None
+
+
+def _macho(reader: _Reader, start: int) -> Optional[int]:
+    data = reader.data
+    order = '>' if data[start] == 0xfe else '<'
+    is_64 = data[start] == 0xcf or data[start + 3] == 0xcf
+    _, _, file_type, command_count, commands_size, _ = struct.unpack_from(order + 'IIIIII', data, start + 4)
+    _check(1 <= file_type <= 12 and 0 < command_count < 4096 and commands_size < 1 << 24)
+
+    pos = start + (32 if is_64 else 28)
+    size = pos + commands_size - start
+    for _ in range(command_count):
+        command, command_size = struct.unpack_from(order + 'II', data, pos)
+        _check(command_size >= 8)
+        if command == 0x1:  # LC_SEGMENT
+            offset, length = struct.unpack_from(order + 'II', data, pos + 32)
+            size = max(size, offset + length)
+        elif command == 0x19:  # LC_SEGMENT_64
+            offset, length = struct.unpack_from(order + 'QQ', data, pos + 40)
+            size = max(size, offset + length)
+        pos += command_size
+    return size
+
+
+def _dex(reader: _Reader, start: int) -> Optional[int]:
+    _check(reader.data[start + 4:start + 7].isdigit() and reader.data[start + 7] == 0)
+    size, = struct.unpack_from('<I', reader.data, start + 32)
+    return size
+
+
+def _bmp(reader: _Reader, start: int) -> Optional[int]:
+    size, reserved, data_offset, header_size = struct.unpack_from('<IIII', reader.data, start + 2)
+    _check(reserved == 0 and header_size in (12, 40, 52, 56, 64, 108, 124))
+    _check(14 + header_size <= data_offset <= size)
+    return size
+
+
+def _tiff(reader: _Reader, start: int) -> Optional[int]:
+    order = '<' if reader.data[start] == 0x49 else '>'
+    directory, = struct.unpack_from(order + 'I', reader.data, start + 4)
+    _check(8 <= directory < reader.size - start)
+    entries, = struct.unpack_from(order + 'H', reader.data, start + directory)
+    _check(0 < entries < 1000)
+    return None
+
+
+def _riff(reader: _Reader, start: int) -> Optional[int]:
+    _check(reader.data[start:start + 4] == b'RIFF')
+    size, = struct.unpack_from('<I', reader.data, start + 4)
+    _check(size >= 4)
+    return 8 + size
+
+
+def _ogg(reader: _Reader, start: int) -> Optional[int]:
+    _check(reader.data[start + 4] == 0)
+    return _walked(_ogg_pages, reader, start)
+
+
+def _ogg_pages(reader: _Reader, start: int) -> Optional[int]:
+    data = reader.data
+    pos = start
+    while data[pos:pos + 5] == b'OggS\x00':
+        flags, segment_count = data[pos + 5], data[pos + 26]
+        pos += 27 + segment_count + sum(data[pos + 27:pos + 27 + segment_count])
+        if flags & 0x04:  # End of stream
+            break
+    return pos - start
+
+
+def _flac(reader: _Reader, start: int) -> Optional[int]:
+    _check(reader.data[start + 4] & 0x7f == 0 and reader.data[start + 5:start + 8] == b'\x00\x00\x22')
+    return None
+
+
+def _id3(reader: _Reader, start: int) -> Optional[int]:
+    version = reader.data[start + 3]
+    _check(2 <= version <= 4 and all(byte < 0x80 for byte in reader.data[start + 6:start + 10]))
+    return None
+
+
+_BOX_TYPE = re.compile(rb'[a-zA-Z0-9 \xa9]{4}')
+
+
+def _iso_media(reader: _Reader, start: int) -> Optional[int]:
+    box_size, = struct.unpack_from('>I', reader.data, start)
+    _check(box_size >= 8 and _BOX_TYPE.fullmatch(reader.data[start + 8:start + 12]))
+    return _walked(_iso_media_boxes, reader, start)
+
+
+def _iso_media_boxes(reader: _Reader, start: int) -> Optional[int]:
+    pos = start
+    while pos + 8 <= reader.size:
+        box_size, = struct.unpack_from('>I', reader.data, pos)
+        if not _BOX_TYPE.fullmatch(reader.data[pos + 4:pos + 8]):
+            break
+        if box_size == 0:  # Box extends to the end of the file
+            return reader.size - start
+        if box_size == 1:
+            box_size, = struct.unpack_from('>Q', reader.data, pos + 8)
+        if box_size < 8:
+            break
+        pos += box_size
+    return pos - start
+
+
+def _swf(reader: _Reader, start: int) -> Optional[int]:
+    data = reader.data
+    _check(0 < data[start + 3] < 64)
+    if data[start] == 0x46:
+        _check(1 <= data[start + 8] >> 3)  # Frame rectangle field width
+    elif data[start] == 0x43:
+        _check(data[start + 8] == 0x78)  # zlib stream header
+    elif data[start] == 0x5a:
+        _check(data[start + 12] == 0x5d)  # LZMA properties
+    size, = struct.unpack_from('<I', data, start + 4)
+    _check(size > 8 and (data[start] != 0x46 or size <= reader.size - start))
+    # The length is that of the uncompressed movie
+    return size if data[start] == 0x46 else None
+
+
+def _woff(reader: _Reader, start: int) -> Optional[int]:
+    size, = struct.unpack_from('>I', reader.data, start + 8)
+    _check(size > 44)
+    return size
+
+
+def _version_one_or_two(reader: _Reader, start: int, position: int) -> Optional[int]:
+    version, = struct.unpack_from('>H', reader.data, start + position)
+    _check(version in (1, 2))
+    return None
+
+
+def _iso9660(reader: _Reader, start: int) -> Optional[int]:
+    descriptor = start + 0x8000
+    _check(reader.data[descriptor] == 1 and reader.data[descriptor + 6] == 1)
+    blocks, = struct.unpack_from('<I', reader.data, descriptor + 80)
+    block_size, = struct.unpack_from('<H', reader.data, descriptor + 128)
+    _check(block_size in (512, 1024, 2048, 4096))
+    return blocks * block_size
+
+
+def _squashfs(reader: _Reader, start: int) -> Optional[int]:
+    major, = struct.unpack_from('<H', reader.data, start + 28)
+    _check(major == 4)
+    size, = struct.unpack_from('<Q', reader.data, start + 40)
+    return size
+
+
+def _cramfs(reader: _Reader, start: int) -> Optional[int]:
+    _check(reader.data[start + 16:start + 32] == b'Compressed ROMFS')
+    size, = struct.unpack_from('<I', reader.data, start + 4)
+    return size
+
+
+def _ext(reader: _Reader, start: int) -> Optional[int]:
+    blocks, = struct.unpack_from('<I', reader.data, start + 1028)
+    log_block_size, = struct.unpack_from('<I', reader.data, start + 1048)
+    state, = struct.unpack_from('<H', reader.data, start + 1082)
+    revision, = struct.unpack_from('<I', reader.data, start + 1100)
+    _check(log_block_size <= 6 and 1 <= state <= 7 and revision <= 1 and blocks)
+    return blocks << (10 + log_block_size)
+
+
+def _ntfs(reader: _Reader, start: int) -> Optional[int]:
+    sector_size, = struct.unpack_from('<H', reader.data, start + 11)
+    _check(256 <= sector_size <= 4096 and not sector_size & (sector_size - 1))
+    sectors, = struct.unpack_from('<Q', reader.data, start + 40)
+    return (sectors + 1) * sector_size
+
+
+def _uimage(reader: _Reader, start: int) -> Optional[int]:
+    header = bytearray(reader.data[start:start + 64])
+    stored_crc, = struct.unpack_from('>I', header, 4)
+    header[4:8] = b'\x00\x00\x00\x00'
+    _check(len(header) == 64 and zlib.crc32(header) == stored_crc)
+    size, = struct.unpack_from('>I', header, 12)
+    return 64 + size
+
+
+def _pcap(reader: _Reader, start: int) -> Optional[int]:
+    order = '<' if reader.data[start] == 0xd4 else '>'
+    major, _, _, _, snap_length = struct.unpack_from(order + 'HHiII', reader.data, start + 4)
+    _check(major == 2 and snap_length)
+    return _walked(lambda reader, start: _pcap_records(reader, start, order, snap_length), reader, start)
+
+
+def _pcap_records(reader: _Reader, start: int, order: str, snap_length: int) -> Optional[int]:
+    pos = start + 24
+    limit = max(snap_length, 262144)
+    while pos + 16 <= reader.size:
+        captured, = struct.unpack_from(order + 'I', reader.data, pos + 8)
+        if captured > limit:
+            break
+        pos += 16 + captured
+    return pos - start
+
+
+def _pcapng(reader: _Reader, start: int) -> Optional[int]:
+    byte_order = reader.data[start + 8:start + 12]
+    _check(byte_order in (b'\x4d\x3c\x2b\x1a', b'\x1a\x2b\x3c\x4d'))
+    order = '<' if byte_order == b'\x4d\x3c\x2b\x1a' else '>'
+    return _walked(lambda reader, start: _pcapng_blocks(reader, start, order), reader, start)
+
+
+def _pcapng_blocks(reader: _Reader, start: int, order: str) -> Optional[int]:
+    pos = start
+    while pos + 12 <= reader.size:
+        length, = struct.unpack_from(order + 'I', reader.data, pos + 4)
+        if length < 12 or length % 4:
+            break
+        pos += length
+    return pos - start
+
+
+def _registry_hive(reader: _Reader, start: int) -> Optional[int]:
+    major, = struct.unpack_from('<I', reader.data, start + 20)
+    _check(major == 1)
+    bins_size, = struct.unpack_from('<I', reader.data, start + 40)
+    return 4096 + bins_size
+
+
+def _pem(reader: _Reader, start: int) -> Optional[int]:
+    match = re.match(rb'-----BEGIN ([A-Z0-9 ]{1,64})-----', reader.data[start:start + 80])
+    _check(match)
+    footer = b'-----END ' + match.group(1) + b'-----'
+    end = reader.find(footer, start)
+    return end + len(footer) - start if end >= 0 else None
+
+
+def _magic_only(reader: _Reader, start: int) -> Optional[int]:
+    return None
+
+
+class Signature:
+    """Magic bytes found magic_offset bytes into a file of some type, and its parser"""
+
+    def __init__(self, description: str, extension: str, magic: bytes,
+                 parse: Callable[[_Reader, int], Optional[int]] = _magic_only, magic_offset: int = 0):
+        if len(magic) < 2:
+            raise ValueError("Signature magic must be at least two bytes long")
+        self.description = description
+        self.extension = extension
+        self.magic = magic
+        self.parse = parse
+        self.magic_offset = magic_offset
+
+
+SIGNATURES = (
+    Signature("PNG image", "png", b'\x89PNG\r\n\x1a\n', _png),
+    Signature("JPEG image", "jpg", b'\xff\xd8\xff', _jpeg),
+    Signature("GIF image", "gif", b'GIF8', _gif),
+    Signature("BMP image", "bmp", b'BM', _bmp),
+    Signature("TIFF image (little-endian)", "tif", b'II*\x00', _tiff),
+    Signature("TIFF image (big-endian)", "tif", b'MM\x00*', _tiff),
+    Signature("WebP image", "webp", b'WEBP', _riff, magic_offset=8),
+    Signature("Photoshop image", "psd", b'8BPS\x00\x01'),
+    Signature("WAV audio", "wav", b'WAVE', _riff, magic_offset=8),
+    Signature("AVI video", "avi", b'AVI ', _riff, magic_offset=8),
+    Signature("Ogg container", "ogg", b'OggS', _ogg),
+    Signature("FLAC audio", "flac", b'fLaC', _flac),
+    Signature("MP3 audio with ID3v2 tag", "mp3", b'ID3', _id3),
+    Signature("ISO media (MP4/MOV/HEIF)", "mp4", b'ftyp', _iso_media, magic_offset=4),
+    Signature("Flash movie", "swf", b'FWS', _swf),
+    Signature("Flash movie (zlib compressed)", "swf", b'CWS', _swf),
+    Signature("Flash movie (LZMA compressed)", "swf", b'ZWS', _swf),
+    Signature("PDF document", "pdf", b'%PDF-', _pdf),
+    Signature("PostScript document", "ps", b'%!PS-Adobe-'),
+    Signature("RTF document", "rtf", b'{\\rtf1'),
+    Signature("OLE compound document (Office 97-2003, MSI)", "ole", b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', _ole),
+    Signature("SQLite database", "sqlite", b'SQLite format 3\x00', _sqlite),
+    Signature("WOFF font", "woff", b'wOFF', _woff),
+    Signature("ZIP archive", "zip", b'PK\x03\x04', _zip),
+    Signature("gzip compressed data", "gz", b'\x1f\x8b\x08', _gzip),
+    Signature("bzip2 compressed data", "bz2", b'BZh', _bzip2),
+    Signature("xz compressed data", "xz", b'\xfd7zXZ\x00', _xz),
+    Signature("Zstandard compressed data", "zst", b'\x28\xb5\x2f\xfd', _zstd),
+    Signature("LZ4 compressed data", "lz4", b'\x04\x22\x4d\x18', _lz4),
+    Signature("lzip compressed data", "lz", b'LZIP\x01'),
+    Signature("7-Zip archive", "7z", b'7z\xbc\xaf\x27\x1c', _seven_zip),
+    Signature("RAR archive", "rar", b'Rar!\x1a\x07', _rar),
+    Signature("Microsoft cabinet archive", "cab", b'MSCF\x00\x00\x00\x00', _cab),
+    Signature("POSIX tar archive", "tar", b'ustar', _tar, magic_offset=257),
+    Signature("cpio archive (newc)", "cpio", b'07070', _cpio),
+    Signature("ar archive", "a", b'!<arch>\n', _ar),
+    Signature("RPM package", "rpm", b'\xed\xab\xee\xdb'),
+    Signature("ELF executable", "elf", b'\x7fELF', _elf),
+    Signature("Windows PE executable", "exe", b'MZ', _pe),
+    Signature("Mach-O executable (32-bit, big-endian)", "macho", b'\xfe\xed\xfa\xce', _macho),
+    Signature("Mach-O executable (64-bit, big-endian)", "macho", b'\xfe\xed\xfa\xcf', _macho),
+    Signature("Mach-O executable (32-bit)", "macho", b'\xce\xfa\xed\xfe', _macho),
+    Signature("Mach-O executable (64-bit)", "macho", b'\xcf\xfa\xed\xfe', _macho),
+    Signature("Mach-O universal binary", "macho", b'\xca\xfe\xba\xbe', _fat_macho),
+    Signature("Java class file", "class", b'\xca\xfe\xba\xbe', _java_class),
+    Signature("Android DEX file", "dex", b'dex\n', _dex),
+    Signature("WebAssembly module", "wasm", b'\x00asm\x01\x00\x00\x00'),
+    Signature("Windows shortcut", "lnk", b'L\x00\x00\x00\x01\x14\x02\x00'),
+    Signature("Windows event log", "evtx", b'ElfFile\x00'),
+    Signature("Windows registry hive", "hive", b'regf', _registry_hive),
+    Signature("Windows help (CHM)", "chm", b'ITSF\x03\x00\x00\x00'),
+    Signature("pcap capture (little-endian)", "pcap", b'\xd4\xc3\xb2\xa1', _pcap),
+    Signature("pcap capture (big-endian)", "pcap", b'\xa1\xb2\xc3\xd4', _pcap),
+    Signature("pcapng capture", "pcapng", b'\x0a\x0d\x0d\x0a', _pcapng),
+    Signature("ISO 9660 filesystem", "iso", b'CD001', _iso9660, magic_offset=0x8001),
+    Signature("SquashFS filesystem", "squashfs", b'hsqs', _squashfs),
+    Signature("CramFS filesystem", "cramfs", b'\x45\x3d\xcd\x28', _cramfs),
+    Signature("ext2/3/4 filesystem", "ext", b'\x53\xef', _ext, magic_offset=1080),
+    Signature("NTFS filesystem", "ntfs", b'NTFS    ', _ntfs, magic_offset=3),
+    Signature("LUKS encrypted volume", "luks", b'LUKS\xba\xbe',
+              lambda reader, start: _version_one_or_two(reader, start, 6)),
+    Signature("QEMU QCOW disk image", "qcow2", b'QFI\xfb'),
+    Signature("VMware VMDK disk image", "vmdk", b'KDMV'),
+    Signature("U-Boot image", "uimage", b'\x27\x05\x19\x56', _uimage),
+    Signature("Android boot image", "img", b'ANDROID!'),
+    Signature("KeePass database", "kdbx", b'\x03\xd9\xa2\x9a\x67\xfb\x4b\xb5'),
+    Signature("Java keystore", "jks", b'\xfe\xed\xfe\xed',
+              lambda reader, start: _version_one_or_two(reader, start, 6)),
+    Signature("PEM-encoded data (keys, certificates, PGP)", "pem", b'-----BEGIN ', _pem),
+)
+
+
+class SignatureIndex:
+    """Lookup tables locating every signature's magic in a single pass.
+
+    Each position is keyed by its next two bytes; a 65536-entry table tells
+    which keys begin some magic. The few positions that survive are checked
+    against the three- and four-byte magic prefixes with sorted-array
+    lookups, still vectorized, and only then compared in full. Work per byte
+    is constant, however many signatures there are.
+    """
+
+    def __init__(self, signatures: Iterable[Signature] = SIGNATURES):
+        self.signatures = tuple(signatures)
+        self.max_magic_end = max(sig.magic_offset + len(sig.magic) for sig in self.signatures)
+        self.longest_magic = max(len(sig.magic) for sig in self.signatures)
+
+        self.first_two = np.zeros(1 << 16, dtype=bool)
+        self.two_byte = np.zeros(1 << 16, dtype=bool)
+        three_byte, four_byte = set(), set()
+        self.by_prefix: Dict[bytes, List[Signature]] = {}
+        for sig in self.signatures:
+            key = int.from_bytes(sig.magic[:2], 'big')
+            self.first_two[key] = True
+            if len(sig.magic) == 2:
+                self.two_byte[key] = True
+            elif len(sig.magic) == 3:
+                three_byte.add(int.from_bytes(sig.magic, 'big'))
+            else:
+                four_byte.add(int.from_bytes(sig.magic[:4], 'big'))
+            self.by_prefix.setdefault(sig.magic[:2], []).append(sig)
+        self.three_byte = np.array(sorted(three_byte), dtype=np.uint32)
+        self.four_byte = np.array(sorted(four_byte), dtype=np.uint32)
+
+    def positions(self, view: np.ndarray, count: int,
+                  enabled: Optional[np.ndarray] = None) -> np.ndarray:
+        """Positions below count where some magic may start (view needs count + 3 bytes).
+
+        enabled can narrow first_two to the two-byte prefixes still looked for.
+        """
+        keys = view[:count].astype(np.uint16) << 8 | view[1:count + 1]
+        positions = np.flatnonzero((self.first_two if enabled is None else enabled)[keys])
+        if not len(positions):
+            return positions
+
+        words = ((view[positions].astype(np.uint32) << 24) | (view[positions + 1].astype(np.uint32) << 16)
+                 | (view[positions + 2].astype(np.uint32) << 8) | view[positions + 3])
+        keep = self.two_byte[keys[positions]]
+        keep |= np.isin(words, self.four_byte)
+        keep |= np.isin(words >> 8, self.three_byte)
+        return positions[keep]
+
+    def matches(self, data: bytes, position: int) -> List[Signature]:
+        return [sig for sig in self.by_prefix.get(data[position:position + 2], ())
+                if data.startswith(sig.magic, position)]
+
+
+_default_index: Optional[SignatureIndex] = None
+
+
+def default_index() -> SignatureIndex:
+    global _default_index
+    if _default_index is None:
+        _default_index = SignatureIndex()
+    return _default_index
+
+
+class SignatureScanner:
+    """Finds signature matches in a stream of chunks.
+
+    Matches are recorded as (member start, signature) candidates, the start
+    being the match position less the signature's magic_offset. offset and
+    bounds work as in StringExtractor: offset is the file position of the
+    first fed byte, and only candidates starting inside bounds are kept.
+    """
+
+    def __init__(self, index: Optional[SignatureIndex] = None, offset: int = 0,
+                 bounds: Optional[Tuple[int, int]] = None,
+                 max_candidates: int = MAX_CANDIDATES):
+        self.index = index or default_index()
+        self.bounds = bounds
+        self.max_candidates = max_candidates
+        self.candidates: List[Tuple[int, Signature]] = []
+        self.truncated = False
+        self._enabled = self.index.first_two.copy()
+        self._prefix_counts: Dict[bytes, int] = {}
+        self._tail = max(self.index.longest_magic - 1, 3)
+        self._pending = b''
+        self._pending_offset = offset
+
+    def _scan(self, data: bytes, final: bool) -> int:
+        """Record the matches in data and return the position up to which it is consumed"""
+        cut = len(data) if final else max(len(data) - self._tail, 0)
+        if not cut or len(self.candidates) >= self.max_candidates:
+            return cut
+
+        view = np.frombuffer(data + b'\x00\x00\x00' if final else data, dtype=np.uint8)
+        for position in self.index.positions(view, cut, self._enabled).tolist():
+            prefix = data[position:position + 2]
+            if not self._enabled[int.from_bytes(prefix, 'big')]:
+                continue
+            for sig in self.index.matches(data, position):
+                start = self._pending_offset + position - sig.magic_offset
+                if start < 0 or (self.bounds and not self.bounds[0] <= start < self.bounds[1]):
+                    continue
+                if len(self.candidates) >= self.max_candidates:
+                    self.truncated = True
+                    return cut
+                self.candidates.append((start, sig))
+                self._prefix_counts[prefix] = self._prefix_counts.get(prefix, 0) + 1
+                if self._prefix_counts[prefix] >= MAX_CANDIDATES_PER_PREFIX:
+                    self._enabled[int.from_bytes(prefix, 'big')] = False
+                    self.truncated = True
+        return cut
+
+    def feed(self, chunk: bytes) -> None:
+        if not chunk:
+            return
+
+        data = self._pending + chunk if self._pending else bytes(chunk)
+        cut = self._scan(data, final=False)
+        self._pending = data[cut:]
+        self._pending_offset += cut
+
+    def finish(self) -> List[Tuple[int, Signature]]:
+        """Flush the carried-over bytes and return the candidates by start offset"""
+        if self._pending:
+            self._scan(self._pending, final=True)
+            self._pending_offset += len(self._pending)
+            self._pending = b''
+        self.candidates.sort(key=lambda candidate: candidate[0])
+        return self.candidates
+
+
+def carve(data, candidates: Iterable[Tuple[int, Signature]],
+          max_files: int = MAX_CARVED_FILES) -> List[Dict[str, Any]]:
+    """Validate candidates against data (bytes or a memory map) and describe the members.
+
+    A candidate inside an earlier member of the same type with a known size
+    (a ZIP's local file headers, say) is part of that member and skipped.
+    """
+    reader = _Reader(data)
+    covered: Dict[str, int] = {}
+    members = []
+    for start, sig in candidates:
+        if start < covered.get(sig.description, 0):
+            continue
+        try:
+            size = sig.parse(reader, start)
+        except (ValueError, IndexError, struct.error):
+            continue
+
+        member = {
+            "offset": start,
+            "type": sig.description,
+            "extension": sig.extension,
+            "size": size,
+            "truncated": size is not None and start + size > reader.size,
+        }
+        if size is not None:
+            covered[sig.description] = start + size
+        members.append(member)
+        if len(members) >= max_files:
+            break
+    return members
+
+
+def carve_file(path: str, candidates: Iterable[Tuple[int, Signature]],
+               max_files: int = MAX_CARVED_FILES) -> List[Dict[str, Any]]:
+    """carve() over a memory-mapped file; only the parsed pages are read"""
+    candidates = list(candidates)
+    if not candidates:
+        return []
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        return carve(mapped, candidates, max_files)
+
+
+def drop_nested(members: Iterable[Dict[str, Any]],
+                max_files: int = MAX_CARVED_FILES) -> List[Dict[str, Any]]:
+    """Drop members inside an earlier member of the same type, as carve() does"""
+    covered: Dict[str, int] = {}
+    kept = []
+    for member in members:
+        if member["offset"] < covered.get(member["type"], 0):
+            continue
+        if member["size"] is not None:
+            covered[member["type"]] = member["offset"] + member["size"]
+        kept.append(member)
+    return kept[:max_files]
+
+
+def member_range(members: Iterable[Dict[str, Any]], offset: int,
+                 file_size: int) -> Optional[Tuple[int, int, Dict[str, Any]]]:
+    """[start, end) range of the member carved at offset; unknown sizes run to the end of the file"""
+    for member in members:
+        if member["offset"] == offset:
+            size = member["size"]
+            end = file_size if size is None else min(offset + size, file_size)
+            return offset, end, member
+    return None
+
+
+def identify(header: bytes) -> Optional[str]:
+    """Description of the first signature whose header validates at the start of header"""
+    scanner = SignatureScanner(bounds=(0, 1))
+    scanner.feed(header)
+    members = carve(header, scanner.finish(), max_files=1)
+    return members[0]["type"] if members else None
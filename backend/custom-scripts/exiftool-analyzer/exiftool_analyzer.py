@@ -6,11 +6,16 @@ Analyzes files with exiftool-like functionality for metadata extraction.
 import os
 import sys
 import json
-import hashlib
 import subprocess
 from datetime import datetime
 from pathlib import Path
 
+# Shared analysis helpers live in the backend directory
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from carving import identify
+from hashing import hash_file
+from metadata import read_metadata
+
 def get_uploaded_file():
     """Get the path to the uploaded file"""
     # Check for uploaded file in the uploads directory
@@ -37,33 +42,36 @@ def analyze_file_metadata(file_path):
         
         # File signature analysis
         with open(file_path, 'rb') as f:
-            header = f.read(16)
-            metadata['File Header'] = header.hex().upper()
+            header = f.read(64 * 1024)
+            metadata['File Header'] = header[:16].hex().upper()
             
-            # Detect file type by magic bytes
-            if header.startswith(b'\xFF\xD8\xFF'):
-                metadata['File Type'] = 'JPEG Image'
-            elif header.startswith(b'\x89PNG'):
-                metadata['File Type'] = 'PNG Image'
-            elif header.startswith(b'GIF8'):
-                metadata['File Type'] = 'GIF Image'
-            elif header.startswith(b'%PDF'):
-                metadata['File Type'] = 'PDF Document'
-            elif header.startswith(b'PK\x03\x04'):
-                metadata['File Type'] = 'ZIP Archive'
-            elif header.startswith(b'\x7fELF'):
-                metadata['File Type'] = 'ELF Executable'
-            elif header.startswith(b'MZ'):
-                metadata['File Type'] = 'Windows Executable'
-            else:
-                metadata['File Type'] = 'Unknown'
+            # Detect file type by validated magic bytes
+            metadata['File Type'] = identify(header) or 'Unknown'
         
-        # Calculate hashes
-        with open(file_path, 'rb') as f:
-            content = f.read()
-            metadata['MD5'] = hashlib.md5(content).hexdigest()
-            metadata['SHA1'] = hashlib.sha1(content).hexdigest()
-            metadata['SHA256'] = hashlib.sha256(content).hexdigest()
+        # Image metadata blocks (EXIF, GPS, XMP, IPTC, comments, PNG text)
+        image_metadata = read_metadata(str(file_path)) or {}
+        exif = image_metadata.get('exif', {})
+        for section in ('IFD0', 'Exif', 'GPS', 'Interop'):
+            for tag, value in exif.get(section, {}).items():
+                metadata.setdefault(tag, value)
+        if 'gps' in image_metadata:
+            gps = image_metadata['gps']
+            metadata['GPS Position'] = f"{gps['latitude']}, {gps['longitude']}"
+        if 'thumbnail' in exif:
+            metadata['Thumbnail'] = f"{exif['thumbnail']['size']} bytes at offset {exif['thumbnail']['offset']}"
+        if 'maker_note' in exif:
+            metadata['Maker Note'] = f"{exif['maker_note'].get('size', '?')} bytes at offset {exif['maker_note']['offset']}"
+        for section in ('xmp', 'iptc', 'text'):
+            for key, value in image_metadata.get(section, {}).items():
+                metadata.setdefault(key, value)
+        if image_metadata.get('comments'):
+            metadata['Comment'] = image_metadata['comments']
+        
+        # Calculate hashes in one streamed pass
+        hashes = hash_file(file_path)
+        metadata['MD5'] = hashes['md5']
+        metadata['SHA1'] = hashes['sha1']
+        metadata['SHA256'] = hashes['sha256']
         
         # Try to extract strings if it's a binary
         try:
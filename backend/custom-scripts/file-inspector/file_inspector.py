@@ -5,10 +5,12 @@ Deep inspection of files with entropy analysis and structure detection.
 """
 import os
 import sys
-import math
 import json
 from pathlib import Path
-from collections import Counter
+
+# Shared analysis helpers live in the backend directory
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from entropy import byte_histogram, histogram_stats
 
 def get_uploaded_file():
     """Get the path to the uploaded file"""
@@ -20,23 +22,6 @@ def get_uploaded_file():
             return latest_file
     return None
 
-def calculate_entropy(data):
-    """Calculate Shannon entropy of data"""
-    if not data:
-        return 0
-    
-    counter = Counter(data)
-    length = len(data)
-    entropy = 0
-    
-    for count in counter.values():
-        if count == 0:
-            continue
-        probability = count / length
-        entropy -= probability * math.log2(probability)
-    
-    return entropy
-
 def analyze_file_structure(file_path):
     """Analyze file structure and characteristics"""
     try:
@@ -49,8 +34,10 @@ def analyze_file_structure(file_path):
         analysis['file_size'] = len(data)
         analysis['file_name'] = file_path.name
         
+        stats = histogram_stats(byte_histogram(data))
+        
         # Entropy analysis
-        entropy = calculate_entropy(data)
+        entropy = stats['entropy']
         analysis['entropy'] = round(entropy, 4)
         analysis['entropy_assessment'] = (
             'Low (structured data)' if entropy < 3 else
@@ -60,20 +47,17 @@ def analyze_file_structure(file_path):
         )
         
         # Byte frequency analysis
-        byte_freq = Counter(data)
-        analysis['unique_bytes'] = len(byte_freq)
-        analysis['most_common_byte'] = f"0x{byte_freq.most_common(1)[0][0]:02x}"
-        analysis['most_common_count'] = byte_freq.most_common(1)[0][1]
+        analysis['unique_bytes'] = stats['unique_bytes']
+        analysis['most_common_byte'] = f"0x{stats['most_common_byte'] or 0:02x}"
+        analysis['most_common_count'] = stats['most_common_count']
         
         # Null byte analysis
-        null_count = data.count(0)
-        analysis['null_bytes'] = null_count
-        analysis['null_percentage'] = round((null_count / len(data)) * 100, 2) if data else 0
+        analysis['null_bytes'] = stats['null_bytes']
+        analysis['null_percentage'] = round(stats['null_percentage'], 2)
         
         # ASCII analysis
-        ascii_count = sum(1 for b in data if 32 <= b <= 126)
-        analysis['ascii_chars'] = ascii_count
-        analysis['ascii_percentage'] = round((ascii_count / len(data)) * 100, 2) if data else 0
+        analysis['ascii_chars'] = stats['ascii_chars']
+        analysis['ascii_percentage'] = round(stats['ascii_percentage'], 2)
         
         # Pattern detection
         patterns = []
@@ -4,11 +4,27 @@ String Extractor Script
 Extract and analyze printable strings from uploaded files.
 """
 import os
-import re
 import sys
 from pathlib import Path
 from collections import Counter
 
+# Shared analysis helpers live in the backend directory
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from iocs import extract_iocs
+from strings import extract_strings as shared_extract_strings
+
+# Report labels for the indicator types of the shared IOC engine
+IOC_LABELS = {
+    'url': 'URLs',
+    'email': 'Email addresses',
+    'windows_path': 'File paths',
+    'unix_path': 'File paths',
+    'ipv4': 'IP addresses',
+    'credit_card': 'Credit card numbers',
+    'registry_key': 'Registry keys',
+    'base64': 'Base64',
+}
+
 def get_uploaded_file():
     """Get the path to the uploaded file"""
     uploads_dir = Path("/tmp/sectoolbox_uploads")
@@ -19,55 +35,32 @@ def get_uploaded_file():
             return latest_file
     return None
 
-def extract_strings(file_path, min_length=4):
-    """Extract printable strings from file"""
+def read_file(file_path):
+    """Read the uploaded file"""
     try:
         with open(file_path, 'rb') as f:
-            data = f.read()
-        
-        # Extract ASCII strings
-        ascii_strings = []
-        current_string = ""
-        
-        for byte in data:
-            if 32 <= byte <= 126:  # Printable ASCII
-                current_string += chr(byte)
-            else:
-                if len(current_string) >= min_length:
-                    ascii_strings.append(current_string)
-                current_string = ""
-        
-        # Don't forget the last string
-        if len(current_string) >= min_length:
-            ascii_strings.append(current_string)
-        
-        # Extract Unicode strings (UTF-8)
-        try:
-            text = data.decode('utf-8', errors='ignore')
-            unicode_strings = re.findall(r'[^\x00-\x1f\x7f-\x9f]{4,}', text)
-        except:
-            unicode_strings = []
+            return f.read()
+    except OSError:
+        return None
+
+def extract_strings(data, min_length=4):
+    """Extract printable strings from file contents"""
+    try:
+        strings_dict = {'ascii': [], 'unicode': [], 'wide': []}
+        categories = {'ascii': 'ascii', 'utf-8': 'unicode'}
         
-        # Extract wide strings (UTF-16)
-        wide_strings = []
-        try:
-            # Try UTF-16 LE
-            text_wide = data.decode('utf-16le', errors='ignore')
-            wide_strings.extend(re.findall(r'[^\x00-\x1f\x7f-\x9f]{4,}', text_wide))
-        except:
-            pass
+        # ASCII, UTF-8 and UTF-16/32 (wide) strings in one pass
+        for entry in shared_extract_strings(data, min_length=min_length):
+            category = categories.get(entry['encoding'], 'wide')
+            strings_dict[category].append(entry['value'])
         
-        return {
-            'ascii': ascii_strings,
-            'unicode': unicode_strings,
-            'wide': wide_strings
-        }
+        return strings_dict
         
     except Exception as e:
         return {'error': f'Failed to extract strings: {str(e)}'}
 
-def analyze_strings(strings_dict):
-    """Analyze extracted strings for interesting patterns"""
+def analyze_strings(strings_dict, data):
+    """Analyze extracted strings and the raw file contents for interesting patterns"""
     all_strings = []
     for string_type, strings in strings_dict.items():
         if string_type != 'error':
@@ -79,24 +72,10 @@ def analyze_strings(strings_dict):
         'interesting_patterns': []
     }
     
-    # Look for interesting patterns
-    patterns = {
-        'URLs': re.compile(r'https?://[^\s]+'),
-        'Email addresses': re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'),
-        'File paths': re.compile(r'[A-Za-z]:\\[\\a-zA-Z0-9\s._-]+|/[/a-zA-Z0-9\s._-]+'),
-        'IP addresses': re.compile(r'\b(?:[0-9]{1,3}\.){3}[0-9]{1,3}\b'),
-        'Credit card numbers': re.compile(r'\b(?:\d{4}[-\s]?){3}\d{4}\b'),
-        'Registry keys': re.compile(r'HKEY_[A-Z_]+\\[\\A-Za-z0-9\s._-]+'),
-        'Base64': re.compile(r'[A-Za-z0-9+/]{20,}={0,2}'),
-    }
-    
+    # Look for interesting patterns, in one pass over the raw contents
     found_patterns = {}
-    for pattern_name, pattern in patterns.items():
-        matches = []
-        for string in all_strings:
-            matches.extend(pattern.findall(string))
-        if matches:
-            found_patterns[pattern_name] = list(set(matches))  # Remove duplicates
+    for indicator in extract_iocs(data)['indicators']:
+        found_patterns.setdefault(IOC_LABELS[indicator['type']], []).append(indicator)
     
     analysis['found_patterns'] = found_patterns
     
@@ -129,14 +108,19 @@ def main():
     print("=" * 60)
     
     # Extract strings
-    strings_dict = extract_strings(uploaded_file)
+    data = read_file(uploaded_file)
+    if data is None:
+        print("❌ Error: Failed to read the uploaded file")
+        return
+    
+    strings_dict = extract_strings(data)
     
     if 'error' in strings_dict:
         print(f"❌ Error: {strings_dict['error']}")
         return
     
     # Analyze strings
-    analysis = analyze_strings(strings_dict)
+    analysis = analyze_strings(strings_dict, data)
     
     # Print results
     print(f"📊 EXTRACTION SUMMARY")
@@ -159,7 +143,8 @@ def main():
         for pattern_name, matches in analysis['found_patterns'].items():
             print(f"   {pattern_name}: {len(matches)} found")
             for match in matches[:3]:  # Show first 3 matches
-                print(f"      • {match}")
+                offsets = ", ".join(f"0x{offset:x}" for offset in match['offsets'][:3])
+                print(f"      • {match['value']} (x{match['count']} at {offsets})")
             if len(matches) > 3:
                 print(f"      ... and {len(matches) - 3} more")
             print()
@@ -0,0 +1,370 @@
+"""
+Vectorized byte histogram and entropy utilities for SectoolBox
+"""
+import math
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+
+def byte_view(data) -> np.ndarray:
+    """Zero-copy uint8 view over bytes, bytearray, memoryview or mmap data"""
+    if isinstance(data, np.ndarray):
+        return data.reshape(-1).view(np.uint8)
+    return np.frombuffer(data, dtype=np.uint8)
+
+
+def byte_histogram(data) -> np.ndarray:
+    """Count occurrences of every byte value (256 int64 buckets)"""
+    return np.bincount(byte_view(data), minlength=256).astype(np.int64, copy=False)
+
+
+def entropy_from_histogram(histogram: np.ndarray) -> float:
+    """Shannon entropy in bits per byte from a byte histogram"""
+    total = int(histogram.sum())
+    if not total:
+        return 0.0
+
+    counts = histogram[histogram > 0]
+    probabilities = counts / total
+    return float((probabilities * np.log2(1 / probabilities)).sum())
+
+
+def calculate_entropy(data) -> float:
+    """Calculate Shannon entropy of data"""
+    if not len(data):
+        return 0.0
+    return entropy_from_histogram(byte_histogram(data))
+
+
+def histogram_stats(histogram: np.ndarray) -> Dict[str, Any]:
+    """Derived byte statistics for a byte histogram"""
+    total = int(histogram.sum())
+    if not total:
+        return {
+            'total_bytes': 0,
+            'entropy': 0.0,
+            'unique_bytes': 0,
+            'most_common_byte': None,
+            'most_common_count': 0,
+            'null_bytes': 0,
+            'null_percentage': 0.0,
+            'ascii_chars': 0,
+            'ascii_percentage': 0.0,
+        }
+
+    most_common = int(histogram.argmax())
+    null_count = int(histogram[0])
+    ascii_count = int(histogram[32:127].sum())  # Printable ASCII
+    return {
+        'total_bytes': total,
+        'entropy': entropy_from_histogram(histogram),
+        'unique_bytes': int(np.count_nonzero(histogram)),
+        'most_common_byte': most_common,
+        'most_common_count': int(histogram[most_common]),
+        'null_bytes': null_count,
+        'null_percentage': null_count / total * 100,
+        'ascii_chars': ascii_count,
+        'ascii_percentage': ascii_count / total * 100,
+    }
+
+
+class ByteHistogram:
+    """Byte histogram accumulated over a stream of chunks"""
+
+    def __init__(self):
+        self.counts = np.zeros(256, dtype=np.int64)
+
+    @property
+    def total(self) -> int:
+        return int(self.counts.sum())
+
+    def update(self, chunk) -> np.ndarray:
+        """Add a chunk and return its own histogram"""
+        histogram = byte_histogram(chunk)
+        self.counts += histogram
+        return histogram
+
+    def merge(self, other: 'ByteHistogram') -> None:
+        self.counts += other.counts
+
+    def entropy(self) -> float:
+        return entropy_from_histogram(self.counts)
+
+    def stats(self) -> Dict[str, Any]:
+        return histogram_stats(self.counts)
+
+
+# Block entropy below LOW is reported as a low-entropy region (padding, text,
+# tables), at or above HIGH as high-entropy (compressed or encrypted data)
+LOW_ENTROPY_THRESHOLD = 4.0
+HIGH_ENTROPY_THRESHOLD = 7.2
+
+
+def block_histograms(data, block_size: int) -> np.ndarray:
+    """Byte histograms of consecutive blocks, one row per block, in a single bincount.
+
+    Every byte is offset by 256 times its block index, so one bincount over
+    the whole buffer yields all the block histograms at once. A trailing
+    partial block gets its own row.
+    """
+    view = byte_view(data)
+    full = len(view) // block_size
+    rows = view[:full * block_size].reshape(full, block_size)
+    offsets = (np.arange(full, dtype=np.intp) * 256)[:, None]
+    histograms = np.bincount((rows + offsets).ravel(), minlength=full * 256).reshape(full, 256)
+    if len(view) > full * block_size:
+        histograms = np.vstack((histograms, byte_histogram(view[full * block_size:])))
+    return histograms
+
+
+def entropy_from_histograms(histograms: np.ndarray) -> np.ndarray:
+    """Shannon entropy of every row of a 2-D histogram array"""
+    totals = histograms.sum(axis=1, keepdims=True)
+    probabilities = histograms / np.maximum(totals, 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        terms = np.where(histograms > 0, probabilities * np.log2(probabilities), 0.0)
+    return 0.0 - terms.sum(axis=1)
+
+
+def entropy_regions(profile: np.ndarray, block_size: int, total_size: int,
+                    max_regions: int = 1000) -> List[Dict[str, Any]]:
+    """Split a block entropy profile into runs of low, medium and high entropy"""
+    if not len(profile):
+        return []
+
+    profile = profile.astype(np.float64)
+    classes = np.digitize(profile, [LOW_ENTROPY_THRESHOLD, HIGH_ENTROPY_THRESHOLD])
+    starts = np.flatnonzero(np.diff(classes, prepend=-1))
+    ends = np.append(starts[1:], len(profile))
+    names = ('low', 'medium', 'high')
+
+    regions = []
+    for start, end in zip(starts[:max_regions].tolist(), ends[:max_regions].tolist()):
+        regions.append({
+            'start': start * block_size,
+            'end': min(end * block_size, total_size),
+            'class': names[classes[start]],
+            'mean_entropy': round(float(profile[start:end].mean()), 3),
+        })
+    return regions
+
+
+def decode_profile(values: bytes) -> List[float]:
+    """Block entropies from the little-endian float16 bytes of an EntropyProfile"""
+    return np.frombuffer(values, dtype='<f2').astype(np.float64).round(3).tolist()
+
+
+class EntropyProfile:
+    """Per-block entropy profile accumulated over a stream of chunks.
+
+    Chunks must be whole multiples of block_size, except the last one. The
+    profile is kept as float16, two bytes per block.
+    """
+
+    def __init__(self, block_size: int):
+        self.block_size = block_size
+        self._parts: List[np.ndarray] = []
+
+    def update(self, chunk) -> np.ndarray:
+        """Add a chunk and return its byte histogram"""
+        if not len(chunk):
+            return np.zeros(256, dtype=np.int64)
+        histograms = block_histograms(chunk, self.block_size)
+        self._parts.append(entropy_from_histograms(histograms).astype(np.float16))
+        return histograms.sum(axis=0)
+
+    @property
+    def values(self) -> np.ndarray:
+        if not self._parts:
+            return np.zeros(0, dtype=np.float16)
+        return np.concatenate(self._parts)
+
+
+# Bytes per Monte Carlo point: a 24-bit X and a 24-bit Y coordinate (as in ent)
+MONTE_CARLO_GROUP = 6
+_MONTE_CARLO_RADIUS_SQUARED = (256 ** 3 - 1) ** 2
+
+# Pair histogram bins reported in randomness results
+TOP_BYTE_PAIRS = 10
+
+
+def chi_square_p_value(chi_square: float, degrees_of_freedom: int) -> float:
+    """Upper-tail probability of a chi-square value (Wilson-Hilferty approximation)"""
+    k = degrees_of_freedom
+    z = ((chi_square / k) ** (1 / 3) - (1 - 2 / (9 * k))) / math.sqrt(2 / (9 * k))
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+class RandomnessTests:
+    """ent-style randomness tests accumulated over a stream of chunks.
+
+    Each chunk updates the byte-pair histogram (which also gives the serial
+    correlation) and the Monte Carlo pi estimate; chi-square and the mean
+    come from the byte histogram the caller already keeps. Accumulators for
+    consecutive segments of a file can be merged: offset is the position of
+    the segment in the file, so Monte Carlo groups stay aligned to it.
+    """
+
+    def __init__(self, offset: int = 0):
+        self.pair_counts = np.zeros(256 * 256, dtype=np.int64)
+        self.monte_carlo_hits = 0
+        self.monte_carlo_points = 0
+        self.first_byte: Optional[int] = None
+        self.last_byte: Optional[int] = None
+        # Bytes before the first group boundary, and after the last complete group
+        self._head_size = -offset % MONTE_CARLO_GROUP
+        self.head = b''
+        self.carry = b''
+
+    def _add_points(self, groups: np.ndarray) -> None:
+        groups = groups.reshape(-1, MONTE_CARLO_GROUP).astype(np.int64)
+        x = (groups[:, 0] << 16) | (groups[:, 1] << 8) | groups[:, 2]
+        y = (groups[:, 3] << 16) | (groups[:, 4] << 8) | groups[:, 5]
+        self.monte_carlo_hits += int(np.count_nonzero(x * x + y * y <= _MONTE_CARLO_RADIUS_SQUARED))
+        self.monte_carlo_points += len(groups)
+
+    def _add_monte_carlo(self, view: np.ndarray) -> None:
+        if len(self.head) < self._head_size:
+            taken = self._head_size - len(self.head)
+            self.head += view[:taken].tobytes()
+            view = view[taken:]
+        if self.carry:
+            taken = MONTE_CARLO_GROUP - len(self.carry)
+            self.carry += view[:taken].tobytes()
+            view = view[taken:]
+            if len(self.carry) < MONTE_CARLO_GROUP:
+                return
+            self._add_points(np.frombuffer(self.carry, dtype=np.uint8))
+            self.carry = b''
+        whole = len(view) - len(view) % MONTE_CARLO_GROUP
+        if whole:
+            self._add_points(view[:whole])
+        self.carry = view[whole:].tobytes()
+
+    def update(self, chunk) -> None:
+        view = byte_view(chunk)
+        if not len(view):
+            return
+
+        if self.first_byte is None:
+            self.first_byte = int(view[0])
+        else:
+            self.pair_counts[self.last_byte * 256 + int(view[0])] += 1
+        self.pair_counts += np.bincount(view[:-1].astype(np.intp) * 256 + view[1:], minlength=256 * 256)
+        self.last_byte = int(view[-1])
+
+        self._add_monte_carlo(view)
+
+    def merge(self, other: 'RandomnessTests') -> None:
+        """Append the results of the segment that follows this one"""
+        if other.first_byte is None:
+            return
+        if self.first_byte is None:
+            self.first_byte = other.first_byte
+            self.head = other.head
+        else:
+            self.pair_counts[self.last_byte * 256 + other.first_byte] += 1
+            straddling = self.carry + other.head
+            if len(straddling) == MONTE_CARLO_GROUP:
+                self._add_points(np.frombuffer(straddling, dtype=np.uint8))
+        self.pair_counts += other.pair_counts
+        self.monte_carlo_hits += other.monte_carlo_hits
+        self.monte_carlo_points += other.monte_carlo_points
+        self.last_byte = other.last_byte
+        self.carry = other.carry
+
+    def state(self) -> Dict[str, Any]:
+        """Plain-data form of the accumulator, for handing back from a worker"""
+        return {
+            "pair_counts": self.pair_counts.astype('<i8').tobytes(),
+            "monte_carlo_hits": self.monte_carlo_hits,
+            "monte_carlo_points": self.monte_carlo_points,
+            "first_byte": self.first_byte,
+            "last_byte": self.last_byte,
+            "head": self.head,
+            "carry": self.carry,
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> 'RandomnessTests':
+        tests = cls()
+        tests.pair_counts = np.frombuffer(state["pair_counts"], dtype='<i8').astype(np.int64)
+        tests.monte_carlo_hits = state["monte_carlo_hits"]
+        tests.monte_carlo_points = state["monte_carlo_points"]
+        tests.first_byte = state["first_byte"]
+        tests.last_byte = state["last_byte"]
+        tests.head = state["head"]
+        tests.carry = state["carry"]
+        return tests
+
+    def _serial_correlation(self, histogram: np.ndarray, total: int) -> Optional[float]:
+        """Correlation of each byte with the next one, wrapping around at the end (as in ent)"""
+        values = np.arange(256, dtype=np.int64)
+        pairs = self.pair_counts.reshape(256, 256)
+        # Python integers: these sums overflow int64 for multi-gigabyte files
+        products = sum(a * int(row) for a, row in enumerate((pairs * values).sum(axis=1).tolist()))
+        products += self.last_byte * self.first_byte
+        sum_values = int((histogram * values).sum())
+        sum_squares = sum(int(count) * a * a for a, count in enumerate(histogram.tolist()))
+
+        denominator = total * sum_squares - sum_values ** 2
+        if not denominator:
+            return None
+        return (total * products - sum_values ** 2) / denominator
+
+    def results(self, histogram: np.ndarray) -> Dict[str, Any]:
+        """Test results, given the byte histogram of the same data"""
+        total = int(histogram.sum())
+        if not total:
+            return {'total_bytes': 0}
+
+        expected = total / 256
+        chi_square = float(((histogram - expected) ** 2).sum() / expected)
+        mean = float((histogram * np.arange(256)).sum() / total)
+
+        results = {
+            'total_bytes': total,
+            'chi_square': round(chi_square, 2),
+            'chi_square_p_value': round(chi_square_p_value(chi_square, 255), 4),
+            'mean': round(mean, 4),
+            'serial_correlation': self._serial_correlation(histogram, total),
+            'monte_carlo_pi': None,
+            'monte_carlo_pi_error': None,
+        }
+        if self.monte_carlo_points:
+            pi = 4 * self.monte_carlo_hits / self.monte_carlo_points
+            results['monte_carlo_pi'] = round(pi, 6)
+            results['monte_carlo_pi_error'] = round(abs(pi - math.pi) / math.pi * 100, 4)
+
+        pair_total = int(self.pair_counts.sum())
+        if pair_total:
+            pair_expected = pair_total / len(self.pair_counts)
+            top = np.argsort(self.pair_counts)[::-1][:TOP_BYTE_PAIRS]
+            results['pair_chi_square'] = round(float(((self.pair_counts - pair_expected) ** 2).sum() / pair_expected), 2)
+            results['pair_entropy'] = entropy_from_histogram(self.pair_counts)
+            results['top_byte_pairs'] = [
+                {'pair': f"{index >> 8:02x}{index & 0xff:02x}", 'count': int(self.pair_counts[index])}
+                for index in top.tolist() if self.pair_counts[index]
+            ]
+
+        results['assessment'] = assess_randomness(entropy_from_histogram(histogram), results)
+        return results
+
+
+def assess_randomness(entropy: float, results: Dict[str, Any]) -> str:
+    """Rough triage of high-entropy data.
+
+    Encrypted and random data pass the chi-square test and show no serial
+    correlation. Compressed data is nearly as dense but usually fails
+    chi-square badly because of its headers and coding structure.
+    """
+    if results['total_bytes'] < 4096:
+        return 'insufficient_data'
+    if entropy < HIGH_ENTROPY_THRESHOLD:
+        return 'structured'
+    correlation = results['serial_correlation']
+    if (0.001 <= results['chi_square_p_value'] <= 0.999
+            and correlation is not None and abs(correlation) < 0.01):
+        return 'random'
+    return 'compressed'
@@ -0,0 +1,103 @@
+"""
+Process pool executor for CPU-bound file analysis
+"""
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+# Largest bytes-like argument passed to a worker. Job arguments are pickled
+# and copied into the worker, so file contents must be handed over as a path
+# to a spooled file, which the worker memory-maps
+MAX_INLINE_ARG_BYTES = 64 * 1024
+
+
+class AnalysisQueueFull(Exception):
+    """Raised when every worker is busy and the wait queue is full"""
+
+
+class AnalysisExecutor:
+    """Bounded process pool that keeps analysis work off the event loop.
+
+    At most ``max_workers`` jobs run at once and up to ``max_queued`` more
+    wait for a worker; further submissions are rejected immediately instead
+    of piling up in memory.
+    """
+
+    def __init__(self, max_workers: int, max_queued: int):
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        if max_queued < 0:
+            raise ValueError("max_queued cannot be negative")
+
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.completed = 0
+        self.rejected = 0
+        self.failed = 0
+        self._pending = 0
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def start(self) -> None:
+        if self._pool is None:
+            # Spawned workers do not inherit the event loop, Mongo client or other threads
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queued
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def submit(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Run func(*args) in a worker process and wait for the result"""
+        for arg in args:
+            if isinstance(arg, (bytes, bytearray, memoryview)) and len(arg) > MAX_INLINE_ARG_BYTES:
+                raise ValueError("Pass large data to analysis workers as a spooled file path")
+
+        if self._pending >= self.capacity:
+            self.rejected += 1
+            raise AnalysisQueueFull(f"Analysis queue full ({self.capacity} jobs)")
+
+        self.start()
+        self._pending += 1
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self._pool, func, *args)
+            self.completed += 1
+            return result
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); replace the pool for later jobs
+            self.failed += 1
+            logger.error("Analysis worker pool broken, restarting")
+            self.shutdown()
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self._pending -= 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.max_workers,
+            "max_queued": self.max_queued,
+            "pending": self._pending,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,148 @@
+"""
+File type identification for SectoolBox
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+import magic
+
+# Leading bytes handed to libmagic. Its verdict on common formats depends on
+# the first few KB, and scanning more only costs time
+MAGIC_HEADER_SIZE = 8 * 1024
+
+# (magic bytes at offset 0, extra (offset, bytes) checks, MIME type) for
+# formats libmagic always reports the same way. Containers it refines by
+# their content (ZIP-based Office files, OLE, ELF and PE variants, TIFF-based
+# raw photos) and anything plausible as text are left to libmagic
+PREFIX_SIGNATURES: Tuple[Tuple[bytes, Tuple[Tuple[int, bytes], ...], str], ...] = (
+    (b'\x89PNG\r\n\x1a\n', (), 'image/png'),
+    (b'\xff\xd8\xff', (), 'image/jpeg'),
+    (b'GIF87a', (), 'image/gif'),
+    (b'GIF89a', (), 'image/gif'),
+    (b'RIFF', ((8, b'WEBP'),), 'image/webp'),
+    (b'RIFF', ((8, b'WAVE'),), 'audio/x-wav'),
+    (b'RIFF', ((8, b'AVI '),), 'video/x-msvideo'),
+    (b'fLaC', (), 'audio/flac'),
+    (b'%PDF-', (), 'application/pdf'),
+    (b'\x1f\x8b\x08', (), 'application/gzip'),
+    (b'BZh', ((4, b'1AY&SY'),), 'application/x-bzip2'),
+    (b'\xfd7zXZ\x00', (), 'application/x-xz'),
+    (b'\x28\xb5\x2f\xfd', (), 'application/zstd'),
+    (b'\x04\x22\x4d\x18', (), 'application/x-lz4'),
+    (b'7z\xbc\xaf\x27\x1c', (), 'application/x-7z-compressed'),
+    (b'Rar!\x1a\x07', (), 'application/x-rar'),
+    (b'SQLite format 3\x00', (), 'application/vnd.sqlite3'),
+    (b'\x00asm\x01\x00\x00\x00', (), 'application/wasm'),
+)
+
+# Signatures found past the start of the file, beyond MAGIC_HEADER_SIZE
+OFFSET_SIGNATURES: Tuple[Tuple[int, bytes, str], ...] = (
+    (0x8001, b'CD001', 'application/x-iso9660-image'),
+)
+
+
+class SignatureTrie:
+    """Byte trie over magic prefixes, compiled once.
+
+    Looking a header up walks at most as many nodes as the longest magic;
+    where several magics match, the longest one whose extra checks pass wins.
+    """
+
+    def __init__(self, signatures: Iterable[Tuple[bytes, Tuple[Tuple[int, bytes], ...], str]]):
+        self._root: Dict[Any, Any] = {}
+        for prefix, checks, mime_type in signatures:
+            node = self._root
+            for byte in prefix:
+                node = node.setdefault(byte, {})
+            node.setdefault(None, []).append((checks, mime_type))
+
+    def lookup(self, header: bytes) -> Optional[str]:
+        node = self._root
+        matched: List[List[Tuple[Tuple[Tuple[int, bytes], ...], str]]] = []
+        for byte in header:
+            node = node.get(byte)
+            if node is None:
+                break
+            if None in node:
+                matched.append(node[None])
+        for entries in reversed(matched):
+            for checks, mime_type in entries:
+                if all(header.startswith(expected, offset) for offset, expected in checks):
+                    return mime_type
+        return None
+
+
+class FileTypeService:
+    """MIME type detection: signature trie, then a cache, then libmagic.
+
+    Common formats are answered by the trie without calling libmagic. Other
+    headers go to libmagic (only their first MAGIC_HEADER_SIZE bytes) through
+    a handle private to the calling thread: python-magic's module-level
+    from_buffer() shares one handle behind a lock, which serializes callers.
+    Verdicts are cached by a digest of the bytes libmagic saw, so repeated
+    headers (the same template, generator or upload) skip it entirely.
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self.trie_hits = 0
+        self.cache_hits = 0
+        self.misses = 0
+        self._trie = SignatureTrie(PREFIX_SIGNATURES)
+        self._entries: "OrderedDict[bytes, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _magic(self) -> magic.Magic:
+        handle = getattr(self._local, 'magic', None)
+        if handle is None:
+            handle = self._local.magic = magic.Magic(mime=True)
+        return handle
+
+    def mime_type(self, header: bytes) -> str:
+        """MIME type of a file from its leading bytes"""
+        mime_type = self._trie.lookup(header[:64])
+        if mime_type is None:
+            for offset, expected, offset_mime_type in OFFSET_SIGNATURES:
+                if header.startswith(expected, offset):
+                    mime_type = offset_mime_type
+                    break
+        if mime_type is not None:
+            self.trie_hits += 1
+            return mime_type
+
+        sample = bytes(header[:MAGIC_HEADER_SIZE])
+        key = hashlib.blake2b(sample, digest_size=16).digest()
+        with self._lock:
+            mime_type = self._entries.get(key)
+            if mime_type is not None:
+                self._entries.move_to_end(key)
+                self.cache_hits += 1
+                return mime_type
+
+        mime_type = self._magic().from_buffer(sample)
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = mime_type
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return mime_type
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "trie_hits": self.trie_hits,
+            "cache_hits": self.cache_hits,
+            "misses": self.misses,
+        }
+
+
+file_types = FileTypeService()
+
+
+def detect_mime_type(header: bytes) -> str:
+    """MIME type of a file from its leading bytes (shared FileTypeService)"""
+    return file_types.mime_type(header)
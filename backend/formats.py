@@ -0,0 +1,373 @@
+"""
+Container structure validation for SectoolBox
+"""
+import mmap
+import re
+import struct
+import zlib
+from typing import Dict, Any, List, Optional
+
+from carving import identify
+from security import SecurityValidator
+
+# Entries reported per file; counts and checks cover all of them
+MAX_STRUCTURE_ENTRIES = 1000
+
+# Trailing bytes handed to the signature parsers to name what follows a file
+TRAILING_SAMPLE_SIZE = 64 * 1024
+
+# A PDF reader accepts the header anywhere in the first KB
+PDF_HEADER_WINDOW = 1024
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# Chunk types from the PNG specification and its registered extensions
+PNG_KNOWN_CHUNKS = frozenset({
+    b'IHDR', b'PLTE', b'IDAT', b'IEND', b'tRNS', b'cHRM', b'gAMA', b'iCCP', b'sBIT', b'sRGB',
+    b'cICP', b'mDCV', b'cLLI', b'tEXt', b'zTXt', b'iTXt', b'bKGD', b'hIST', b'pHYs', b'sPLT',
+    b'eXIf', b'tIME', b'acTL', b'fcTL', b'fdAT', b'oFFs', b'pCAL', b'sCAL', b'sTER', b'gIFg',
+    b'gIFx', b'gIFt', b'dSIG',
+})
+
+# PDF names that make a document run code, open other resources or hide content
+PDF_RISKY_NAMES = (
+    'JavaScript', 'JS', 'OpenAction', 'AA', 'Launch', 'EmbeddedFile', 'RichMedia',
+    'XFA', 'AcroForm', 'SubmitForm', 'GoToR', 'URI', 'ObjStm', 'Encrypt',
+)
+
+# End of JPEG entropy-coded data: a marker other than a stuffed 0xFF00, a
+# restart marker or fill bytes
+_JPEG_SCAN_END = re.compile(rb'\xff[^\x00\xd0-\xd7\xff]')
+_JPEG_STANDALONE = set(range(0xd0, 0xd8)) | {0x01}
+_JPEG_NAMES = {
+    0xc4: 'DHT', 0xc8: 'JPG', 0xcc: 'DAC', 0xd8: 'SOI', 0xd9: 'EOI', 0xda: 'SOS', 0xdb: 'DQT',
+    0xdc: 'DNL', 0xdd: 'DRI', 0xde: 'DHP', 0xdf: 'EXP', 0xfe: 'COM', 0x01: 'TEM',
+}
+
+_GIF_EXTENSIONS = {0xf9: 'graphic_control', 0xfe: 'comment', 0xff: 'application', 0x01: 'plain_text'}
+
+# One pass over a PDF finds objects, cross-reference sections, %%EOF markers
+# and risky names together. Every token is matched from its first byte so
+# the regex engine can skip to candidate bytes; object numbers are then
+# read back from just before "obj"
+_PDF_TOKENS = re.compile(
+    rb'[o/%xts](?:(?<=\so)(?P<object>bj)\b'
+    rb'|(?<=/)(?P<name>' + b'|'.join(name.encode() for name in PDF_RISKY_NAMES) + rb')(?![A-Za-z0-9])'
+    rb'|(?<=%)(?P<eof>%EOF)'
+    rb'|(?<=[^A-Za-z]x)(?P<xref>ref)\b'
+    rb'|(?<=[^A-Za-z]s)(?P<startxref>tartxref\s+(?P<target>\d{1,20}))'
+    rb'|(?<=[^A-Za-z]t)(?P<trailer>railer)\b)'
+)
+_PDF_OBJECT_ID = re.compile(rb'(\d{1,10})\s+(\d{1,5})\s+$')
+_PDF_OBJECT_LOOKBACK = 32
+_PDF_OBJECT_AT = re.compile(rb'\s*\d+\s+\d+\s+obj\b')
+_NOT_PADDING = re.compile(rb'[^\x00\s]')
+
+
+def _jpeg_marker_name(marker: int) -> str:
+    if marker in _JPEG_NAMES:
+        return _JPEG_NAMES[marker]
+    if 0xc0 <= marker <= 0xcf:
+        return f"SOF{marker - 0xc0}"
+    if 0xd0 <= marker <= 0xd7:
+        return f"RST{marker - 0xd0}"
+    if 0xe0 <= marker <= 0xef:
+        return f"APP{marker - 0xe0}"
+    return f"0x{marker:02X}"
+
+
+def _label(raw: bytes) -> str:
+    return SecurityValidator.sanitize_text_input(raw.decode('latin-1'), max_length=80)
+
+
+class _Structure:
+    """Entries and findings of one walk; entries past the cap are only counted"""
+
+    def __init__(self, file_format: str):
+        self.format = file_format
+        self.entries: List[Dict[str, Any]] = []
+        self.entry_count = 0
+        self.issues: List[str] = []
+        self.details: Dict[str, Any] = {}
+
+    def add(self, offset: int, kind: str, length: int, **fields) -> None:
+        self.entry_count += 1
+        if len(self.entries) < MAX_STRUCTURE_ENTRIES:
+            self.entries.append({"offset": offset, "type": kind, "length": length, **fields})
+
+    def result(self, data, end: int, start: int = 0) -> Dict[str, Any]:
+        size = len(data)
+        end = min(end, size)
+        trailing = None
+        if end < size:
+            trailing = {
+                "offset": end,
+                "size": size - end,
+                # Zeros and whitespace are padding some writers add, anything else is appended data
+                "padding": _NOT_PADDING.search(data, end) is None,
+                "type": identify(data[end:end + TRAILING_SAMPLE_SIZE]),
+            }
+            if not trailing["padding"]:
+                self.issues.append(f"{size - end} bytes after the end of the {self.format.upper()} data")
+
+        # Other formats whose readers would accept this file too
+        polyglot = []
+        if start:
+            leading = identify(data[:start])
+            if leading:
+                polyglot.append(leading)
+        if trailing and trailing["type"]:
+            polyglot.append(trailing["type"])
+        if self.format != 'pdf' and data.find(b'%PDF-', 0, PDF_HEADER_WINDOW) >= 0:
+            polyglot.append("PDF document")
+        if data.rfind(b'PK\x05\x06', max(end, size - 0xFFFF - 22)) >= 0:
+            polyglot.append("ZIP archive")
+        polyglot = list(dict.fromkeys(polyglot))
+        if polyglot:
+            self.issues.append(f"Polyglot: also parses as {', '.join(polyglot)}")
+
+        return {
+            "format": self.format,
+            "valid": not self.issues,
+            "entries": self.entries,
+            "entry_count": self.entry_count,
+            "end": end,
+            "trailing_data": trailing,
+            "polyglot": polyglot,
+            "issues": self.issues,
+            **self.details,
+        }
+
+
+def walk_png(data) -> Dict[str, Any]:
+    """Chunks of a PNG file with their CRCs checked"""
+    structure = _Structure('png')
+    size = len(data)
+    pos = len(PNG_SIGNATURE)
+    end = None
+    unknown = []
+    bad_crc = 0
+    with memoryview(data) as view:
+        while pos + 12 <= size:
+            length, kind = struct.unpack_from('>I4s', data, pos)
+            if not kind.isalpha():
+                structure.issues.append(f"Invalid chunk type at offset {pos}")
+                end = pos
+                break
+            if length > size - pos - 12:
+                structure.issues.append(f"Truncated {kind.decode()} chunk at offset {pos}")
+                end = size
+                break
+            stored_crc, = struct.unpack_from('>I', data, pos + 8 + length)
+            crc_ok = zlib.crc32(view[pos + 4:pos + 8 + length]) == stored_crc
+            bad_crc += not crc_ok
+            if kind not in PNG_KNOWN_CHUNKS and kind not in unknown:
+                unknown.append(kind)
+            if kind == b'IHDR' and length >= 13:
+                width, height, bit_depth, color_type = struct.unpack_from('>IIBB', data, pos + 8)
+                structure.details["image"] = {
+                    "width": width, "height": height, "bit_depth": bit_depth, "color_type": color_type,
+                }
+            elif pos == len(PNG_SIGNATURE):
+                structure.issues.append("First chunk is not IHDR")
+            structure.add(pos, kind.decode(), length, crc_ok=crc_ok)
+            pos += 12 + length
+            if kind == b'IEND':
+                end = pos
+                break
+
+    if end is None:
+        structure.issues.append("Missing IEND chunk")
+        end = pos
+    if bad_crc:
+        structure.issues.append(f"{bad_crc} chunks with a bad CRC")
+    if unknown:
+        structure.issues.append(f"Non-standard chunks: {', '.join(kind.decode() for kind in unknown)}")
+    return structure.result(data, end)
+
+
+def walk_jpeg(data) -> Dict[str, Any]:
+    """Marker segments of a JPEG file; entropy-coded scan data is skipped in one search"""
+    structure = _Structure('jpeg')
+    size = len(data)
+    structure.add(0, 'SOI', 0)
+    pos = 2
+    end = None
+    while pos + 2 <= size:
+        if data[pos] != 0xff:
+            structure.issues.append(f"Expected a marker at offset {pos}")
+            end = pos
+            break
+        while pos + 2 < size and data[pos + 1] == 0xff:
+            pos += 1
+        marker = data[pos + 1]
+        name = _jpeg_marker_name(marker)
+        if marker == 0xd9:
+            structure.add(pos, name, 0)
+            end = pos + 2
+            break
+        if marker in _JPEG_STANDALONE:
+            structure.add(pos, name, 0)
+            pos += 2
+            continue
+        if pos + 4 > size:
+            break
+        length, = struct.unpack_from('>H', data, pos + 2)
+        if length < 2 or pos + 2 + length > size:
+            structure.issues.append(f"Truncated {name} segment at offset {pos}")
+            end = size
+            break
+        fields = {}
+        if 0xe0 <= marker <= 0xef:
+            # APPn payloads start with a NUL-terminated identifier (Exif, JFIF, ICC_PROFILE, ...)
+            payload = data[pos + 4:pos + 4 + min(length - 2, 64)]
+            fields["identifier"] = _label(payload.split(b'\0', 1)[0])
+        structure.add(pos, name, length, **fields)
+        pos += 2 + length
+        if marker == 0xda:
+            scan_end = _JPEG_SCAN_END.search(data, pos)
+            scan_end = size if scan_end is None else scan_end.start()
+            structure.add(pos, 'scan_data', scan_end - pos)
+            pos = scan_end
+
+    if end is None:
+        structure.issues.append("Missing EOI marker")
+        end = min(pos, size)
+    comments = sum(1 for entry in structure.entries if entry["type"] == 'COM')
+    if comments:
+        structure.details["comments"] = comments
+    return structure.result(data, end)
+
+
+def _gif_sub_blocks(data, pos: int) -> int:
+    """Offset just past a chain of data sub-blocks"""
+    while True:
+        length = data[pos]
+        pos += 1 + length
+        if not length:
+            return pos
+
+
+def walk_gif(data) -> Dict[str, Any]:
+    """Blocks of a GIF file: extensions, images and the trailer"""
+    structure = _Structure('gif')
+    size = len(data)
+    width, height, flags = struct.unpack_from('<HHB', data, 6)
+    structure.details["image"] = {"width": width, "height": height}
+    pos = 13 + (3 << ((flags & 7) + 1) if flags & 0x80 else 0)
+    end = None
+    try:
+        while pos < size:
+            kind = data[pos]
+            if kind == 0x3b:
+                structure.add(pos, 'trailer', 1)
+                end = pos + 1
+                break
+            if kind == 0x2c:
+                image_flags = data[pos + 9]
+                block_end = _gif_sub_blocks(data, pos + 11 + (3 << ((image_flags & 7) + 1) if image_flags & 0x80 else 0))
+                structure.add(pos, 'image', block_end - pos)
+            elif kind == 0x21:
+                label = data[pos + 1]
+                fields = {"label": _GIF_EXTENSIONS.get(label, f"0x{label:02X}")}
+                if label == 0xff and data[pos + 2] == 11:
+                    fields["identifier"] = _label(data[pos + 3:pos + 14])
+                block_end = _gif_sub_blocks(data, pos + 2)
+                structure.add(pos, 'extension', block_end - pos, **fields)
+            else:
+                structure.issues.append(f"Unknown block 0x{kind:02X} at offset {pos}")
+                end = pos
+                break
+            if block_end > size:
+                structure.issues.append(f"Truncated block at offset {pos}")
+                end = size
+                break
+            pos = block_end
+    except IndexError:
+        structure.issues.append(f"Truncated block at offset {pos}")
+        end = size
+
+    if end is None:
+        structure.issues.append("Missing trailer")
+        end = min(pos, size)
+    return structure.result(data, end)
+
+
+def walk_pdf(data, start: int = 0) -> Dict[str, Any]:
+    """Objects, cross-reference sections and %%EOF markers of a PDF, found in one regex pass"""
+    structure = _Structure('pdf')
+    size = len(data)
+    version = bytes(data[start + 5:start + 8]).decode('latin-1')
+    structure.add(start, 'header', 8, version=version)
+    names: Dict[str, int] = {}
+    eof_count = 0
+    end = None
+    for match in _PDF_TOKENS.finditer(data, start + 8):
+        group = match.lastgroup
+        offset = match.start()
+        if group == 'name':
+            name = match.group('name').decode()
+            names[name] = names.get(name, 0) + 1
+        elif group == 'object':
+            window_start = max(offset - _PDF_OBJECT_LOOKBACK, 0)
+            object_id = _PDF_OBJECT_ID.search(data[window_start:offset])
+            if object_id is not None:
+                structure.add(window_start + object_id.start(), 'object', offset + 3 - window_start - object_id.start(),
+                              id=f"{int(object_id.group(1))} {int(object_id.group(2))}")
+        elif group == 'startxref':
+            # Offsets count from the header, which may not be at the start of the file
+            target = int(match.group('target'))
+            position = start + target
+            # startxref points at an xref table or, since PDF 1.5, an xref stream object
+            valid = position < size and (
+                data[position:position + 4] == b'xref' or _PDF_OBJECT_AT.match(data, position) is not None
+            )
+            if not valid:
+                structure.issues.append(f"startxref at offset {offset} points to {target}, not a cross-reference section")
+            structure.add(offset, 'startxref', match.end() - offset, target=target, valid=valid)
+        elif group == 'eof':
+            eof_count += 1
+            structure.add(offset, 'eof', 5)
+            end = match.end()
+            # The end-of-line after the last marker belongs to the document
+            for eol in (b'\r\n', b'\n', b'\r'):
+                if data[end:end + len(eol)] == eol:
+                    end += len(eol)
+                    break
+        else:
+            structure.add(offset, group, match.end() - offset)
+
+    if end is None:
+        structure.issues.append("Missing %%EOF marker")
+        end = size
+    if start:
+        structure.issues.append(f"{start} bytes before the PDF header")
+    structure.details["pdf"] = {
+        "version": version,
+        "incremental_updates": max(eof_count - 1, 0),
+        "risky_names": names,
+    }
+    return structure.result(data, end, start)
+
+
+def validate_structure_bytes(data) -> Optional[Dict[str, Any]]:
+    """Walk the container structure of PNG, JPEG, GIF and PDF data; None for other formats"""
+    if data[:8] == PNG_SIGNATURE:
+        return walk_png(data)
+    if data[:3] == b'\xff\xd8\xff':
+        return walk_jpeg(data)
+    if data[:6] in (b'GIF87a', b'GIF89a') and len(data) >= 13:
+        return walk_gif(data)
+    pdf_start = data.find(b'%PDF-', 0, PDF_HEADER_WINDOW)
+    if pdf_start >= 0:
+        return walk_pdf(data, pdf_start)
+    return None
+
+
+def validate_structure(path: str) -> Optional[Dict[str, Any]]:
+    """validate_structure_bytes() over a memory-mapped file; pixels are never decoded"""
+    with open(path, 'rb') as f:
+        if not f.read(1):
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return validate_structure_bytes(mapped)
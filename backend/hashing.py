@@ -0,0 +1,104 @@
+"""
+Multi-algorithm file hashing for SectoolBox
+"""
+import hashlib
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple
+
+DEFAULT_DIGESTS = ('md5', 'sha1', 'sha256')
+SUPPORTED_DIGESTS = ('md5', 'sha1', 'sha256', 'sha512', 'blake2b', 'sha3_256', 'crc32')
+
+# Chunks smaller than this are hashed inline; threads only pay off on large buffers
+PARALLEL_MIN_CHUNK = 64 * 1024
+
+_hash_threads: Optional[ThreadPoolExecutor] = None
+
+
+class _Crc32:
+    """hashlib-style wrapper around zlib.crc32"""
+
+    def __init__(self):
+        self._value = 0
+
+    def update(self, data) -> None:
+        self._value = zlib.crc32(data, self._value)
+
+    def hexdigest(self) -> str:
+        return f"{self._value:08x}"
+
+
+def normalize_digests(names: Iterable[str]) -> Tuple[str, ...]:
+    """Validate digest names (case-insensitive, 'sha3-256' style accepted), keeping their order"""
+    digests = []
+    for name in names:
+        digest = name.strip().lower().replace('-', '_')
+        if digest not in SUPPORTED_DIGESTS:
+            raise ValueError(f"Unsupported digest: {name}")
+        if digest not in digests:
+            digests.append(digest)
+    return tuple(digests)
+
+
+def new_digest(name: str):
+    if name == 'crc32':
+        return _Crc32()
+    return hashlib.new(name)
+
+
+def _threads() -> ThreadPoolExecutor:
+    global _hash_threads
+    if _hash_threads is None:
+        _hash_threads = ThreadPoolExecutor(
+            max_workers=len(SUPPORTED_DIGESTS), thread_name_prefix="hash"
+        )
+    return _hash_threads
+
+
+class MultiHasher:
+    """Several digests computed over the same stream of chunks.
+
+    hashlib and zlib release the GIL while hashing large buffers, so each
+    chunk is fed to every digest in its own thread: the wall time is that of
+    the slowest digest rather than the sum of all of them.
+    """
+
+    def __init__(self, digests: Iterable[str] = DEFAULT_DIGESTS):
+        self._hashes = {name: new_digest(name) for name in normalize_digests(digests)}
+
+    @property
+    def digests(self) -> Tuple[str, ...]:
+        return tuple(self._hashes)
+
+    def update(self, chunk) -> None:
+        if len(self._hashes) < 2 or len(chunk) < PARALLEL_MIN_CHUNK:
+            for hash_obj in self._hashes.values():
+                hash_obj.update(chunk)
+            return
+
+        # The chunk must stay valid until every digest has consumed it
+        futures = [_threads().submit(hash_obj.update, chunk) for hash_obj in self._hashes.values()]
+        for future in futures:
+            future.result()
+
+    def hexdigests(self) -> Dict[str, str]:
+        return {name: hash_obj.hexdigest() for name, hash_obj in self._hashes.items()}
+
+
+def hash_bytes(data, digests: Iterable[str] = DEFAULT_DIGESTS) -> Dict[str, str]:
+    hasher = MultiHasher(digests)
+    hasher.update(data)
+    return hasher.hexdigests()
+
+
+def hash_file(path, digests: Iterable[str] = DEFAULT_DIGESTS,
+              chunk_size: int = 1024 * 1024) -> Dict[str, str]:
+    """Hash a file read in chunks, so memory use does not depend on its size"""
+    hasher = MultiHasher(digests)
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            hasher.update(chunk)
+    return hasher.hexdigests()
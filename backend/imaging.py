@@ -0,0 +1,102 @@
+"""
+Bounded image decoding for SectoolBox
+"""
+import math
+from typing import List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from security import SecurityConfig
+
+# Pillow's own decompression bomb check, for any image opened in this process
+Image.MAX_IMAGE_PIXELS = SecurityConfig.MAX_IMAGE_PIXELS
+
+# Scale denominators libjpeg decodes at directly, by skipping DCT coefficients
+JPEG_DRAFT_SCALES = (1, 2, 4, 8)
+
+# Modes whose bands are kept as stored. Palette images keep their indices
+# (where EzStego-style tools embed); anything else is converted to RGB
+NATIVE_MODES = ('L', 'LA', 'RGB', 'RGBA', 'CMYK', 'P')
+
+# Modes a preview can be saved as PNG in
+PREVIEW_MODES = ('1', 'L', 'LA', 'RGB', 'RGBA', 'P')
+
+
+class ImageBudgetExceeded(ValueError):
+    """The image cannot be decoded within the pixel budget"""
+
+
+def _check_dimensions(image: Image.Image) -> None:
+    width, height = image.size
+    if width * height > SecurityConfig.MAX_IMAGE_PIXELS:
+        raise ImageBudgetExceeded(f"Image dimensions {width}x{height} exceed the decoding limit")
+
+
+def open_bounded(path: str, max_pixels: int = SecurityConfig.MAX_DECODED_PIXELS
+                 ) -> Tuple[Image.Image, int, Tuple[int, int]]:
+    """Open an image so that decoding it produces at most max_pixels pixels.
+
+    Nothing is decoded here: the budget is checked against the dimensions in
+    the header. JPEGs over it are drafted to the smallest DCT scale (1/2, 1/4
+    or 1/8) that fits, which libjpeg decodes in a fraction of the time and
+    memory; other formats only decode at full size, so they are refused.
+    Returns the (still lazy) image, the scale it decodes at and the
+    dimensions declared in the header.
+    """
+    image = Image.open(path)
+    try:
+        _check_dimensions(image)
+        width, height = image.size
+        scale = 1
+        if width * height > max_pixels:
+            if image.format != 'JPEG':
+                raise ImageBudgetExceeded(f"Image exceeds the {max_pixels} pixel decoding budget")
+            scale = next((candidate for candidate in JPEG_DRAFT_SCALES
+                          if math.ceil(width / candidate) * math.ceil(height / candidate) <= max_pixels), None)
+            if scale is None:
+                raise ImageBudgetExceeded(f"Image exceeds the {max_pixels} pixel decoding budget")
+            # draft() picks the largest scale with size // requested size >= scale,
+            # so asking for the rounded-up size could fall back to a smaller scale
+            image.draft(image.mode, (max(1, width // scale), max(1, height // scale)))
+            if image.width * image.height > max_pixels:
+                raise ImageBudgetExceeded(f"Image exceeds the {max_pixels} pixel decoding budget")
+        return image, scale, (width, height)
+    except BaseException:
+        image.close()
+        raise
+
+
+def pixel_array(image: Image.Image) -> Tuple[np.ndarray, List[str]]:
+    """Decode the first frame of an image into a (height, width, channels) uint8 array and its band names"""
+    if image.mode not in NATIVE_MODES:
+        image = image.convert('L' if image.mode == '1' else 'RGB')
+    pixels = np.asarray(image, dtype=np.uint8)
+    if pixels.ndim == 2:
+        pixels = pixels[:, :, None]
+    return pixels, list(image.getbands())
+
+
+def decode_preview(path: str, decoded: Optional[Image.Image] = None,
+                   size: int = SecurityConfig.IMAGE_PREVIEW_SIZE) -> Image.Image:
+    """Downscaled copy of an image for display, at most size pixels on its longest side.
+
+    JPEGs are opened again and drafted to the DCT scale nearest the preview
+    size, which is much cheaper than resampling a full decode (and decodes at
+    most 1/64 of MAX_IMAGE_PIXELS). Other formats reuse the already decoded
+    image when one is given, shrinking it in place, and are otherwise
+    decoded within the pixel budget.
+    """
+    if decoded is not None and decoded.format != 'JPEG':
+        preview = decoded
+    else:
+        preview = Image.open(path)
+        if preview.format == 'JPEG':
+            _check_dimensions(preview)
+        else:
+            preview.close()
+            preview, _, _ = open_bounded(path)
+    preview.thumbnail((size, size))
+    if preview.mode not in PREVIEW_MODES:
+        preview = preview.convert('RGBA' if 'A' in preview.getbands() else 'RGB')
+    return preview
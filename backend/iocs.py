@@ -0,0 +1,195 @@
+"""
+Indicator of compromise extraction for SectoolBox
+"""
+import re
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+# Longest indicator matched; longer runs (mostly Base64) are reported in pieces
+MAX_IOC_LENGTH = 4096
+
+# Distinct values reported per indicator type, and offsets kept per value.
+# Counts cover every occurrence
+MAX_IOC_VALUES = 100
+MAX_IOC_OFFSETS = 10
+
+# Largest block scanned at once; bigger inputs are scanned block by block
+SCAN_BLOCK_SIZE = 1024 * 1024
+
+_PATH_WORD = rb'[A-Za-z0-9._$-]{1,64}'
+_SPACED_PATH_WORD = rb'[A-Za-z0-9_$-]{1,64} '
+_KEY_WORD = rb'[A-Za-z0-9._{}$-]{1,64}'
+
+# (type, pattern) in priority order: where several types match at the same
+# offset, the first one wins, so URLs keep their hosts and e-mail addresses
+# are not reported as Base64. Indicators start at a word boundary, with an
+# alphanumeric byte or a slash; the combined regex consumes that first byte
+# for every type, so each pattern starts with a lookbehind checking it.
+# Directory names and registry keys may contain single spaces, except in
+# their last component; in paths, a word with a dot (a file name, mostly)
+# ends the path rather than continuing after a space. Every pattern is
+# bounded by MAX_IOC_LENGTH
+IOC_PATTERNS: Tuple[Tuple[str, bytes], ...] = (
+    ('url', rb"(?:(?<=h)ttps?|(?<=f)tp)://[A-Za-z0-9\-._~:/?#\[\]@!$&'()*+,;=%]{1,4000}"),
+    ('registry_key', rb'(?<=H)KEY_[A-Z_]{4,30}\\(?:' + _KEY_WORD + rb'(?: ' + _KEY_WORD + rb'){0,3}\\){0,14}'
+                     + _KEY_WORD),
+    ('unix_path', rb'(?<=/)(?<![._+-].)[A-Za-z0-9._-]{1,255}(?:/[A-Za-z0-9._-]{1,255}){1,14}/?'),
+    ('ipv4', rb'(?<=[0-9])(?<![.].)[0-9]{0,2}(?:\.[0-9]{1,3}){3}(?![0-9]|\.[0-9])'),
+    ('credit_card', rb'(?<=[0-9])[0-9]{3}[- ]?(?:[0-9]{4}[- ]?){2}[0-9]{4}(?![0-9])'),
+    ('email', rb'(?<![._%+-].)[A-Za-z0-9._%+-]{0,63}@[A-Za-z0-9-]{1,63}(?:\.[A-Za-z0-9-]{1,63}){0,8}'
+              rb'\.[A-Za-z]{2,24}(?![A-Za-z])'),
+    ('windows_path', rb'(?<=[A-Za-z]):\\(?:(?:' + _SPACED_PATH_WORD + rb'){0,3}' + _PATH_WORD + rb'\\){0,15}'
+                     rb'[A-Za-z0-9._$-]{1,64}'),
+    ('base64', rb'(?<=[A-Za-z0-9])[A-Za-z0-9+/]{19,4093}={0,2}'),
+)
+
+IOC_TYPES = tuple(name for name, _ in IOC_PATTERNS)
+
+
+def compile_ioc_patterns(patterns: Iterable[Tuple[str, bytes]] = IOC_PATTERNS) -> "re.Pattern[bytes]":
+    """Combine typed patterns into one regex; match.lastgroup names the type matched.
+
+    The single leading character class lets the regex engine skip bytes that
+    cannot start an indicator without entering the pattern, and one
+    word-start check rejects the inside of words for every type at once.
+    Each type is marked by an empty named group at the end of its
+    alternative rather than a group around it, so every alternative still
+    starts with an assertion the engine can test before trying it.
+    """
+    alternatives = b'|'.join(b'%s(?P<%s>)' % (pattern, name.encode()) for name, pattern in patterns)
+    return re.compile(rb'[A-Za-z0-9/](?<![A-Za-z0-9].)(?:' + alternatives + rb')')
+
+
+_IOC_REGEX = compile_ioc_patterns()
+
+
+def luhn_valid(digits: str) -> bool:
+    """Whether a card number passes the Luhn checksum"""
+    total = 0
+    for index, digit in enumerate(reversed(digits)):
+        value = int(digit)
+        if index % 2:
+            value *= 2
+            if value > 9:
+                value -= 9
+        total += value
+    return total % 10 == 0
+
+
+class IOCScanner:
+    """Single-pass extraction of typed indicators (URLs, e-mail addresses,
+    paths, IPv4 addresses, card numbers, registry keys, Base64) from raw bytes.
+
+    One compiled regex with a named group per type runs over each chunk;
+    indicators are deduplicated as they are found, keeping a count and the
+    first offsets of each value. Matches near the end of a chunk that could
+    continue into the next one are carried over, as in StringExtractor, and
+    offset and bounds work the same way for scanning one segment of a file.
+    """
+
+    def __init__(self, offset: int = 0, bounds: Optional[Tuple[int, int]] = None,
+                 max_values: int = MAX_IOC_VALUES):
+        self.bounds = bounds
+        self.max_values = max_values
+        self.counts: Dict[str, int] = {name: 0 for name in IOC_TYPES}
+        self.values: Dict[str, Dict[str, Dict[str, Any]]] = {name: {} for name in IOC_TYPES}
+        self._pending = b''
+        self._pending_offset = offset
+        # Bytes of _pending already scanned, kept as lookbehind context
+        self._resume = 0
+
+    def _record(self, kind: str, value: str, offset: int) -> None:
+        if self.bounds and not self.bounds[0] <= offset < self.bounds[1]:
+            return
+        if kind == 'credit_card' and not luhn_valid(value.replace('-', '').replace(' ', '')):
+            return
+        if kind == 'ipv4' and any(int(octet) > 255 for octet in value.split('.')):
+            return
+        self.counts[kind] += 1
+        seen = self.values[kind]
+        entry = seen.get(value)
+        if entry is None:
+            if len(seen) >= self.max_values:
+                return
+            entry = seen[value] = {'count': 0, 'offsets': []}
+        entry['count'] += 1
+        if len(entry['offsets']) < MAX_IOC_OFFSETS:
+            entry['offsets'].append(offset)
+
+    def _scan(self, data: bytes, final: bool) -> int:
+        """Record the indicators in data and return the position up to which it is consumed"""
+        # A match starting before safe cannot change with more data: it ends,
+        # and its end is checked, inside data
+        safe = len(data) if final else len(data) - MAX_IOC_LENGTH - 1
+        cut = self._resume
+        for match in _IOC_REGEX.finditer(data, self._resume):
+            if match.start() >= safe:
+                return match.start()
+            self._record(match.lastgroup, match.group().decode('ascii'), self._pending_offset + match.start())
+            cut = match.end()
+        return max(cut, safe, self._resume)
+
+    def _consume(self, data: bytes, cut: int) -> None:
+        # One byte before the cut is kept for the lookbehind assertions
+        keep = max(cut - 1, 0)
+        self._pending = data[keep:]
+        self._pending_offset += keep
+        self._resume = cut - keep
+
+    def feed(self, chunk: bytes) -> None:
+        """Record the indicators completed by this chunk"""
+        if not chunk:
+            return
+        data = self._pending + chunk if self._pending else bytes(chunk)
+        self._consume(data, self._scan(data, final=False))
+
+    def finish(self) -> Dict[str, Any]:
+        """Flush the carried-over bytes and return the indicators found"""
+        if len(self._pending) > self._resume:
+            self._consume(self._pending, self._scan(self._pending, final=True))
+        return self.results()
+
+    def results(self) -> Dict[str, Any]:
+        """Counts per type and the distinct indicators, in order of first occurrence per type"""
+        return {
+            'counts': {kind: count for kind, count in self.counts.items() if count},
+            'indicators': [
+                {'type': kind, 'value': value, **entry}
+                for kind in IOC_TYPES
+                for value, entry in self.values[kind].items()
+            ],
+        }
+
+
+def merge_iocs(results: Iterable[Dict[str, Any]], max_values: int = MAX_IOC_VALUES) -> Dict[str, Any]:
+    """Combine IOCScanner results of consecutive segments of a file"""
+    counts: Dict[str, int] = {}
+    values: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    per_type: Dict[str, int] = {}
+    for result in results:
+        for kind, count in result['counts'].items():
+            counts[kind] = counts.get(kind, 0) + count
+        for indicator in result['indicators']:
+            key = (indicator['type'], indicator['value'])
+            entry = values.get(key)
+            if entry is None:
+                if per_type.get(indicator['type'], 0) >= max_values:
+                    continue
+                per_type[indicator['type']] = per_type.get(indicator['type'], 0) + 1
+                values[key] = {**indicator, 'offsets': list(indicator['offsets'])}
+            else:
+                entry['count'] += indicator['count']
+                entry['offsets'] = (entry['offsets'] + indicator['offsets'])[:MAX_IOC_OFFSETS]
+    order = {kind: index for index, kind in enumerate(IOC_TYPES)}
+    return {
+        'counts': counts,
+        'indicators': sorted(values.values(), key=lambda indicator: order[indicator['type']]),
+    }
+
+
+def extract_iocs(data: bytes, max_values: int = MAX_IOC_VALUES) -> Dict[str, Any]:
+    """Typed indicators in a buffer, with counts and offsets"""
+    scanner = IOCScanner(max_values=max_values)
+    view = memoryview(data)
+    for offset in range(0, len(view), SCAN_BLOCK_SIZE):
+        scanner.feed(view[offset:offset + SCAN_BLOCK_SIZE])
+    return scanner.finish()
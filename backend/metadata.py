@@ -0,0 +1,510 @@
+"""
+Image metadata extraction for SectoolBox
+"""
+import mmap
+import re
+import struct
+import zlib
+from typing import Dict, Any, List, Optional, Tuple
+from xml.etree.ElementTree import ParseError
+
+from defusedxml import ElementTree
+from defusedxml.common import DefusedXmlException
+from PIL.ExifTags import TAGS, GPSTAGS
+
+from security import SecurityValidator
+
+# Entries read per IFD; real files have a few dozen
+MAX_IFD_ENTRIES = 512
+
+# Values kept per file, over every block
+MAX_METADATA_VALUES = 2000
+
+# Items kept from an array value
+MAX_VALUE_ITEMS = 64
+
+# Characters kept per text value
+MAX_TEXT_LENGTH = 500
+
+# Bytes kept, as hex, from binary values
+MAX_BINARY_PREVIEW = 64
+
+# Inflated size allowed for a compressed PNG text chunk
+MAX_INFLATED_TEXT = 64 * 1024
+
+# Metadata blocks larger than this are listed but not parsed
+MAX_BLOCK_SIZE = 16 * 1024 * 1024
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+EXIF_HEADER = b'Exif\x00\x00'
+XMP_HEADER = b'http://ns.adobe.com/xap/1.0/\x00'
+PHOTOSHOP_HEADER = b'Photoshop 3.0\x00'
+PNG_XMP_KEYWORD = 'XML:com.adobe.xmp'
+
+# TIFF field types: (size of one item, struct code); None for bytes kept as is
+TIFF_TYPES = {
+    1: (1, 'B'), 2: (1, None), 3: (2, 'H'), 4: (4, 'I'), 5: (8, 'I'), 6: (1, 'b'),
+    7: (1, None), 8: (2, 'h'), 9: (4, 'i'), 10: (8, 'i'), 11: (4, 'f'), 12: (8, 'd'), 13: (4, 'I'),
+}
+TIFF_RATIONALS = (5, 10)
+
+# Pointers from one IFD to another: tag -> name of the IFD pointed to
+SUB_IFDS = {0x8769: 'Exif', 0x8825: 'GPS', 0xA005: 'Interop'}
+
+MAKER_NOTE_TAG = 0x927C
+USER_COMMENT_TAG = 0x9286
+# Windows Explorer properties, stored as UTF-16LE BYTE arrays
+XP_TAGS = range(0x9C9B, 0x9CA0)
+THUMBNAIL_OFFSET_TAG = 0x0201
+THUMBNAIL_LENGTH_TAG = 0x0202
+
+# IPTC-IIM application record (2) datasets
+IPTC_DATASETS = {
+    5: 'ObjectName', 7: 'EditStatus', 10: 'Urgency', 12: 'SubjectReference', 15: 'Category',
+    20: 'SupplementalCategories', 25: 'Keywords', 40: 'SpecialInstructions', 55: 'DateCreated',
+    60: 'TimeCreated', 62: 'DigitalCreationDate', 63: 'DigitalCreationTime', 65: 'OriginatingProgram',
+    70: 'ProgramVersion', 80: 'By-line', 85: 'By-lineTitle', 90: 'City', 92: 'Sub-location',
+    95: 'Province-State', 100: 'Country-PrimaryLocationCode', 101: 'Country-PrimaryLocationName',
+    103: 'OriginalTransmissionReference', 105: 'Headline', 110: 'Credit', 115: 'Source',
+    116: 'CopyrightNotice', 118: 'Contact', 120: 'Caption-Abstract', 122: 'Writer-Editor',
+}
+PHOTOSHOP_IPTC_RESOURCE = 0x0404
+
+_XMLNS = re.compile(rb'xmlns:([\w.-]+)\s*=\s*["\']([^"\']+)["\']')
+RDF_NAMESPACE = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#'
+
+
+def _text(raw: bytes, encoding: str = 'latin-1') -> str:
+    return SecurityValidator.sanitize_text_input(
+        raw.decode(encoding, errors='replace').rstrip('\x00').strip(), max_length=MAX_TEXT_LENGTH
+    )
+
+
+def _binary(raw: bytes) -> str:
+    """Printable ASCII as text, anything else as a hex preview"""
+    if raw and all(32 <= byte < 127 for byte in raw.rstrip(b'\x00')):
+        return _text(raw, 'ascii')
+    return raw[:MAX_BINARY_PREVIEW].hex() + ('...' if len(raw) > MAX_BINARY_PREVIEW else '')
+
+
+class _Budget:
+    """Values left for one file, shared by every block"""
+
+    def __init__(self, values: int = MAX_METADATA_VALUES):
+        self.values = values
+
+    def take(self) -> bool:
+        if self.values <= 0:
+            return False
+        self.values -= 1
+        return True
+
+
+class TiffParser:
+    """Reader of the IFD chain of a TIFF structure (EXIF blocks, eXIf chunks, TIFF files).
+
+    Offsets inside the structure are relative to its header at base; values
+    are read straight from data, so only the IFDs and the values they point
+    to are touched.
+    """
+
+    def __init__(self, data, base: int, budget: _Budget):
+        self.data = data
+        self.base = base
+        self.budget = budget
+        order = bytes(data[base:base + 2])
+        if order == b'II':
+            self.order = '<'
+        elif order == b'MM':
+            self.order = '>'
+        else:
+            raise ValueError("Not a TIFF header")
+        magic, self.first_ifd = struct.unpack_from(self.order + 'HI', data, base + 2)
+        if magic != 42:  # BigTIFF (43) uses 8-byte offsets and is not supported
+            raise ValueError("Not a TIFF header")
+        self._visited = set()
+        self.errors: List[str] = []
+
+    def _value(self, tag: int, field_type: int, count: int, position: int, size: int):
+        raw = bytes(self.data[position:position + min(size, MAX_BLOCK_SIZE)])
+        if field_type == 2:
+            return _text(raw.split(b'\x00', 1)[0])
+        if tag in XP_TAGS:
+            return _text(raw, 'utf-16-le')
+        if tag == USER_COMMENT_TAG and len(raw) >= 8:
+            # An 8-byte character code precedes the comment
+            encoding = {b'ASCII\x00\x00\x00': 'latin-1', b'UNICODE\x00': 'utf-16-be' if self.order == '>' else 'utf-16-le'}
+            return _text(raw[8:], encoding.get(raw[:8], 'latin-1'))
+        item_size, code = TIFF_TYPES[field_type]
+        if code is None:
+            return _binary(raw)
+        items = min(count, MAX_VALUE_ITEMS)
+        if field_type in TIFF_RATIONALS:
+            pairs = struct.unpack_from(f'{self.order}{items * 2}{code}', raw)
+            values = [round(num / den, 6) if den else None for num, den in zip(pairs[::2], pairs[1::2])]
+        else:
+            values = list(struct.unpack_from(f'{self.order}{items}{code}', raw))
+        return values[0] if count == 1 else values
+
+    def _scalar(self, entry: Tuple[int, int, int]) -> int:
+        field_type, _, position = entry
+        return struct.unpack_from(self.order + ('H' if field_type == 3 else 'I'), self.data, position)[0]
+
+    def ifd(self, offset: int, tags: Dict[int, str]) -> Tuple[Dict[str, Any], Dict[int, Tuple[int, int, int]], int]:
+        """Values of the IFD at offset, its (type, count, position) entries by tag and the next IFD's offset"""
+        if offset in self._visited or not offset:
+            return {}, {}, 0
+        self._visited.add(offset)
+        data, order, base = self.data, self.order, self.base
+        position = base + offset
+        if position + 2 > len(data):
+            self.errors.append(f"IFD offset {offset} is past the end of the data")
+            return {}, {}, 0
+        count, = struct.unpack_from(order + 'H', data, position)
+        # A truncated IFD keeps the entries that are present
+        available = (len(data) - position - 2) // 12
+        if count > available:
+            self.errors.append(f"IFD at offset {offset} truncated to {available} of {count} entries")
+        values: Dict[str, Any] = {}
+        entries: Dict[int, Tuple[int, int, int]] = {}
+        for index in range(min(count, available, MAX_IFD_ENTRIES)):
+            entry = position + 2 + index * 12
+            tag, field_type, item_count = struct.unpack_from(order + 'HHI', data, entry)
+            if field_type not in TIFF_TYPES:
+                continue
+            size = TIFF_TYPES[field_type][0] * item_count
+            # Values of up to 4 bytes are stored in the entry itself
+            value_position = entry + 8 if size <= 4 else base + struct.unpack_from(order + 'I', data, entry + 8)[0]
+            if value_position + size > len(data):
+                continue
+            entries[tag] = (field_type, item_count, value_position)
+            if tag in SUB_IFDS or tag == MAKER_NOTE_TAG or not self.budget.take():
+                continue
+            values[tags.get(tag, f"0x{tag:04X}")] = self._value(tag, field_type, item_count, value_position, size)
+        next_position = position + 2 + count * 12
+        next_ifd = struct.unpack_from(order + 'I', data, next_position)[0] if next_position + 4 <= len(data) else 0
+        return values, entries, next_ifd
+
+    def parse(self) -> Dict[str, Any]:
+        """Every IFD reachable from the header, by name, with thumbnail and maker note locations"""
+        result: Dict[str, Any] = {}
+        ifd0, entries0, next_ifd = self.ifd(self.first_ifd, TAGS)
+        result["IFD0"] = ifd0
+        pending = [(SUB_IFDS[tag], entries0[tag]) for tag in SUB_IFDS if tag in entries0]
+        while pending:
+            name, pointer = pending.pop(0)
+            values, entries, _ = self.ifd(self._scalar(pointer), GPSTAGS if name == 'GPS' else TAGS)
+            if values:
+                result[name] = values
+            if name == 'Exif' and 0xA005 in entries:
+                pending.append(('Interop', entries[0xA005]))
+            if MAKER_NOTE_TAG in entries:
+                _, size, position = entries[MAKER_NOTE_TAG]
+                result["maker_note"] = {
+                    "offset": position, "size": size, "header": _binary(bytes(self.data[position:position + 12])),
+                }
+
+        # IFD1 describes the embedded thumbnail, which may differ from the image
+        if next_ifd:
+            ifd1, entries1, _ = self.ifd(next_ifd, TAGS)
+            if ifd1:
+                result["IFD1"] = ifd1
+            if THUMBNAIL_OFFSET_TAG in entries1 and THUMBNAIL_LENGTH_TAG in entries1:
+                result["thumbnail"] = {
+                    "offset": self.base + self._scalar(entries1[THUMBNAIL_OFFSET_TAG]),
+                    "size": self._scalar(entries1[THUMBNAIL_LENGTH_TAG]),
+                }
+        return result
+
+
+def gps_coordinates(gps: Dict[str, Any]) -> Optional[Dict[str, float]]:
+    """Decimal degrees (and altitude in meters) from a GPS IFD"""
+    def degrees(value, ref) -> Optional[float]:
+        if not isinstance(value, list) or len(value) != 3 or None in value:
+            return None
+        decimal = value[0] + value[1] / 60 + value[2] / 3600
+        return round(-decimal if ref in ('S', 'W') else decimal, 7)
+
+    latitude = degrees(gps.get('GPSLatitude'), gps.get('GPSLatitudeRef'))
+    longitude = degrees(gps.get('GPSLongitude'), gps.get('GPSLongitudeRef'))
+    if latitude is None or longitude is None:
+        return None
+    coordinates = {"latitude": latitude, "longitude": longitude}
+    altitude = gps.get('GPSAltitude')
+    if isinstance(altitude, (int, float)):
+        coordinates["altitude"] = -altitude if gps.get('GPSAltitudeRef') == 1 else altitude
+    return coordinates
+
+
+def parse_xmp(packet: bytes, budget: _Budget) -> Dict[str, Any]:
+    """Properties of an XMP packet as "prefix:name" -> value (lists for rdf containers)"""
+    prefixes = {uri.decode('latin-1'): prefix.decode('latin-1') for prefix, uri in _XMLNS.findall(packet)}
+    start = packet.find(b'<x:xmpmeta')
+    if start < 0:
+        start = packet.find(b'<rdf:RDF')
+    try:
+        root = ElementTree.fromstring(packet[max(start, 0):packet.rfind(b'>') + 1])
+    except (ParseError, DefusedXmlException, ValueError) as e:
+        return {"error": str(e)[:200]}
+
+    def qualified(name: str) -> str:
+        if name.startswith('{'):
+            uri, local = name[1:].split('}', 1)
+            return f"{prefixes.get(uri, uri)}:{local}"
+        return name
+
+    properties: Dict[str, Any] = {}
+    for description in root.iter(f'{{{RDF_NAMESPACE}}}Description'):
+        for name, value in description.attrib.items():
+            if not name.startswith(f'{{{RDF_NAMESPACE}}}') and budget.take():
+                properties[qualified(name)] = _text(value.encode('utf-8'), 'utf-8')
+        for child in description:
+            if not budget.take():
+                break
+            items = [item for item in child.iter(f'{{{RDF_NAMESPACE}}}li')]
+            if items:
+                value = [_text((item.text or '').encode('utf-8'), 'utf-8') for item in items[:MAX_VALUE_ITEMS]]
+            elif len(child):
+                value = {qualified(grandchild.tag): _text((grandchild.text or '').encode('utf-8'), 'utf-8')
+                         for grandchild in list(child)[:MAX_VALUE_ITEMS]}
+            else:
+                value = _text((child.text or '').encode('utf-8'), 'utf-8')
+            properties[qualified(child.tag)] = value
+    return properties
+
+
+def parse_iptc(resources: bytes, budget: _Budget) -> Dict[str, Any]:
+    """IPTC-IIM datasets from the image resource blocks of a Photoshop APP13 segment"""
+    iptc: Dict[str, Any] = {}
+    position = 0
+    while position + 12 <= len(resources) and resources.startswith(b'8BIM', position):
+        resource_id, name_length = struct.unpack_from('>HB', resources, position + 4)
+        # The Pascal-string name is padded to an even length, length byte included
+        position += 6 + name_length + 1 + ((name_length + 1) & 1)
+        if position + 4 > len(resources):
+            break
+        size, = struct.unpack_from('>I', resources, position)
+        block = resources[position + 4:position + 4 + size]
+        position += 4 + size + (size & 1)
+        if resource_id != PHOTOSHOP_IPTC_RESOURCE:
+            continue
+
+        offset = 0
+        while offset + 5 <= len(block) and block[offset] == 0x1C:
+            record, dataset, length = struct.unpack_from('>BBH', block, offset + 1)
+            offset += 5
+            if length & 0x8000:
+                # Extended dataset: the low bits give the size of the length field
+                width = length & 0x7FFF
+                length = int.from_bytes(block[offset:offset + width], 'big')
+                offset += width
+            value = block[offset:offset + length]
+            offset += length
+            if record != 2 or dataset == 0 or not budget.take():
+                continue
+            name = IPTC_DATASETS.get(dataset, f"2:{dataset}")
+            text = _text(value, 'utf-8')
+            if name in iptc:
+                # Repeatable datasets (keywords, categories) become lists
+                existing = iptc[name]
+                iptc[name] = (existing if isinstance(existing, list) else [existing]) + [text]
+            else:
+                iptc[name] = text
+    return iptc
+
+
+def _png_text(kind: bytes, payload: bytes) -> Optional[Tuple[str, str]]:
+    keyword, _, rest = payload.partition(b'\x00')
+    if kind == b'tEXt':
+        return keyword.decode('latin-1'), rest.decode('latin-1', errors='replace')
+    if kind == b'zTXt':
+        compressed = rest[1:]
+        encoding = 'latin-1'
+    else:
+        # iTXt: compression flag and method, then language tag and translated keyword
+        if len(rest) < 2:
+            return None
+        flag = rest[0]
+        _, _, rest = rest[2:].partition(b'\x00')
+        _, _, text = rest.partition(b'\x00')
+        if not flag:
+            return keyword.decode('latin-1'), text.decode('utf-8', errors='replace')
+        compressed, encoding = text, 'utf-8'
+    inflater = zlib.decompressobj()
+    try:
+        # Bounded, so a compressed text chunk cannot expand without limit
+        text = inflater.decompress(compressed, MAX_INFLATED_TEXT)
+    except zlib.error:
+        return None
+    return keyword.decode('latin-1'), text.decode(encoding, errors='replace')
+
+
+class _Metadata:
+    """Blocks found in one file and the values parsed from them"""
+
+    def __init__(self, file_format: str):
+        self.format = file_format
+        self.budget = _Budget()
+        self.blocks: List[Dict[str, Any]] = []
+        self.result: Dict[str, Any] = {}
+
+    def block(self, kind: str, offset: int, length: int) -> bool:
+        self.blocks.append({"type": kind, "offset": offset, "length": length})
+        return length <= MAX_BLOCK_SIZE
+
+    def exif(self, data, base: int) -> None:
+        try:
+            parser = TiffParser(data, base, self.budget)
+            exif = parser.parse()
+        except (struct.error, ValueError, IndexError) as e:
+            self.result.setdefault("errors", []).append(f"EXIF: {str(e)[:200]}")
+            return
+        for error in parser.errors:
+            self.result.setdefault("errors", []).append(f"EXIF: {error}")
+        for name, values in exif.items():
+            self.result.setdefault("exif", {}).setdefault(name, values)
+        gps = gps_coordinates(exif.get("GPS", {}))
+        if gps:
+            self.result["gps"] = gps
+
+    def xmp(self, packet: bytes) -> None:
+        self.result.setdefault("xmp", {}).update(parse_xmp(packet, self.budget))
+
+    def iptc(self, resources: bytes) -> None:
+        self.result.setdefault("iptc", {}).update(parse_iptc(resources, self.budget))
+
+    def text(self, keyword: str, value: str) -> None:
+        if self.budget.take():
+            key = SecurityValidator.sanitize_text_input(keyword, max_length=80)
+            self.result.setdefault("text", {})[key] = _text(value.encode('utf-8'), 'utf-8')
+
+    def finish(self) -> Dict[str, Any]:
+        return {"format": self.format, "blocks": self.blocks, **self.result}
+
+
+def _jpeg_metadata(data) -> Dict[str, Any]:
+    """APP1 (EXIF, XMP), APP13 (IPTC) and COM segments, read up to the first scan"""
+    metadata = _Metadata('jpeg')
+    size = len(data)
+    pos = 2
+    while pos + 4 <= size:
+        if data[pos] != 0xff:
+            break
+        marker = data[pos + 1]
+        if marker == 0xff:
+            pos += 1
+            continue
+        if marker in (0xd9, 0xda):
+            break
+        if 0xd0 <= marker <= 0xd7 or marker == 0x01:
+            pos += 2
+            continue
+        length, = struct.unpack_from('>H', data, pos + 2)
+        payload_start = pos + 4
+        payload_end = min(pos + 2 + length, size)
+        if marker == 0xe1:
+            head = bytes(data[payload_start:payload_start + len(XMP_HEADER)])
+            if head.startswith(EXIF_HEADER):
+                if metadata.block('EXIF', pos, length):
+                    metadata.exif(data, payload_start + len(EXIF_HEADER))
+            elif head == XMP_HEADER:
+                if metadata.block('XMP', pos, length):
+                    metadata.xmp(bytes(data[payload_start + len(XMP_HEADER):payload_end]))
+        elif marker == 0xed and bytes(data[payload_start:payload_start + len(PHOTOSHOP_HEADER)]) == PHOTOSHOP_HEADER:
+            if metadata.block('IPTC', pos, length):
+                metadata.iptc(bytes(data[payload_start + len(PHOTOSHOP_HEADER):payload_end]))
+        elif marker == 0xfe:
+            if metadata.block('COM', pos, length):
+                metadata.result.setdefault("comments", []).append(_text(bytes(data[payload_start:payload_end])))
+        pos += 2 + length
+    return metadata.finish()
+
+
+def _png_metadata(data) -> Dict[str, Any]:
+    """tEXt, zTXt, iTXt and eXIf chunks; other chunks are skipped by their headers"""
+    metadata = _Metadata('png')
+    size = len(data)
+    pos = len(PNG_SIGNATURE)
+    while pos + 12 <= size:
+        length, kind = struct.unpack_from('>I4s', data, pos)
+        if length > size - pos - 12 or kind == b'IEND':
+            break
+        start = pos + 8
+        if kind == b'eXIf':
+            if metadata.block('EXIF', pos, length):
+                metadata.exif(data, start)
+        elif kind in (b'tEXt', b'zTXt', b'iTXt'):
+            if metadata.block(kind.decode(), pos, length):
+                text = _png_text(kind, bytes(data[start:start + length]))
+                if text and text[0] == PNG_XMP_KEYWORD:
+                    metadata.xmp(text[1].encode('utf-8'))
+                elif text:
+                    metadata.text(*text)
+        pos += 12 + length
+    return metadata.finish()
+
+
+def _webp_metadata(data) -> Dict[str, Any]:
+    """EXIF and XMP chunks of a WebP (RIFF) file"""
+    metadata = _Metadata('webp')
+    size = min(len(data), 8 + struct.unpack_from('<I', data, 4)[0])
+    pos = 12
+    while pos + 8 <= size:
+        kind, length = struct.unpack_from('<4sI', data, pos)
+        start = pos + 8
+        if kind == b'EXIF' and metadata.block('EXIF', pos, length):
+            # Some writers keep the JPEG "Exif\0\0" prefix
+            base = start + len(EXIF_HEADER) if bytes(data[start:start + 6]) == EXIF_HEADER else start
+            metadata.exif(data, base)
+        elif kind == b'XMP ' and metadata.block('XMP', pos, length):
+            metadata.xmp(bytes(data[start:start + length]))
+        pos = start + length + (length & 1)
+    return metadata.finish()
+
+
+def _tiff_metadata(data) -> Dict[str, Any]:
+    metadata = _Metadata('tiff')
+    metadata.block('TIFF', 0, len(data))
+    metadata.exif(data, 0)
+    return metadata.finish()
+
+
+def read_metadata_bytes(data) -> Optional[Dict[str, Any]]:
+    """EXIF (with GPS, interop and thumbnail IFDs), XMP, IPTC, comments and PNG text.
+
+    Supports JPEG, PNG, WebP and TIFF-based files. Only the metadata blocks
+    are read: segments and chunks are skipped by their headers and pixels
+    are never decoded. Maker notes are located but not decoded. Returns None
+    for other formats.
+    """
+    try:
+        if data[:3] == b'\xff\xd8\xff':
+            return _jpeg_metadata(data)
+        if data[:8] == PNG_SIGNATURE:
+            return _png_metadata(data)
+        if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+            return _webp_metadata(data)
+        if data[:4] in (b'II*\x00', b'MM\x00*'):
+            return _tiff_metadata(data)
+    except (struct.error, IndexError) as e:
+        return {"errors": [f"Truncated metadata: {str(e)[:200]}"]}
+    return None
+
+
+def read_metadata(path: str) -> Optional[Dict[str, Any]]:
+    """read_metadata_bytes() over a memory-mapped file, so only metadata pages are read"""
+    with open(path, 'rb') as f:
+        if not f.read(1):
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return read_metadata_bytes(mapped)
+
+
+def exif_summary(metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Flat tag name -> text view of the image, EXIF and GPS IFDs (the report's exif_data)"""
+    summary: Dict[str, Any] = {}
+    exif = (metadata or {}).get("exif", {})
+    for name in ("IFD0", "Exif", "GPS"):
+        for tag, value in exif.get(name, {}).items():
+            summary.setdefault(tag, value if isinstance(value, str) else str(value))
+    return summary
@@ -0,0 +1,1152 @@
+"""
+YARA-style detection rules for SectoolBox
+"""
+import hashlib
+import logging
+import mmap
+import operator
+import os
+import re
+import struct
+import threading
+from collections import OrderedDict
+from itertools import product
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from security import SecurityConfig
+
+logger = logging.getLogger(__name__)
+
+# Match offsets kept per string; #count covers every match
+MAX_STRING_MATCHES = 1000
+
+# Matches reported per string, and bytes of each shown (as hex)
+MAX_REPORTED_MATCHES = 10
+MAX_MATCH_DATA = 32
+
+# Literal bytes taken from each string for the shared atom index; the rest
+# of the string is verified where its atom occurs
+ATOM_LENGTH = 4
+
+# Positions tested per vectorized step of the atom index
+INDEX_BLOCK_SIZE = 1024 * 1024
+
+# Upper bound of unbounded hex string jumps such as [4-]
+MAX_HEX_JUMP = 64 * 1024
+
+# Longest regular expression accepted in a rule
+MAX_REGEX_LENGTH = 1024
+
+# Compiled rule sets kept per process
+RULE_SET_CACHE_SIZE = 8
+
+RULE_FILE_SUFFIXES = ('.yar', '.yara')
+
+# Bytes too common in binaries to make good atoms
+_COMMON_BYTES = frozenset(b'\x00\x20\x90\xcc\xff')
+
+_IDENTIFIER = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+_NUMBER = re.compile(r'0x[0-9A-Fa-f]+|[0-9]+(?:KB|MB)?')
+_OPERATORS = ('==', '!=', '<=', '>=', '..', '<', '>', '(', ')', '[', ']', ',', '+', '-', '*', '\\', '%')
+_KEYWORDS = frozenset((
+    'all', 'and', 'any', 'ascii', 'at', 'condition', 'false', 'filesize', 'fullword', 'global', 'import',
+    'in', 'include', 'meta', 'nocase', 'none', 'not', 'of', 'or', 'private', 'rule', 'strings', 'them',
+    'true', 'wide',
+))
+_UNSUPPORTED = frozenset((
+    'base64', 'base64wide', 'contains', 'endswith', 'entrypoint', 'for', 'icontains', 'iendswith',
+    'iequals', 'istartswith', 'matches', 'startswith', 'xor',
+))
+_TEXT_MODIFIERS = frozenset(('nocase', 'ascii', 'wide', 'fullword', 'private'))
+_REGEX_MODIFIERS = frozenset(('nocase', 'ascii', 'fullword', 'private'))
+
+# uintN/intN(offset) readers: struct format and width
+_INTEGER_READERS = {
+    'uint8': ('<B', 1), 'uint16': ('<H', 2), 'uint32': ('<I', 4),
+    'uint16be': ('>H', 2), 'uint32be': ('>I', 4),
+    'int8': ('<b', 1), 'int16': ('<h', 2), 'int32': ('<i', 4),
+    'int16be': ('>h', 2), 'int32be': ('>i', 4),
+}
+
+_COMPARISONS = {
+    '==': operator.eq, '!=': operator.ne, '<': operator.lt,
+    '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+}
+
+
+class RuleSyntaxError(ValueError):
+    """A rule source that cannot be compiled"""
+
+    def __init__(self, message: str, filename: Optional[str] = None, line: Optional[int] = None):
+        location = ':'.join(str(part) for part in (filename, line) if part is not None)
+        super().__init__(f"{location}: {message}" if location else message)
+
+
+class _StringPattern:
+    """One byte form (ASCII or wide) of a rule string, as matched in data"""
+
+    def __init__(self, slot: int, regex: "re.Pattern[bytes]", atom: Optional[Tuple[bytes, int]],
+                 nocase: bool, fullword: bool, wide: bool):
+        self.slot = slot
+        self.regex = regex
+        # (literal bytes, offset from the start of a match), or None when the
+        # string has no literal at a fixed offset and is searched on its own
+        self.atom = atom
+        self.nocase = nocase
+        self.fullword = fullword
+        self.wide = wide
+
+
+class Rule:
+    """A compiled rule: its strings are slots in the rule set, its condition a closure"""
+
+    def __init__(self, name: str, tags: List[str], meta: Dict[str, Any], private: bool,
+                 filename: str, string_slots: Dict[str, int], condition: Callable[["_ScanContext"], Any]):
+        self.name = name
+        self.tags = tags
+        self.meta = meta
+        self.private = private
+        self.filename = filename
+        self.string_slots = string_slots
+        self.condition = condition
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'tags': self.tags,
+            'meta': self.meta,
+            'private': self.private,
+            'file': self.filename,
+            'strings': len(self.string_slots),
+        }
+
+
+class _ScanContext:
+    """Matches found in one buffer, as read by rule conditions"""
+
+    def __init__(self, data, slots: int, rules: int):
+        self.data = data
+        self.size = len(data)
+        self.matches: List[List[Tuple[int, int]]] = [[] for _ in range(slots)]
+        self.counts = [0] * slots
+        self.results = [False] * rules
+
+
+def _truth(value: Any) -> bool:
+    return value is not None and bool(value)
+
+
+def _atom_score(window: bytes) -> int:
+    return 2 * len(window) + len(set(window)) - 3 * sum(byte in _COMMON_BYTES for byte in window)
+
+
+def _best_atom(runs: Sequence[Tuple[bytes, int]]) -> Optional[Tuple[bytes, int]]:
+    """Pick the literal window of up to ATOM_LENGTH bytes least likely to occur by chance.
+
+    runs are literal byte runs with their offsets from the start of the string.
+    """
+    best = None
+    for run, offset in runs:
+        width = min(ATOM_LENGTH, len(run))
+        for start in range(len(run) - width + 1):
+            window = run[start:start + width]
+            if best is None or _atom_score(window) > _atom_score(best[0]):
+                best = (window, offset + start)
+    return best
+
+
+def _case_variants(atom: bytes) -> List[bytes]:
+    options = [sorted({bytes([byte]).lower(), bytes([byte]).upper()}) for byte in atom]
+    return [b''.join(variant) for variant in product(*options)]
+
+
+def _check_regex_nesting(pattern: str) -> None:
+    """Reject quantified groups that contain quantifiers, e.g. (a+)+.
+
+    Workers have no time limit, and nested quantifiers are what makes a
+    backtracking regex take exponential time on unlucky input.
+    """
+    groups = [False]
+    in_class = False
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        if char == '\\':
+            index += 2
+            continue
+        if in_class:
+            in_class = char != ']'
+        elif char == '[':
+            in_class = True
+            if pattern[index + 1:index + 2] == ']':
+                index += 1
+        elif char == '(':
+            groups.append(False)
+            if pattern[index + 1:index + 2] == '?':
+                index += 1  # (?:, (?=, (?P<name> ... are not quantifiers
+        elif char == ')' and len(groups) > 1:
+            quantified = groups.pop()
+            following = pattern[index + 1:index + 2]
+            if quantified and following and following in '*+{':
+                raise ValueError("nested quantifiers are not supported")
+            groups[-1] = groups[-1] or quantified
+        elif char in '*+?{':
+            groups[-1] = True
+        index += 1
+
+
+def _regex_prefix(pattern: bytes) -> bytes:
+    """Literal bytes every match of a regular expression starts with"""
+    if b'|' in pattern:
+        return b''
+    prefix = bytearray()
+    index = 0
+    while index < len(pattern) and len(prefix) < ATOM_LENGTH:
+        char = pattern[index:index + 1]
+        if char == b'\\':
+            escaped = pattern[index + 1:index + 2]
+            if re.fullmatch(rb'x[0-9A-Fa-f]{2}', pattern[index + 1:index + 4]):
+                literal, width = bytes.fromhex(pattern[index + 2:index + 4].decode()), 4
+            elif escaped and not escaped.isalnum():
+                literal, width = escaped, 2
+            else:
+                break
+        elif char in b'.^$*+?()[]{}':
+            break
+        else:
+            literal, width = char, 1
+        if pattern[index + width:index + width + 1] in (b'*', b'+', b'?', b'{'):
+            break
+        prefix += literal
+        index += width
+    return bytes(prefix)
+
+
+class _Parser:
+    """Recursive descent parser for a YARA subset: text, hex and regex strings,
+    and boolean conditions over them (no modules, for loops or includes)"""
+
+    def __init__(self, source: str, filename: str, builder: "_RuleBuilder"):
+        self.source = source
+        self.filename = filename
+        self.builder = builder
+        self.pos = 0
+
+    # -- lexing -------------------------------------------------------------
+
+    def error(self, message: str, pos: Optional[int] = None) -> RuleSyntaxError:
+        line = self.source.count('\n', 0, self.pos if pos is None else pos) + 1
+        return RuleSyntaxError(message, self.filename, line)
+
+    def skip(self) -> None:
+        """Skip whitespace and comments"""
+        source = self.source
+        while self.pos < len(source):
+            char = source[self.pos]
+            if char.isspace():
+                self.pos += 1
+            elif source.startswith('//', self.pos):
+                end = source.find('\n', self.pos)
+                self.pos = len(source) if end < 0 else end + 1
+            elif source.startswith('/*', self.pos):
+                end = source.find('*/', self.pos + 2)
+                if end < 0:
+                    raise self.error("unterminated comment")
+                self.pos = end + 2
+            else:
+                break
+
+    def peek_char(self) -> str:
+        self.skip()
+        return self.source[self.pos:self.pos + 1]
+
+    def accept(self, literal: str) -> bool:
+        self.skip()
+        if self.source.startswith(literal, self.pos):
+            self.pos += len(literal)
+            return True
+        return False
+
+    def expect(self, literal: str) -> None:
+        if not self.accept(literal):
+            raise self.error(f"expected '{literal}'")
+
+    def identifier(self) -> str:
+        self.skip()
+        match = _IDENTIFIER.match(self.source, self.pos)
+        if not match:
+            raise self.error("expected an identifier")
+        self.pos = match.end()
+        return match.group()
+
+    def peek_identifier(self) -> Optional[str]:
+        self.skip()
+        match = _IDENTIFIER.match(self.source, self.pos)
+        return match.group() if match else None
+
+    def peek_section(self) -> Optional[str]:
+        """Name of the section (meta:, strings:, condition:) starting here, if any"""
+        start = self.pos
+        word = self.peek_identifier()
+        if word in ('meta', 'strings', 'condition'):
+            self.pos += len(word)
+            if self.peek_char() == ':':
+                self.pos = start
+                return word
+        self.pos = start
+        return None
+
+    def quoted(self) -> str:
+        """A double-quoted string, with \\n \\t \\r \\\\ \\" and \\xHH escapes"""
+        self.expect('"')
+        chars = []
+        source = self.source
+        while True:
+            if self.pos >= len(source) or source[self.pos] == '\n':
+                raise self.error("unterminated string")
+            char = source[self.pos]
+            self.pos += 1
+            if char == '"':
+                return ''.join(chars)
+            if char == '\\':
+                escaped = source[self.pos:self.pos + 1]
+                self.pos += 1
+                if escaped == 'x':
+                    digits = source[self.pos:self.pos + 2]
+                    if not re.fullmatch(r'[0-9A-Fa-f]{2}', digits):
+                        raise self.error("invalid \\x escape")
+                    chars.append(chr(int(digits, 16)))
+                    self.pos += 2
+                elif escaped in ('n', 't', 'r', '\\', '"'):
+                    chars.append({'n': '\n', 't': '\t', 'r': '\r'}.get(escaped, escaped))
+                else:
+                    raise self.error(f"invalid escape \\{escaped}")
+            else:
+                chars.append(char)
+
+    # -- rules --------------------------------------------------------------
+
+    def parse(self) -> None:
+        while self.peek_char():
+            start = self.pos
+            word = self.identifier()
+            if word in ('import', 'include'):
+                raise self.error(f"{word} is not supported", start)
+            private = False
+            while word in ('private', 'global'):
+                if word == 'global':
+                    raise self.error("global rules are not supported", start)
+                private = True
+                word = self.identifier()
+            if word != 'rule':
+                raise self.error("expected 'rule'", start)
+            self.rule(private)
+
+    def rule(self, private: bool) -> None:
+        start = self.pos
+        name = self.identifier()
+        if name in _KEYWORDS or name in _UNSUPPORTED:
+            raise self.error(f"'{name}' is a reserved word", start)
+        if name in self.builder.rule_indexes:
+            raise self.error(f"duplicate rule '{name}'", start)
+        tags = []
+        if self.accept(':'):
+            while self.peek_char() != '{':
+                tags.append(self.identifier())
+        self.expect('{')
+
+        meta: Dict[str, Any] = {}
+        strings: "OrderedDict[str, List[_StringPattern]]" = OrderedDict()
+        section = self.peek_section()
+        if section == 'meta':
+            self.identifier()
+            self.expect(':')
+            while self.peek_section() is None and self.peek_char() != '}':
+                key = self.identifier()
+                self.expect('=')
+                meta[key] = self.meta_value()
+            section = self.peek_section()
+        if section == 'strings':
+            self.identifier()
+            self.expect(':')
+            while self.peek_char() == '$':
+                self.string_definition(strings)
+            section = self.peek_section()
+        if section != 'condition':
+            raise self.error("expected 'condition:'")
+        self.identifier()
+        self.expect(':')
+
+        self.strings = strings
+        condition = self.expression()
+        self.expect('}')
+        self.builder.add_rule(name, tags, meta, private, self.filename, strings, condition)
+
+    def meta_value(self) -> Any:
+        char = self.peek_char()
+        if char == '"':
+            return self.quoted()
+        negative = self.accept('-')
+        match = _NUMBER.match(self.source, self.pos)
+        if match:
+            self.pos = match.end()
+            value = self.number_value(match.group())
+            return -value if negative else value
+        word = self.peek_identifier()
+        if not negative and word in ('true', 'false'):
+            self.pos += len(word)
+            return word == 'true'
+        raise self.error("expected a string, number or boolean")
+
+    @staticmethod
+    def number_value(text: str) -> int:
+        if text.startswith('0x'):
+            return int(text, 16)
+        if text.endswith('KB'):
+            return int(text[:-2]) * 1024
+        if text.endswith('MB'):
+            return int(text[:-2]) * 1024 * 1024
+        return int(text)
+
+    # -- strings ------------------------------------------------------------
+
+    def string_definition(self, strings: "OrderedDict[str, List[_StringPattern]]") -> None:
+        start = self.pos
+        self.expect('$')
+        match = re.compile(r'[A-Za-z0-9_]*').match(self.source, self.pos)
+        self.pos = match.end()
+        # Anonymous strings ($ = ...) get keys no identifier can spell
+        identifier = '$' + match.group() if match.group() else f'$ {len(strings)}'
+        if identifier in strings:
+            raise self.error(f"duplicate string '{identifier}'", start)
+        self.expect('=')
+
+        char = self.peek_char()
+        if char == '"':
+            kind, value = 'text', self.quoted().encode('utf-8')
+        elif char == '{':
+            kind, value = 'hex', self.hex_string()
+        elif char == '/':
+            kind, value = 'regex', self.regex_string()
+        else:
+            raise self.error("expected a text, hex or regular expression string")
+
+        modifiers = set()
+        allowed = {'text': _TEXT_MODIFIERS, 'hex': frozenset(('private',)), 'regex': _REGEX_MODIFIERS}[kind]
+        while self.peek_char() not in ('$', '}', ''):
+            modifier_start = self.pos
+            word = self.peek_identifier()
+            if word is None or word in ('meta', 'strings', 'condition') and self.peek_section():
+                break
+            self.pos += len(word)
+            if word not in allowed:
+                if word in _UNSUPPORTED or word in _TEXT_MODIFIERS:
+                    raise self.error(f"'{word}' is not supported for {kind} strings", modifier_start)
+                raise self.error(f"unknown string modifier '{word}'", modifier_start)
+            modifiers.add(word)
+
+        slot = self.builder.new_slot()
+        strings[identifier] = self.builder.string_patterns(slot, kind, value, modifiers, self.error)
+
+    def hex_string(self) -> List[Tuple]:
+        self.expect('{')
+        items = self.hex_sequence('}')
+        self.expect('}')
+        if not items:
+            raise self.error("empty hex string")
+        if items[0][0] == 'jump' or items[-1][0] == 'jump':
+            raise self.error("hex strings cannot start or end with a jump")
+        return items
+
+    def hex_sequence(self, closing: str) -> List[Tuple]:
+        """Hex string items up to a closing brace, alternative bar or parenthesis"""
+        items: List[Tuple] = []
+        while True:
+            char = self.peek_char()
+            if char in (closing, '|', ')', '}', ''):
+                return items
+            start = self.pos
+            if char == '[':
+                self.pos += 1
+                match = re.compile(r'\s*(\d*)\s*(-?)\s*(\d*)\s*\]').match(self.source, self.pos)
+                if not match or not (match.group(1) or match.group(2)):
+                    raise self.error("invalid jump", start)
+                self.pos = match.end()
+                low = int(match.group(1) or 0)
+                high = int(match.group(3)) if match.group(3) else (low if not match.group(2) else None)
+                if high is not None and high < low:
+                    raise self.error("invalid jump range", start)
+                items.append(('jump', low, high))
+            elif char == '(':
+                self.pos += 1
+                alternatives = [self.hex_sequence(')')]
+                while self.accept('|'):
+                    alternatives.append(self.hex_sequence(')'))
+                self.expect(')')
+                if any(not alternative for alternative in alternatives):
+                    raise self.error("empty hex alternative", start)
+                items.append(('alternatives', alternatives))
+            else:
+                negated = self.accept('~')
+                token = self.source[self.pos:self.pos + 2]
+                if not re.fullmatch(r'[0-9A-Fa-f?]{2}', token):
+                    raise self.error("invalid hex byte", start)
+                self.pos += 2
+                if negated:
+                    if '?' in token:
+                        raise self.error("negated wildcards are not supported", start)
+                    items.append(('not', int(token, 16)))
+                elif token == '??':
+                    items.append(('any',))
+                elif '?' in token:
+                    items.append(('nibble', token))
+                else:
+                    items.append(('byte', int(token, 16)))
+
+    def regex_string(self) -> Tuple[str, str]:
+        """A /pattern/flags regular expression, with \\/ unescaped"""
+        start = self.pos
+        self.expect('/')
+        chars = []
+        source = self.source
+        while True:
+            if self.pos >= len(source) or source[self.pos] == '\n':
+                raise self.error("unterminated regular expression", start)
+            char = source[self.pos]
+            self.pos += 1
+            if char == '/':
+                break
+            if char == '\\' and source[self.pos:self.pos + 1] == '/':
+                chars.append('/')
+                self.pos += 1
+            elif char == '\\':
+                chars.append(source[self.pos - 1:self.pos + 1])
+                self.pos += 1
+            else:
+                chars.append(char)
+        flags = re.compile(r'[is]*').match(source, self.pos).group()
+        self.pos += len(flags)
+        return ''.join(chars), flags
+
+    # -- conditions -----------------------------------------------------------
+
+    def token(self) -> Tuple[str, Any]:
+        """Next condition token as (kind, value)"""
+        self.skip()
+        source = self.source
+        if self.pos >= len(source):
+            return ('end', None)
+        char = source[self.pos]
+        if char in '$#@!' and source[self.pos:self.pos + 2] != '!=':
+            # Only $ references take a trailing * wildcard; #a*2 is a product
+            match = re.compile(r'[A-Za-z0-9_]*\*?' if char == '$' else r'[A-Za-z0-9_]*').match(source, self.pos + 1)
+            self.pos = match.end()
+            return ({'$': 'string', '#': 'count', '@': 'offset', '!': 'length'}[char], '$' + match.group())
+        match = _NUMBER.match(source, self.pos)
+        if match and not _IDENTIFIER.match(source, match.end()):
+            self.pos = match.end()
+            return ('number', self.number_value(match.group()))
+        match = _IDENTIFIER.match(source, self.pos)
+        if match:
+            self.pos = match.end()
+            return ('word', match.group())
+        for symbol in _OPERATORS:
+            if source.startswith(symbol, self.pos):
+                self.pos += len(symbol)
+                return ('op', symbol)
+        return ('char', char)
+
+    def peek_token(self) -> Tuple[str, Any]:
+        start = self.pos
+        token = self.token()
+        self.pos = start
+        return token
+
+    def accept_token(self, kind: str, value: Any) -> bool:
+        start = self.pos
+        if self.token() == (kind, value):
+            return True
+        self.pos = start
+        return False
+
+    def expect_token(self, kind: str, value: Any) -> None:
+        if not self.accept_token(kind, value):
+            raise self.error(f"expected '{value}'")
+
+    def expression(self) -> Callable:
+        left = self.conjunction()
+        while self.accept_token('word', 'or'):
+            left = (lambda a, b: lambda ctx: _truth(a(ctx)) or _truth(b(ctx)))(left, self.conjunction())
+        return left
+
+    def conjunction(self) -> Callable:
+        left = self.negation()
+        while self.accept_token('word', 'and'):
+            left = (lambda a, b: lambda ctx: _truth(a(ctx)) and _truth(b(ctx)))(left, self.negation())
+        return left
+
+    def negation(self) -> Callable:
+        if self.accept_token('word', 'not'):
+            operand = self.negation()
+            return lambda ctx: not _truth(operand(ctx))
+        return self.comparison()
+
+    def comparison(self) -> Callable:
+        left = self.arithmetic()
+        start = self.pos
+        kind, value = self.token()
+        if kind == 'op' and value in _COMPARISONS:
+            compare, right = _COMPARISONS[value], self.arithmetic()
+
+            def compared(ctx, left=left, right=right):
+                a, b = left(ctx), right(ctx)
+                return a is not None and b is not None and compare(a, b)
+            return compared
+        if kind == 'word' and value in _UNSUPPORTED:
+            raise self.error(f"'{value}' is not supported", start)
+        self.pos = start
+        return left
+
+    def arithmetic(self) -> Callable:
+        left = self.term()
+        while True:
+            if self.accept_token('op', '+'):
+                left = self.binary(left, self.term(), operator.add)
+            elif self.accept_token('op', '-'):
+                left = self.binary(left, self.term(), operator.sub)
+            else:
+                return left
+
+    def term(self) -> Callable:
+        left = self.unary()
+        while True:
+            if self.accept_token('op', '*'):
+                left = self.binary(left, self.unary(), operator.mul)
+            elif self.accept_token('op', '\\'):
+                left = self.binary(left, self.unary(), operator.floordiv)
+            elif self.accept_token('op', '%'):
+                left = self.binary(left, self.unary(), operator.mod)
+            else:
+                return left
+
+    @staticmethod
+    def binary(left: Callable, right: Callable, function: Callable) -> Callable:
+        def evaluated(ctx):
+            a, b = left(ctx), right(ctx)
+            if a is None or b is None or (function in (operator.floordiv, operator.mod) and b == 0):
+                return None
+            return function(int(a), int(b))
+        return evaluated
+
+    def unary(self) -> Callable:
+        if self.accept_token('op', '-'):
+            operand = self.unary()
+            return lambda ctx: None if operand(ctx) is None else -operand(ctx)
+        return self.primary()
+
+    def string_slot(self, identifier: str, start: int) -> int:
+        if identifier.endswith('*') or identifier == '$':
+            raise self.error(f"'{identifier}' can only be used in an 'of' set", start)
+        if identifier not in self.strings:
+            raise self.error(f"undefined string '{identifier}'", start)
+        return self.strings[identifier][0].slot
+
+    def string_set(self) -> List[int]:
+        """Slots of 'them' or a parenthesized list of strings, with * wildcards"""
+        if self.accept_token('word', 'them'):
+            identifiers = list(self.strings)
+        else:
+            self.expect_token('op', '(')
+            identifiers = []
+            while True:
+                start = self.pos
+                kind, value = self.token()
+                if kind != 'string':
+                    raise self.error("expected a string identifier", start)
+                if value.endswith('*'):
+                    matched = [name for name in self.strings if name.startswith(value[:-1])]
+                    if not matched:
+                        raise self.error(f"no strings match '{value}'", start)
+                    identifiers.extend(matched)
+                else:
+                    self.string_slot(value, start)
+                    identifiers.append(value)
+                if not self.accept_token('op', ','):
+                    break
+            self.expect_token('op', ')')
+        if not identifiers:
+            raise self.error("the rule has no strings")
+        return sorted({self.strings[identifier][0].slot for identifier in identifiers})
+
+    def quantified(self, quantity: Any) -> Callable:
+        """N of (...), any/all/none of them"""
+        slots = self.string_set()
+        if quantity == 'any':
+            return lambda ctx: any(ctx.counts[slot] for slot in slots)
+        if quantity == 'all':
+            return lambda ctx: all(ctx.counts[slot] for slot in slots)
+        if quantity == 'none':
+            return lambda ctx: not any(ctx.counts[slot] for slot in slots)
+
+        def at_least(ctx):
+            needed = quantity(ctx)
+            return needed is not None and sum(1 for slot in slots if ctx.counts[slot]) >= needed
+        return at_least
+
+    def indexed(self) -> Callable:
+        """Optional [index] after @string or !string, 1-based"""
+        if self.accept_token('op', '['):
+            index = self.arithmetic()
+            self.expect_token('op', ']')
+            return index
+        return lambda ctx: 1
+
+    def primary(self) -> Callable:
+        start = self.pos
+        kind, value = self.token()
+        if kind == 'op' and value == '(':
+            inner = self.expression()
+            self.expect_token('op', ')')
+            return inner
+        if kind == 'number':
+            if self.accept_token('word', 'of'):
+                return self.quantified(lambda ctx: value)
+            return lambda ctx: value
+        if kind == 'string':
+            slot = self.string_slot(value, start)
+            if self.accept_token('word', 'at'):
+                position = self.arithmetic()
+                return lambda ctx: any(offset == position(ctx) for offset, _ in ctx.matches[slot])
+            if self.accept_token('word', 'in'):
+                self.expect_token('op', '(')
+                low = self.arithmetic()
+                self.expect_token('op', '..')
+                high = self.arithmetic()
+                self.expect_token('op', ')')
+
+                def within(ctx):
+                    a, b = low(ctx), high(ctx)
+                    return a is not None and b is not None and any(a <= offset <= b for offset, _ in ctx.matches[slot])
+                return within
+            return lambda ctx: ctx.counts[slot] > 0
+        if kind == 'count':
+            slot = self.string_slot(value, start)
+            return lambda ctx: ctx.counts[slot]
+        if kind in ('offset', 'length'):
+            slot = self.string_slot(value, start)
+            index = self.indexed()
+            field = 0 if kind == 'offset' else 1
+
+            def located(ctx):
+                position = index(ctx)
+                matches = ctx.matches[slot]
+                return matches[position - 1][field] if position is not None and 1 <= position <= len(matches) else None
+            return located
+        if kind == 'word':
+            if value in ('true', 'false'):
+                result = value == 'true'
+                return lambda ctx: result
+            if value == 'filesize':
+                return lambda ctx: ctx.size
+            if value in ('any', 'all', 'none'):
+                self.expect_token('word', 'of')
+                return self.quantified(value)
+            if value in _INTEGER_READERS:
+                fmt, width = _INTEGER_READERS[value]
+                self.expect_token('op', '(')
+                position = self.arithmetic()
+                self.expect_token('op', ')')
+
+                def read(ctx):
+                    offset = position(ctx)
+                    if offset is None or offset < 0 or offset + width > ctx.size:
+                        return None
+                    return struct.unpack(fmt, ctx.data[offset:offset + width])[0]
+                return read
+            if value in _UNSUPPORTED:
+                raise self.error(f"'{value}' is not supported", start)
+            if value in self.builder.rule_indexes:
+                index = self.builder.rule_indexes[value]
+                return lambda ctx: ctx.results[index]
+            raise self.error(f"undefined identifier '{value}'", start)
+        raise self.error("expected an expression", start)
+
+
+class _RuleBuilder:
+    """Collects the rules and string patterns of a rule set while it is parsed"""
+
+    def __init__(self):
+        self.rules: List[Rule] = []
+        self.rule_indexes: Dict[str, int] = {}
+        self.patterns: List[_StringPattern] = []
+        self.slots = 0
+
+    def checkpoint(self) -> Tuple[int, int, int]:
+        return len(self.rules), len(self.patterns), self.slots
+
+    def rollback(self, state: Tuple[int, int, int]) -> None:
+        """Forget everything added since checkpoint() returned state"""
+        rules, patterns, self.slots = state
+        for rule in self.rules[rules:]:
+            del self.rule_indexes[rule.name]
+        del self.rules[rules:]
+        del self.patterns[patterns:]
+
+    def new_slot(self) -> int:
+        self.slots += 1
+        return self.slots - 1
+
+    def add_rule(self, name, tags, meta, private, filename, strings, condition) -> None:
+        self.rule_indexes[name] = len(self.rules)
+        self.rules.append(Rule(name, tags, meta, private, filename,
+                               {identifier: patterns[0].slot for identifier, patterns in strings.items()},
+                               condition))
+        for patterns in strings.values():
+            self.patterns.extend(patterns)
+
+    def string_patterns(self, slot: int, kind: str, value: Any, modifiers: set,
+                        error: Callable[[str], RuleSyntaxError]) -> List[_StringPattern]:
+        nocase = 'nocase' in modifiers
+        fullword = 'fullword' in modifiers
+        if kind == 'text':
+            if not value:
+                raise error("empty string")
+            forms = []
+            if 'ascii' in modifiers or 'wide' not in modifiers:
+                forms.append((value, False))
+            if 'wide' in modifiers:
+                forms.append((b''.join(bytes([byte, 0]) for byte in value), True))
+            return [
+                _StringPattern(slot, re.compile(re.escape(literal), re.IGNORECASE if nocase else 0),
+                               _best_atom([(literal, 0)]), nocase, fullword, wide)
+                for literal, wide in forms
+            ]
+        if kind == 'hex':
+            pattern = b''.join(self.hex_regex(item) for item in value)
+            return [_StringPattern(slot, re.compile(pattern, re.DOTALL), self.hex_atom(value), False, False, False)]
+
+        source, flags = value
+        if len(source) > MAX_REGEX_LENGTH:
+            raise error("regular expression too long")
+        nocase = nocase or 'i' in flags
+        try:
+            _check_regex_nesting(source)
+            pattern = source.encode('utf-8')
+            regex = re.compile(pattern, (re.IGNORECASE if nocase else 0) | (re.DOTALL if 's' in flags else 0))
+        except (ValueError, re.error) as e:
+            raise error(f"invalid regular expression: {e}")
+        if regex.match(b''):
+            raise error("regular expression matches the empty string")
+        prefix = _regex_prefix(pattern)
+        return [_StringPattern(slot, regex, (prefix, 0) if prefix else None, nocase, fullword, False)]
+
+    @classmethod
+    def hex_regex(cls, item: Tuple) -> bytes:
+        kind = item[0]
+        if kind == 'byte':
+            return re.escape(bytes([item[1]]))
+        if kind == 'not':
+            return b'[^' + re.escape(bytes([item[1]])) + b']'
+        if kind == 'any':
+            return b'.'
+        if kind == 'nibble':
+            high, low = item[1]
+            if high == '?':
+                return b'[' + b''.join(re.escape(bytes([nibble << 4 | int(low, 16)])) for nibble in range(16)) + b']'
+            base = int(high, 16) << 4
+            return b'[' + re.escape(bytes([base])) + b'-' + re.escape(bytes([base | 0x0f])) + b']'
+        if kind == 'jump':
+            _, low, high = item
+            return b'.{%d,%d}?' % (low, MAX_HEX_JUMP if high is None else high)
+        return b'(?:' + b'|'.join(b''.join(cls.hex_regex(part) for part in alternative)
+                                  for alternative in item[1]) + b')'
+
+    @staticmethod
+    def hex_atom(items: List[Tuple]) -> Optional[Tuple[bytes, int]]:
+        """Best literal run before the first jump or alternative, which is at a fixed offset"""
+        runs = []
+        run = bytearray()
+        offset = 0
+        for item in items:
+            if item[0] in ('jump', 'alternatives'):
+                break
+            if item[0] == 'byte':
+                run.append(item[1])
+            else:
+                if run:
+                    runs.append((bytes(run), offset - len(run)))
+                run = bytearray()
+            offset += 1
+        if run:
+            runs.append((bytes(run), offset - len(run)))
+        return _best_atom(runs)
+
+
+class _AtomIndex:
+    """Positions of a buffer where some atom may start.
+
+    Every atom is entered under its first three bytes in a bitmap of all
+    2^24 three-byte prefixes (atoms shorter than that in small tables of
+    their own), and the prefix at every position of the data is tested with
+    vectorized lookups. That costs the same for a handful of atoms as for
+    tens of thousands; only positions that pass are looked up in the atom
+    table itself.
+    """
+
+    def __init__(self, atoms: Iterable[bytes]):
+        self.prefixes = [None, None, None, None]
+        for atom in atoms:
+            width = min(len(atom), 3)
+            if self.prefixes[width] is None:
+                self.prefixes[width] = np.zeros(1 << (8 * width - 3), dtype=np.uint8)
+            key = int.from_bytes(atom[:width], 'big')
+            self.prefixes[width][key >> 3] |= 1 << (key & 7)
+
+    def candidates(self, data) -> Iterator[int]:
+        array = np.frombuffer(data, dtype=np.uint8)
+        for start in range(0, len(array), INDEX_BLOCK_SIZE):
+            block = array[start:start + INDEX_BLOCK_SIZE + 2]
+            count = min(INDEX_BLOCK_SIZE, len(array) - start)
+            hit = np.zeros(count, dtype=bool)
+            key = np.zeros(count, dtype=np.uint32)
+            for width in (1, 2, 3):
+                # key holds the width-byte prefix at each position that has one
+                usable = min(count, len(block) - width + 1)
+                key[:usable] = (key[:usable] << 8) | block[width - 1:width - 1 + usable]
+                table = self.prefixes[width]
+                if table is not None and usable > 0:
+                    prefix = key[:usable]
+                    hit[:usable] |= ((table[prefix >> 3] >> (prefix & 7).astype(np.uint8)) & 1).astype(bool)
+            yield from (np.flatnonzero(hit) + start).tolist()
+
+
+def _is_word_byte(data, position: int) -> bool:
+    return 0 <= position < len(data) and chr(data[position]).isalnum() and data[position] < 0x80
+
+
+class RuleSet:
+    """Compiled rules, matched against a buffer in one pass.
+
+    The literal atoms of every string of every rule (case variants included
+    for nocase strings) go into a single index, so the cost of scanning
+    grows with the number of candidate hits, not with the number of rules.
+    Each hit is verified against the full strings sharing its atom; strings
+    without a usable atom (regexes starting with a class or alternation, hex
+    strings starting with a wildcard run) are searched on their own.
+    """
+
+    def __init__(self, files: Sequence[Tuple[str, str]], digest: str):
+        builder = _RuleBuilder()
+        for filename, source in files:
+            if len(source) > SecurityConfig.MAX_RULES_SOURCE:
+                raise RuleSyntaxError("rule source too large", filename)
+            _Parser(source, filename, builder).parse()
+
+        self.files = tuple(files)
+        self.digest = digest
+        self.rules = builder.rules
+        self.slot_count = builder.slots
+        self._unanchored = [pattern for pattern in builder.patterns if pattern.atom is None]
+
+        # Identical strings of different rules are verified once per hit
+        shared: Dict[Any, List[_StringPattern]] = {}
+        for pattern in builder.patterns:
+            if pattern.atom is not None:
+                shared.setdefault((pattern.regex, pattern.atom, pattern.nocase), []).append(pattern)
+
+        # Atom bytes (every case variant for nocase strings) -> (regex, atom
+        # offset, patterns) to verify
+        self._atoms: Dict[bytes, List[Tuple["re.Pattern[bytes]", int, List[_StringPattern]]]] = {}
+        for (regex, (atom, offset), nocase), patterns in shared.items():
+            for variant in (_case_variants(atom) if nocase else [atom]):
+                self._atoms.setdefault(variant, []).append((regex, offset, patterns))
+        self._atom_lengths = sorted({len(atom) for atom in self._atoms})
+        self._index = _AtomIndex(self._atoms) if self._atoms else None
+
+    def describe(self) -> List[Dict[str, Any]]:
+        return [rule.describe() for rule in self.rules]
+
+    def _record(self, ctx: _ScanContext, pattern: _StringPattern, start: int, end: int) -> None:
+        if pattern.fullword:
+            width = 2 if pattern.wide else 1
+            if _is_word_byte(ctx.data, start - width) or _is_word_byte(ctx.data, end):
+                return
+        ctx.counts[pattern.slot] += 1
+        matches = ctx.matches[pattern.slot]
+        if len(matches) < MAX_STRING_MATCHES:
+            matches.append((start, end - start))
+
+    def match(self, data) -> List[Dict[str, Any]]:
+        """Rules matching a bytes-like buffer, with the matched strings of each"""
+        ctx = _ScanContext(data, self.slot_count, len(self.rules))
+        atoms = self._atoms
+        lengths = self._atom_lengths
+        if self._index is not None:
+            for position in self._index.candidates(data):
+                for length in lengths:
+                    if position + length > ctx.size:
+                        break
+                    for regex, offset, patterns in atoms.get(data[position:position + length], ()):
+                        start = position - offset
+                        if start < 0:
+                            continue
+                        found = regex.match(data, start)
+                        if found:
+                            for pattern in patterns:
+                                self._record(ctx, pattern, start, found.end())
+        for pattern in self._unanchored:
+            for found in pattern.regex.finditer(data):
+                self._record(ctx, pattern, found.start(), found.end())
+        for matches in ctx.matches:
+            matches.sort()
+
+        results = []
+        for index, rule in enumerate(self.rules):
+            ctx.results[index] = matched = _truth(rule.condition(ctx))
+            if matched and not rule.private:
+                results.append(self._describe_match(ctx, rule))
+        return results
+
+    @staticmethod
+    def _describe_match(ctx: _ScanContext, rule: Rule) -> Dict[str, Any]:
+        strings = []
+        for identifier, slot in rule.string_slots.items():
+            if ctx.counts[slot]:
+                strings.append({
+                    'identifier': '$' if identifier.startswith('$ ') else identifier,
+                    'count': ctx.counts[slot],
+                    'matches': [
+                        {'offset': offset, 'length': length,
+                         'data': bytes(ctx.data[offset:offset + min(length, MAX_MATCH_DATA)]).hex()}
+                        for offset, length in ctx.matches[slot][:MAX_REPORTED_MATCHES]
+                    ],
+                })
+        return {'rule': rule.name, 'tags': rule.tags, 'meta': rule.meta, 'strings': strings}
+
+
+def rules_digest(files: Sequence[Tuple[str, str]]) -> str:
+    """SHA-256 of a rule set's sources, the key compiled sets are cached under"""
+    digest = hashlib.sha256()
+    for filename, source in files:
+        digest.update(filename.encode('utf-8') + b'\0' + source.encode('utf-8') + b'\0')
+    return digest.hexdigest()
+
+
+class RuleSetCache:
+    """LRU of compiled rule sets keyed by the digest of their sources.
+
+    Compiling parses every rule and builds the atom index, so each process
+    (API or analysis worker) does it once per distinct set of sources.
+    """
+
+    def __init__(self, max_entries: int = RULE_SET_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, RuleSet]" = OrderedDict()
+
+    def get(self, files: Sequence[Tuple[str, str]]) -> RuleSet:
+        """The compiled rule set for these (filename, source) pairs; raises RuleSyntaxError"""
+        files = tuple((filename, source) for filename, source in files)
+        digest = rules_digest(files)
+        rule_set = self._entries.get(digest)
+        if rule_set is not None:
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return rule_set
+
+        self.misses += 1
+        rule_set = RuleSet(files, digest)
+        self._entries[digest] = rule_set
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return rule_set
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# Compiled sets of the current process; analysis workers keep theirs across jobs
+rule_set_cache = RuleSetCache()
+
+
+def match_rules(data, files: Sequence[Tuple[str, str]]) -> Dict[str, Any]:
+    """Match a buffer against the rules in files, compiling them once per process"""
+    rule_set = rule_set_cache.get(files)
+    return {'digest': rule_set.digest, 'rules': len(rule_set.rules), 'matches': rule_set.match(data)}
+
+
+def match_rules_path(path: str, files: Sequence[Tuple[str, str]]) -> Dict[str, Any]:
+    """match_rules over a memory-mapped file"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return match_rules(b'', files)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return match_rules(mapped, files)
+
+
+class RuleLibrary:
+    """Rule files (*.yar, *.yara) of a directory, recompiled when they change.
+
+    Files that fail to compile are left out, with their errors reported, so
+    one broken file does not disable the others. Rules may refer to rules of
+    files before them in name order.
+    """
+
+    def __init__(self, directory: str, cache: RuleSetCache = rule_set_cache):
+        self.directory = directory
+        self.cache = cache
+        self.errors: List[Dict[str, str]] = []
+        self._signature = None
+        self._files: Tuple[Tuple[str, str], ...] = ()
+        # files() runs in request threads; one of them reloads at a time
+        self._lock = threading.Lock()
+
+    def _scan_directory(self) -> List[Tuple[str, int, int]]:
+        try:
+            entries = [entry for entry in os.scandir(self.directory)
+                       if entry.name.endswith(RULE_FILE_SUFFIXES) and entry.is_file()]
+        except FileNotFoundError:
+            return []
+        return sorted((entry.name, entry.stat().st_mtime_ns, entry.stat().st_size) for entry in entries)
+
+    def _reload(self) -> None:
+        files = []
+        errors = []
+        # Each file is parsed after the ones accepted before it, so references
+        # to their rules resolve, and rolled back if it fails
+        builder = _RuleBuilder()
+        for name, _, size in self._signature:
+            state = builder.checkpoint()
+            try:
+                if size > SecurityConfig.MAX_RULES_SOURCE:
+                    raise RuleSyntaxError("rule source too large", name)
+                with open(os.path.join(self.directory, name), encoding='utf-8') as f:
+                    source = f.read()
+                _Parser(source, name, builder).parse()
+                files.append((name, source))
+            except (OSError, UnicodeDecodeError, RuleSyntaxError) as e:
+                builder.rollback(state)
+                logger.error(f"Skipping rule file {name}: {str(e)[:200]}")
+                errors.append({'file': name, 'error': str(e)[:500]})
+        self._files = tuple(files)
+        self.errors = errors
+
+    def files(self) -> Tuple[Tuple[str, str], ...]:
+        """(filename, source) pairs of the rule files that compile"""
+        with self._lock:
+            signature = self._scan_directory()
+            if signature != self._signature:
+                self._signature = signature
+                self._reload()
+            return self._files
+
+    def rule_set(self) -> RuleSet:
+        return self.cache.get(self.files())
@@ -5,17 +5,21 @@ import os
 import re
 import hashlib
 import mimetypes
-from typing import List, Optional, Dict, Any
+from functools import lru_cache
+from typing import List, Optional, Dict, Any, Tuple
 from pathlib import Path
 import logging
 import bleach
 import validators
 from fastapi import HTTPException, Request
 from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
 import defusedxml
 from datetime import datetime
 import secrets
 
+from entropy import calculate_entropy
+
 # Configure secure XML parsing
 defusedxml.defuse_stdlib()
 
@@ -25,6 +29,7 @@ class SecurityConfig:
     
     # File upload restrictions
     MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
+    MAX_LARGE_FILE_SIZE = 16 * 1024 * 1024 * 1024  # 16GB, large-file mode (disk images, memory dumps)
     ALLOWED_MIME_TYPES = {
         # Text files
         'text/plain',
@@ -94,6 +99,49 @@ class SecurityConfig:
         r'data:',  # Data URLs
     ]
     
+    # Script content markers searched for in uploaded files
+    SCRIPT_CONTENT_PATTERNS = [
+        b'<script', b'javascript:', b'vbscript:',
+        b'<?php', b'<%', b'${', b'eval(',
+    ]
+    MAX_SCRIPT_MATCHES = 100  # Match offsets kept per file
+    SCAN_BLOCK_SIZE = 1024 * 1024  # Bytes lowercased and scanned at a time
+    
+    # Detection rule sources, per rule file and per ad-hoc scan request
+    MAX_RULES_SOURCE = 1024 * 1024
+    
+    # Request body limits enforced by RequestSizeLimitMiddleware
+    MAX_REQUEST_SIZE = 1024 * 1024  # 1MB for JSON and form endpoints
+    MULTIPART_OVERHEAD = 64 * 1024  # Boundaries and part headers around an upload
+    REQUEST_SIZE_LIMITS = {
+        '/api/analyze-file': MAX_FILE_SIZE + MULTIPART_OVERHEAD,
+        '/api/analyze-file/raw': MAX_FILE_SIZE,
+        '/api/analyze-file/large': MAX_LARGE_FILE_SIZE,
+        '/api/upload-file-for-script': MAX_FILE_SIZE + MULTIPART_OVERHEAD,
+        '/api/upload-file-for-script/raw': MAX_FILE_SIZE,
+        '/api/carve-file/raw': MAX_FILE_SIZE,
+        '/api/stego-analysis/raw': MAX_FILE_SIZE,
+        '/api/rules/scan': MAX_FILE_SIZE + MAX_RULES_SOURCE + MULTIPART_OVERHEAD,
+    }
+    
+    # Archive analysis budgets, over the whole tree of nested archives
+    MAX_ARCHIVE_DEPTH = 4  # Archives nested deeper are listed as opaque members
+    MAX_ARCHIVE_MEMBERS = 1000  # Members analyzed
+    MAX_ARCHIVE_BYTES = 512 * 1024 * 1024  # Decompressed bytes fed to the analyzers
+    MAX_NESTED_ARCHIVE_SIZE = 64 * 1024 * 1024  # Nested ZIP/7z archives are opened in memory
+    
+    # Decompression bomb checks on an archive's listing, before anything is inflated
+    MAX_COMPRESSION_RATIO = 100  # Declared size over compressed size, per member
+    COMPRESSION_RATIO_MIN_SIZE = 1024 * 1024  # Smaller members may compress this well legitimately
+    MAX_LISTED_MEMBERS = 1000  # Entries reported in a listing; totals cover all entries read
+    MAX_LISTING_ENTRIES = 100000  # Entries read from an archive's directory or headers
+    MAX_LISTING_DIRECTORY_SIZE = 16 * 1024 * 1024  # ZIP central directory bytes read
+    
+    # Image decoding budgets, checked against the header before any pixel is decoded
+    MAX_IMAGE_PIXELS = 256 * 1024 * 1024  # Declared dimensions beyond this are refused outright
+    MAX_DECODED_PIXELS = 32 * 1024 * 1024  # Larger JPEGs are decoded at a reduced DCT scale
+    IMAGE_PREVIEW_SIZE = 1024  # Longest side of rendered previews
+    
     # Rate limiting
     RATE_LIMIT_PER_MINUTE = 100
     SCRIPT_EXECUTION_RATE_LIMIT = 10
@@ -146,6 +194,22 @@ class SecurityValidator:
     @staticmethod
     def validate_file_content(content: bytes, filename: str, mime_type: str) -> Dict[str, Any]:
         """Validate file content for security issues"""
+        scanner = ScriptContentScanner()
+        view = memoryview(content)
+        for offset in range(0, len(view), SecurityConfig.SCAN_BLOCK_SIZE):
+            scanner.feed(view[offset:offset + SecurityConfig.SCAN_BLOCK_SIZE])
+        return SecurityValidator.validate_file_summary(
+            len(content), content[:1024], filename, mime_type, scanner.matches
+        )
+    
+    @staticmethod
+    def validate_file_summary(file_size: int, header: bytes, filename: str, mime_type: str,
+                              script_matches: List[Dict[str, Any]],
+                              max_file_size: int = SecurityConfig.MAX_FILE_SIZE,
+                              archive_listing: Optional[Dict[str, Any]] = None,
+                              structure: Optional[Dict[str, Any]] = None,
+                              rule_matches: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Validate a file from its size, leading bytes and streamed scan results"""
         validation_result = {
             'is_safe': True,
             'issues': [],
@@ -153,9 +217,9 @@ class SecurityValidator:
         }
         
         # Check file size
-        if len(content) > SecurityConfig.MAX_FILE_SIZE:
+        if file_size > max_file_size:
             validation_result['is_safe'] = False
-            validation_result['issues'].append(f"File too large: {len(content)} bytes > {SecurityConfig.MAX_FILE_SIZE} bytes")
+            validation_result['issues'].append(f"File too large: {file_size} bytes > {max_file_size} bytes")
         
         # Check MIME type
         if mime_type not in SecurityConfig.ALLOWED_MIME_TYPES:
@@ -167,22 +231,46 @@ class SecurityValidator:
             validation_result['warnings'].append(f"Uncommon file extension: {ext}")
         
         # Check for executable headers
-        if content.startswith(b'MZ') or content.startswith(b'\x7fELF'):
+        if header.startswith(b'MZ') or header.startswith(b'\x7fELF'):
             validation_result['warnings'].append("Executable file detected")
         
         # Check for script content
-        script_patterns = [
-            b'<script', b'javascript:', b'vbscript:',
-            b'<?php', b'<%', b'${', b'eval(',
-        ]
-        for pattern in script_patterns:
-            if pattern in content.lower():
-                validation_result['warnings'].append(f"Potentially dangerous script content detected")
-                break
+        if script_matches:
+            validation_result['warnings'].append(f"Potentially dangerous script content detected")
+            validation_result['script_matches'] = script_matches
+        
+        # Check archive listings for decompression bombs and encrypted members
+        if archive_listing:
+            if archive_listing['bomb']:
+                validation_result['warnings'].append("Possible decompression bomb")
+            validation_result['warnings'].extend(archive_listing['warnings'])
+            if archive_listing['encrypted_count']:
+                validation_result['warnings'].append(
+                    f"Archive has {archive_listing['encrypted_count']} encrypted members"
+                )
+        
+        # Check container structure for appended data and polyglots
+        if structure:
+            if structure.get('error'):
+                validation_result['warnings'].append(structure['error'])
+            trailing = structure['trailing_data']
+            if trailing and not trailing['padding']:
+                validation_result['warnings'].append(f"Data appended after the end of the {structure['format'].upper()}")
+            if structure['polyglot']:
+                validation_result['warnings'].append("Polyglot file: " + ", ".join(structure['polyglot']))
+            risky_names = structure.get('pdf', {}).get('risky_names')
+            if risky_names:
+                validation_result['warnings'].append("PDF active content: " + ", ".join(sorted(risky_names)))
+        
+        # Check detection rule matches
+        if rule_matches and rule_matches['matches']:
+            validation_result['warnings'].append(
+                "Matched detection rules: " + ", ".join(match['rule'] for match in rule_matches['matches'])
+            )
         
         # Calculate entropy to detect encrypted/compressed content
-        if len(content) > 0:
-            entropy = SecurityValidator.calculate_entropy(content[:1024])  # Check first 1KB
+        if file_size > 0:
+            entropy = SecurityValidator.calculate_entropy(header[:1024])  # Check first 1KB
             if entropy > 7.5:
                 validation_result['warnings'].append("High entropy content detected (encrypted/compressed)")
         
@@ -191,22 +279,7 @@ class SecurityValidator:
     @staticmethod
     def calculate_entropy(data: bytes) -> float:
         """Calculate Shannon entropy of data"""
-        if not data:
-            return 0.0
-        
-        import math
-        frequency = [0] * 256
-        for byte in data:
-            frequency[byte] += 1
-        
-        entropy = 0.0
-        data_len = len(data)
-        for count in frequency:
-            if count > 0:
-                probability = count / data_len
-                entropy -= probability * math.log2(probability)
-        
-        return entropy
+        return calculate_entropy(data)
     
     @staticmethod
     def sanitize_text_input(text: str, max_length: int = 10000) -> str:
@@ -313,6 +386,111 @@ class SecurityValidator:
         return request.client.host if request.client else "unknown"
 
 
+@lru_cache(maxsize=8)
+def compile_byte_patterns(patterns: Tuple[bytes, ...]) -> "re.Pattern[bytes]":
+    """Combine literal byte patterns into one regex matching their lowercase forms"""
+    alternation = b'|'.join(re.escape(p.lower()) for p in sorted(patterns, key=len, reverse=True))
+    return re.compile(alternation)
+
+
+class ScriptContentScanner:
+    """Single-pass search for script content patterns across chunk boundaries.
+    
+    All patterns are matched case-insensitively by one compiled regex over each
+    lowercased chunk, so memory use is bounded by the chunk size rather than
+    by the file. The offsets of the first max_matches matches are kept;
+    scanning stops once that many have been found.
+    """
+    
+    def __init__(self, patterns: Optional[List[bytes]] = None,
+                 max_matches: int = SecurityConfig.MAX_SCRIPT_MATCHES):
+        self.patterns = tuple(patterns or SecurityConfig.SCRIPT_CONTENT_PATTERNS)
+        self.max_matches = max_matches
+        self.matches: List[Dict[str, Any]] = []
+        self._regex = compile_byte_patterns(self.patterns)
+        self._overlap = max(len(p) for p in self.patterns) - 1
+        self._tail = b''
+        self._offset = 0
+    
+    @property
+    def detected(self) -> bool:
+        return bool(self.matches)
+    
+    @property
+    def complete(self) -> bool:
+        return len(self.matches) >= self.max_matches
+    
+    def feed(self, chunk: bytes) -> None:
+        """Scan the next chunk, keeping enough tail to catch split patterns"""
+        if self.complete or not chunk:
+            return
+        
+        window = (self._tail + bytes(chunk)).lower()
+        window_offset = self._offset - len(self._tail)
+        for match in self._regex.finditer(window):
+            # Matches inside the tail were reported with the previous chunk
+            if match.end() <= len(self._tail):
+                continue
+            self.matches.append({
+                'offset': window_offset + match.start(),
+                'pattern': match.group().decode('latin-1'),
+            })
+            if self.complete:
+                break
+        
+        self._offset += len(chunk)
+        self._tail = window[-self._overlap:] if self._overlap else b''
+
+
+class RequestSizeLimitMiddleware:
+    """ASGI middleware rejecting request bodies larger than their route allows.
+    
+    A declared Content-Length over the limit is answered with 413 before the
+    application runs. Bodies without one (chunked) are counted as they are
+    received, and the request is aborted as soon as the limit is crossed.
+    """
+    
+    def __init__(self, app, route_limits: Optional[Dict[str, int]] = None,
+                 default_limit: Optional[int] = None):
+        self.app = app
+        self.route_limits = route_limits if route_limits is not None else SecurityConfig.REQUEST_SIZE_LIMITS
+        self.default_limit = default_limit if default_limit is not None else SecurityConfig.MAX_REQUEST_SIZE
+    
+    def limit_for(self, path: str) -> int:
+        return self.route_limits.get(path.rstrip('/') or '/', self.default_limit)
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        path = scope["path"]
+        limit = self.limit_for(path)
+        content_length = Headers(scope=scope).get("content-length", "")
+        if content_length.isdigit() and int(content_length) > limit:
+            security_logger.log_security_violation(
+                client_ip=SecurityValidator.get_client_ip(Request(scope)),
+                violation_type="REQUEST_TOO_LARGE",
+                details=f"Path: {path}, Content-Length: {content_length}, Limit: {limit}"
+            )
+            response = create_secure_error_response(status_code=413)
+            await response(scope, receive, send)
+            return
+        
+        received = 0
+        
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise HTTPException(status_code=413, detail="Request body too large")
+            return message
+        
+        await self.app(scope, limited_receive, send)
+
+
 class SecurityLogger:
     """Security event logging"""
     
@@ -370,6 +548,8 @@ def create_secure_error_response(message: str = "An error occurred", status_code
         401: "Unauthorized",
         403: "Forbidden",
         404: "Not found",
+        413: "Payload too large",
+        415: "Unsupported media type",
         429: "Rate limit exceeded",
         500: "Internal server error"
     }
@@ -5,23 +5,20 @@ import tempfile
 import shutil
 from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from fastapi import APIRouter
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from pydantic import BaseModel, Field, validator
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 import hashlib
-import magic
-import io
 import logging
 from motor.motor_asyncio import AsyncIOMotorClient
-import exifread
 import json
 from pathlib import Path
+from urllib.parse import unquote
 from dotenv import load_dotenv
-from PIL import Image
-from PIL.ExifTags import TAGS
+from PIL import Image, UnidentifiedImageError
 import time
 import asyncio
 from contextlib import asynccontextmanager
@@ -29,6 +26,7 @@ from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from slowapi.middleware import SlowAPIMiddleware
+from starlette.background import BackgroundTask
 from secure import Secure
 
 # Import our security module
@@ -36,8 +34,22 @@ import sys
 sys.path.append('/app/backend')
 from security import (
     SecurityConfig, SecurityValidator, SecurityLogger, security_logger,
-    create_secure_error_response
+    create_secure_error_response, RequestSizeLimitMiddleware
 )
+from analysis import (
+    analyze_format, analyze_path, analyze_segment, hash_path, merge_segments, plan_segments, summarize_path,
+    ANALYSIS_CHUNK_SIZE, ANALYZER_VERSION
+)
+from archives import analyze_archive_path, list_archive
+from cache import AnalysisCache
+from carving import member_range
+from entropy import decode_profile
+from hashing import DEFAULT_DIGESTS, SUPPORTED_DIGESTS, normalize_digests
+from executor import AnalysisExecutor, AnalysisQueueFull
+from filetype import detect_mime_type
+from imaging import ImageBudgetExceeded
+from rules import RuleLibrary, RuleSyntaxError, match_rules_path, rule_set_cache
+from stego import StegoPlaneCache, analyze_stego_path
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -50,11 +62,42 @@ SCRIPTS_DIR.mkdir(exist_ok=True)
 UPLOADS_DIR = Path("/tmp/sectoolbox_uploads")
 UPLOADS_DIR.mkdir(exist_ok=True, mode=0o700)  # Restricted permissions
 
+# Private spool directory for uploads handed to analysis workers
+ANALYSIS_SPOOL_DIR = Path(tempfile.gettempdir()) / "sectoolbox_analysis"
+ANALYSIS_SPOOL_DIR.mkdir(exist_ok=True, mode=0o700)
+
+# Header carrying the (URL-encoded) filename of raw octet-stream uploads
+RAW_FILENAME_HEADER = "X-Filename"
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
+# Worker processes for CPU-bound file analysis
+analysis_executor = AnalysisExecutor(
+    max_workers=int(os.environ.get('ANALYSIS_WORKERS', os.cpu_count() or 1)),
+    max_queued=int(os.environ.get('ANALYSIS_QUEUE_SIZE', 32))
+)
+
+# Analysis reports cached by content hash
+analysis_cache = AnalysisCache(
+    db.analysis_cache,
+    analyzer_version=ANALYZER_VERSION,
+    max_entries=int(os.environ.get('ANALYSIS_CACHE_SIZE', 256))
+)
+
+# Steganalysis reports and rendered bit planes, cached on disk by content hash
+stego_cache = StegoPlaneCache(
+    Path(tempfile.gettempdir()) / "sectoolbox_stego",
+    max_entries=int(os.environ.get('STEGO_CACHE_SIZE', 64))
+)
+
+# Detection rules (*.yar) matched against every analyzed upload, reloaded when
+# the files change
+RULES_DIR = Path(os.environ.get("RULES_DIR", ROOT_DIR / "detection-rules"))
+rule_library = RuleLibrary(str(RULES_DIR))
+
 # Rate limiter setup
 limiter = Limiter(key_func=get_remote_address)
 
@@ -66,9 +109,15 @@ secure = Secure()
 async def lifespan(app: FastAPI):
     # Startup
     security_logger.logger.info("SectoolBox API starting up with security hardening enabled")
+    analysis_executor.start()
+    try:
+        await analysis_cache.ensure_indexes()
+    except Exception as e:
+        security_logger.logger.error(f"Could not create analysis cache index: {str(e)[:200]}")
     yield
     # Shutdown
     security_logger.logger.info("SectoolBox API shutting down")
+    analysis_executor.shutdown()
     client.close()
 
 # Create the main app
@@ -78,6 +127,11 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Reject oversized request bodies before they are buffered. Added first so it is
+# the innermost middleware: the 413 it raises while the body is being read then
+# reaches the exception handlers directly
+app.add_middleware(RequestSizeLimitMiddleware)
+
 # Add security middleware
 app.add_middleware(SlowAPIMiddleware)
 app.state.limiter = limiter
@@ -117,9 +171,11 @@ async def security_headers_middleware(request: Request, call_next):
     response.headers["X-Frame-Options"] = "DENY"
     response.headers["X-XSS-Protection"] = "1; mode=block"
     response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-    response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-    response.headers["Pragma"] = "no-cache"
-    response.headers["Expires"] = "0"
+    # Routes serving content addressed by hash set their own caching policy
+    if "Cache-Control" not in response.headers:
+        response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
+        response.headers["Pragma"] = "no-cache"
+        response.headers["Expires"] = "0"
     response.headers["X-API-Version"] = "1.0.0"
     response.headers["X-Request-ID"] = str(uuid.uuid4())
     
@@ -182,13 +238,36 @@ class FileAnalysisResult(BaseModel):
     md5_hash: str
     sha1_hash: str
     sha256_hash: str
+    hashes: Optional[Dict[str, str]] = None
     analysis_date: datetime = Field(default_factory=datetime.utcnow)
     strings_count: Optional[int] = None
+    strings: Optional[List[Dict[str, Any]]] = None
+    iocs: Optional[Dict[str, Any]] = None
     entropy: Optional[float] = None
+    entropy_profile: Optional[Dict[str, Any]] = None
+    entropy_regions: Optional[List[Dict[str, Any]]] = None
+    randomness: Optional[Dict[str, Any]] = None
+    embedded_files: Optional[List[Dict[str, Any]]] = None
+    structure: Optional[Dict[str, Any]] = None
+    archive_listing: Optional[Dict[str, Any]] = None
+    archive: Optional[Dict[str, Any]] = None
+    rule_matches: Optional[Dict[str, Any]] = None
     metadata: Optional[Dict[str, Any]] = None
+    image_metadata: Optional[Dict[str, Any]] = None
     exif_data: Optional[Dict[str, Any]] = None
     security_analysis: Optional[Dict[str, Any]] = None
 
+class AnalysisLookup(BaseModel):
+    sha256: str = Field(..., min_length=64, max_length=64)
+    filename: str = Field(..., min_length=1, max_length=255)
+    
+    @validator('sha256')
+    def validate_sha256(cls, v):
+        v = v.lower()
+        if any(c not in "0123456789abcdef" for c in v):
+            raise ValueError("sha256 must be a hex digest")
+        return v
+
 class CustomScript(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str = Field(..., min_length=1, max_length=100)
@@ -303,162 +382,343 @@ async def delete_announcement(request: Request, announcement_id: str):
         raise HTTPException(status_code=500, detail="Failed to delete announcement")
 
 # Secure file analysis utility functions
-def calculate_hashes(file_content: bytes) -> Dict[str, str]:
-    """Calculate MD5, SHA1, and SHA256 hashes of file content"""
-    return {
-        "md5": hashlib.md5(file_content).hexdigest(),
-        "sha1": hashlib.sha1(file_content).hexdigest(),
-        "sha256": hashlib.sha256(file_content).hexdigest()
-    }
+async def read_upload_chunks(file: UploadFile):
+    """Yield a multipart upload in analysis-sized chunks"""
+    while True:
+        chunk = await file.read(ANALYSIS_CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
 
-def calculate_entropy(data: bytes) -> float:
-    """Calculate Shannon entropy of data"""
-    import math
-    
-    if not data:
-        return 0.0
-    
-    # Count frequency of each byte value
-    frequency = [0] * 256
-    for byte in data:
-        frequency[byte] += 1
-    
-    # Calculate entropy
-    entropy = 0.0
-    data_len = len(data)
-    for count in frequency:
-        if count > 0:
-            probability = count / data_len
-            entropy -= probability * math.log2(probability)
-    
-    return entropy
-
-def extract_strings(data: bytes, min_length: int = 4) -> List[str]:
-    """Extract printable strings from binary data with security filtering"""
-    strings = []
-    current_string = ""
-    
-    for byte in data:
-        char = chr(byte)
-        if char.isprintable() and char not in '\n\r\t':
-            current_string += char
-        else:
-            if len(current_string) >= min_length:
-                # Filter out potentially dangerous strings
-                safe_string = SecurityValidator.sanitize_text_input(current_string, max_length=1000)
-                if safe_string and len(safe_string) >= min_length:
-                    strings.append(safe_string)
-            current_string = ""
-    
-    if len(current_string) >= min_length:
-        safe_string = SecurityValidator.sanitize_text_input(current_string, max_length=1000)
-        if safe_string and len(safe_string) >= min_length:
-            strings.append(safe_string)
-    
-    return strings[:1000]  # Limit number of strings
-
-def extract_exif_data(image_data: bytes) -> Dict[str, Any]:
-    """Extract EXIF data from image with security filtering"""
+async def spool_stream(chunks, max_size: int = SecurityConfig.MAX_FILE_SIZE):
+    """Copy a stream of chunks to a private temporary file, enforcing the size limit while reading.
+    
+    Small chunks are gathered into analysis-sized blocks, which are hashed and
+    written in a thread (hashlib and file writes release the GIL) so the event
+    loop only collects bytes. Returns the spool path and the SHA-256 of the content.
+    """
+    fd, spool_name = tempfile.mkstemp(dir=ANALYSIS_SPOOL_DIR, suffix=".upload")
+    spool_path = Path(spool_name)
     try:
-        image = Image.open(io.BytesIO(image_data))
-        exifdata = image.getexif()
-        
-        if not exifdata:
-            return {}
-        
-        exif_dict = {}
-        for tag_id, value in exifdata.items():
-            tag = TAGS.get(tag_id, tag_id)
-            # Sanitize EXIF values
-            safe_value = SecurityValidator.sanitize_text_input(str(value), max_length=500)
-            exif_dict[str(tag)] = safe_value
-        
-        return exif_dict
-    except Exception:
-        return {}
+        size = 0
+        sha256 = hashlib.sha256()
+        with os.fdopen(fd, "wb") as spool:
+            def flush(block: bytearray):
+                sha256.update(block)
+                spool.write(block)
+            
+            pending = bytearray()
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > max_size:
+                    raise HTTPException(status_code=413, detail="File too large")
+                pending += chunk
+                if len(pending) >= ANALYSIS_CHUNK_SIZE:
+                    block, pending = pending, bytearray()
+                    await asyncio.to_thread(flush, block)
+            if pending:
+                await asyncio.to_thread(flush, pending)
+        return spool_path, sha256.hexdigest()
+    except BaseException:
+        spool_path.unlink(missing_ok=True)
+        raise
+
+async def spool_upload(file: UploadFile, max_size: int = SecurityConfig.MAX_FILE_SIZE):
+    """Copy a multipart upload to a private temporary file"""
+    return await spool_stream(read_upload_chunks(file), max_size)
+
+def raw_upload_filename(request: Request) -> str:
+    """Check the headers of a raw octet-stream upload and return its sanitized filename"""
+    content_type = request.headers.get("content-type", "")
+    if content_type.split(";")[0].strip().lower() != "application/octet-stream":
+        raise HTTPException(status_code=415, detail="Content-Type must be application/octet-stream")
+    
+    filename = unquote(request.headers.get(RAW_FILENAME_HEADER, ""))
+    if not filename:
+        raise HTTPException(status_code=400, detail=f"{RAW_FILENAME_HEADER} header is required")
+    
+    return SecurityValidator.sanitize_filename(filename)
+
+def clear_script_uploads():
+    """Remove previous uploads so scripts only see the latest file"""
+    for old_file in UPLOADS_DIR.glob("*"):
+        try:
+            old_file.unlink()
+        except Exception:
+            pass  # Continue if file deletion fails
+
+async def run_analysis(func, *args):
+    """Run an analysis job in the worker pool, mapping a full queue to 503"""
+    try:
+        return await analysis_executor.submit(func, *args)
+    except AnalysisQueueFull:
+        raise HTTPException(status_code=503, detail="Analysis queue is full, try again later")
+
+def parse_digests(digests: Optional[str]):
+    """Digests to compute for an upload: the defaults plus a comma-separated list of extras"""
+    try:
+        return normalize_digests(DEFAULT_DIGESTS + tuple(filter(None, (digests or "").split(","))))
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported digest, choose from: {', '.join(SUPPORTED_DIGESTS)}"
+        )
+
+async def analyze_in_segments(spool_path: Path, segments, digests) -> Dict[str, Any]:
+    """Analyze the segments of a large file in parallel workers and merge the results.
+    
+    The structure and metadata parsers run as one more worker job. Hashes have
+    to be computed in order, so they run over the whole file in a thread of
+    this process meanwhile.
+    """
+    if analysis_executor.pending + len(segments) + 1 > analysis_executor.capacity:
+        raise HTTPException(status_code=503, detail="Analysis queue is full, try again later")
+    
+    path = str(spool_path)
+    hashes, file_format, *results = await asyncio.gather(
+        asyncio.to_thread(hash_path, path, digests),
+        run_analysis(analyze_format, path),
+        *(run_analysis(analyze_segment, path, start, end) for start, end in segments)
+    )
+    return merge_segments(hashes, file_format, results)
+
+async def match_upload_rules(spool_path: Path) -> Optional[Dict[str, Any]]:
+    """Match a spooled upload against the rule library, if it has any rules"""
+    files = await asyncio.to_thread(rule_library.files)
+    if not files:
+        return None
+    return await run_analysis(match_rules_path, str(spool_path), files)
+
+async def stored_rule_matches(report: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Rule matches for a cached report when the file is not at hand to match again.
+    
+    The matches stored with the report are used if the rule library has not
+    changed since. Otherwise the current rules were not evaluated: no matches
+    are reported and "evaluated" is False.
+    """
+    if not await asyncio.to_thread(rule_library.files):
+        return None
+    rule_set = await asyncio.to_thread(rule_library.rule_set)
+    stored = report.get("rule_matches")
+    if stored and stored["digest"] == rule_set.digest:
+        return stored
+    return {"digest": rule_set.digest, "rules": len(rule_set.rules), "matches": [], "evaluated": False}
+
+async def analyze_spooled_upload(spool_path: Path, sha256: str, digests=DEFAULT_DIGESTS):
+    """Return the analysis report for a spooled upload and whether it came from the cache.
+    
+    Rule matches depend on the rule library as well as the content, so they are
+    matched again on every upload. The first upload's matches are cached with
+    the report, for lookups by hash.
+    """
+    report = await analysis_cache.get(sha256)
+    if report is not None:
+        # Only hash the file again for digests the cached report does not have
+        missing = [digest for digest in digests if digest not in report["hashes"]]
+        if missing:
+            extra = await run_analysis(hash_path, str(spool_path), missing)
+            report = {**report, "hashes": {**report["hashes"], **extra}}
+        return {**report, "rule_matches": await match_upload_rules(spool_path)}, True
+    
+    # Archive listings only read directory structures, so they run inline
+    archive_listing = await asyncio.to_thread(list_archive, str(spool_path))
+    segments = plan_segments(spool_path.stat().st_size, analysis_executor.max_workers)
+    if len(segments) > 1:
+        analysis = analyze_in_segments(spool_path, segments, digests)
+    else:
+        analysis = run_analysis(analyze_path, str(spool_path), digests)
+    
+    # Archives also get a per-member tree, built in a worker alongside the main
+    # analysis, unless their listing already marks them as a decompression bomb
+    if archive_listing is not None and not archive_listing["bomb"]:
+        report, archive_tree, rule_matches = await asyncio.gather(
+            analysis, run_analysis(analyze_archive_path, str(spool_path)), match_upload_rules(spool_path)
+        )
+    else:
+        report, rule_matches = await asyncio.gather(analysis, match_upload_rules(spool_path))
+        archive_tree = None
+    report = {**report, "archive_listing": archive_listing, "archive": archive_tree, "rule_matches": rule_matches}
+    await analysis_cache.put(sha256, report)
+    return report, False
+
+def validate_report(report: Dict[str, Any], safe_filename: str,
+                    max_file_size: int = SecurityConfig.MAX_FILE_SIZE) -> Dict[str, Any]:
+    """Run the filename-dependent security validation for an analysis report"""
+    return SecurityValidator.validate_file_summary(
+        report["file_size"], report["header"], safe_filename,
+        report["mime_type"], report["script_matches"], max_file_size=max_file_size,
+        archive_listing=report.get("archive_listing"), structure=report.get("structure"),
+        rule_matches=report.get("rule_matches")
+    )
+
+def build_analysis_result(report: Dict[str, Any], safe_filename: str,
+                          security_analysis: Dict[str, Any], cached: bool) -> FileAnalysisResult:
+    """Create the API result for an analysis report"""
+    hashes = report["hashes"]
+    strings = report["strings"]
+    strings_count = report["strings_count"]
+    
+    # Basic metadata
+    metadata = {
+        "file_size": report["file_size"],
+        "strings_sample": [entry["value"] for entry in strings[:10]],  # First 10 strings as sample
+        "strings_truncated": strings_count > len(strings),
+        "byte_stats": report["byte_stats"],
+        "analyzer_version": report["analyzer_version"],
+        "cached": cached,
+    }
+    
+    return FileAnalysisResult(
+        filename=safe_filename,
+        file_size=report["file_size"],
+        mime_type=report["mime_type"],
+        md5_hash=hashes["md5"],
+        sha1_hash=hashes["sha1"],
+        sha256_hash=hashes["sha256"],
+        hashes=hashes,
+        strings_count=strings_count,
+        strings=strings,
+        iocs=report["iocs"],
+        entropy=report["entropy"],
+        entropy_profile={
+            "block_size": report["entropy_profile"]["block_size"],
+            "values": decode_profile(report["entropy_profile"]["values"]),
+        },
+        entropy_regions=report["entropy_regions"],
+        randomness=report["randomness"],
+        embedded_files=report["embedded_files"],
+        structure=report["structure"],
+        archive_listing=report.get("archive_listing"),
+        archive=report.get("archive"),
+        rule_matches=report.get("rule_matches"),
+        metadata=metadata,
+        image_metadata=report["image_metadata"],
+        exif_data=report["exif_data"] or None,
+        security_analysis=security_analysis
+    )
+
+async def complete_analysis(report: Dict[str, Any], safe_filename: str, client_ip: str,
+                            cached: bool, max_file_size: int = SecurityConfig.MAX_FILE_SIZE) -> FileAnalysisResult:
+    """Validate, log and store the analysis of an upload"""
+    # Validate file content
+    security_analysis = validate_report(report, safe_filename, max_file_size)
+    
+    # Log the upload
+    security_logger.log_file_upload(
+        filename=safe_filename,
+        size=report["file_size"],
+        mime_type=report["mime_type"],
+        client_ip=client_ip,
+        issues=security_analysis.get('issues', [])
+    )
+    
+    # Block dangerous files
+    if not security_analysis['is_safe']:
+        raise HTTPException(status_code=400, detail="File failed security validation")
+    
+    # Create analysis result
+    analysis_result = build_analysis_result(report, safe_filename, security_analysis, cached)
+    
+    # Store analysis result in database
+    await db.file_analyses.insert_one(analysis_result.dict())
+    
+    return analysis_result
 
 # Enhanced file analysis endpoint
 @api_router.post("/analyze-file", response_model=FileAnalysisResult)
 @limiter.limit("20/minute")
-async def analyze_file(request: Request, file: UploadFile = File(...)):
+async def analyze_file(request: Request, file: UploadFile = File(...), digests: Optional[str] = None):
     client_ip = SecurityValidator.get_client_ip(request)
     
     try:
+        requested_digests = parse_digests(digests)
+        
         # Validate file upload
         if not file.filename:
             raise HTTPException(status_code=400, detail="Filename is required")
         
-        # Read file content with size limit
-        file_content = await file.read()
-        
-        # Check file size after reading
-        if len(file_content) > SecurityConfig.MAX_FILE_SIZE:
-            raise HTTPException(status_code=413, detail="File too large")
-        
         # Sanitize filename
         safe_filename = SecurityValidator.sanitize_filename(file.filename)
         
-        # Get MIME type
-        mime_type = magic.from_buffer(file_content, mime=True)
+        # Spool the upload (checking its size while reading) and analyze it in a worker
+        # process unless the same content was analyzed before
+        spool_path, sha256 = await spool_upload(file)
+        try:
+            report, cached = await analyze_spooled_upload(spool_path, sha256, requested_digests)
+        finally:
+            spool_path.unlink(missing_ok=True)
         
-        # Validate file content
-        security_analysis = SecurityValidator.validate_file_content(
-            file_content, safe_filename, mime_type
-        )
+        return await complete_analysis(report, safe_filename, client_ip, cached)
         
-        # Log the upload
-        security_logger.log_file_upload(
-            filename=safe_filename,
-            size=len(file_content),
-            mime_type=mime_type,
+    except HTTPException:
+        raise
+    except Exception as e:
+        security_logger.log_error(
             client_ip=client_ip,
-            issues=security_analysis.get('issues', [])
+            error_type="FILE_ANALYSIS_ERROR",
+            details=str(e)[:200]
         )
+        raise HTTPException(status_code=500, detail="Error analyzing file")
+
+async def analyze_raw_upload(request: Request, max_file_size: int) -> FileAnalysisResult:
+    """Spool and analyze an application/octet-stream request body"""
+    client_ip = SecurityValidator.get_client_ip(request)
+    
+    try:
+        safe_filename = raw_upload_filename(request)
+        requested_digests = parse_digests(request.query_params.get("digests"))
         
-        # Block dangerous files
-        if not security_analysis['is_safe']:
-            raise HTTPException(status_code=400, detail="File failed security validation")
-        
-        # Calculate hashes
-        hashes = calculate_hashes(file_content)
-        
-        # Calculate entropy
-        entropy = calculate_entropy(file_content)
-        
-        # Extract strings safely
-        strings = extract_strings(file_content)
-        strings_count = len(strings)
-        
-        # Basic metadata
-        metadata = {
-            "file_size": len(file_content),
-            "strings_sample": strings[:10] if strings else [],  # First 10 strings as sample
-        }
+        spool_path, sha256 = await spool_stream(request.stream(), max_file_size)
+        try:
+            report, cached = await analyze_spooled_upload(spool_path, sha256, requested_digests)
+        finally:
+            spool_path.unlink(missing_ok=True)
         
-        # Extract EXIF data for images
-        exif_data = {}
-        if mime_type.startswith('image/'):
-            exif_data = extract_exif_data(file_content)
+        return await complete_analysis(report, safe_filename, client_ip, cached, max_file_size)
         
-        # Create analysis result
-        analysis_result = FileAnalysisResult(
-            filename=safe_filename,
-            file_size=len(file_content),
-            mime_type=mime_type,
-            md5_hash=hashes["md5"],
-            sha1_hash=hashes["sha1"],
-            sha256_hash=hashes["sha256"],
-            strings_count=strings_count,
-            entropy=entropy,
-            metadata=metadata,
-            exif_data=exif_data if exif_data else None,
-            security_analysis=security_analysis
+    except HTTPException:
+        raise
+    except Exception as e:
+        security_logger.log_error(
+            client_ip=client_ip,
+            error_type="FILE_ANALYSIS_ERROR",
+            details=str(e)[:200]
         )
+        raise HTTPException(status_code=500, detail="Error analyzing file")
+
+# Raw-body variant of analyze-file: the request body is the file itself, so it is
+# streamed straight to the spool without multipart parsing or an extra copy
+@api_router.api_route("/analyze-file/raw", methods=["POST", "PUT"], response_model=FileAnalysisResult)
+@limiter.limit("20/minute")
+async def analyze_raw_file(request: Request):
+    return await analyze_raw_upload(request, SecurityConfig.MAX_FILE_SIZE)
+
+# Large-file mode for disk images and memory dumps: same as analyze-file/raw but up
+# to MAX_LARGE_FILE_SIZE. The spooled file is memory-mapped by the worker, so memory
+# use does not grow with the file size
+@api_router.api_route("/analyze-file/large", methods=["POST", "PUT"], response_model=FileAnalysisResult)
+@limiter.limit("5/minute")
+async def analyze_large_file(request: Request):
+    return await analyze_raw_upload(request, SecurityConfig.MAX_LARGE_FILE_SIZE)
+
+# Hash-first lookup: clients send the SHA-256 of a file and only upload it on a 404
+@api_router.post("/analyze-file/lookup", response_model=FileAnalysisResult)
+@limiter.limit("60/minute")
+async def lookup_file_analysis(request: Request, lookup: AnalysisLookup):
+    client_ip = SecurityValidator.get_client_ip(request)
+    
+    try:
+        safe_filename = SecurityValidator.sanitize_filename(lookup.filename)
         
-        # Store analysis result in database
-        await db.file_analyses.insert_one(analysis_result.dict())
+        report = await analysis_cache.get(lookup.sha256)
+        if report is None:
+            raise HTTPException(status_code=404, detail="No analysis stored for this hash")
         
-        return analysis_result
+        # Nothing is uploaded here, so reports of large-file uploads are served too,
+        # with the rule matches stored with them if the rules have not changed
+        report = {**report, "rule_matches": await stored_rule_matches(report)}
+        return await complete_analysis(report, safe_filename, client_ip, cached=True,
+                                       max_file_size=SecurityConfig.MAX_LARGE_FILE_SIZE)
         
     except HTTPException:
         raise
@@ -468,7 +728,17 @@ async def analyze_file(request: Request, file: UploadFile = File(...)):
             error_type="FILE_ANALYSIS_ERROR",
             details=str(e)[:200]
         )
-        raise HTTPException(status_code=500, detail="Error analyzing file")
+        raise HTTPException(status_code=500, detail="Error looking up file analysis")
+
+@api_router.get("/analysis/stats")
+@limiter.limit("30/minute")
+async def get_analysis_stats(request: Request):
+    """Analysis cache hit/miss counters and worker pool usage"""
+    return {
+        "cache": analysis_cache.stats(),
+        "executor": analysis_executor.stats(),
+        "stego_cache": stego_cache.stats(),
+    }
 
 @api_router.get("/file-analyses", response_model=List[FileAnalysisResult])
 @limiter.limit("30/minute")
@@ -480,6 +750,228 @@ async def get_file_analyses(request: Request):
     except Exception as e:
         raise HTTPException(status_code=500, detail="Failed to retrieve file analyses")
 
+def read_file_range(path: Path, start: int, end: int):
+    """Yield the [start, end) byte range of a file in analysis-sized blocks"""
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = f.read(min(ANALYSIS_CHUNK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+
+# Binwalk-style carving: lists the files embedded in the request body, or with
+# ?extract=<offset> returns the member found at that offset
+@api_router.api_route("/carve-file/raw", methods=["POST", "PUT"])
+@limiter.limit("10/minute")
+async def carve_raw_file(request: Request, extract: Optional[int] = None):
+    client_ip = SecurityValidator.get_client_ip(request)
+    
+    try:
+        safe_filename = raw_upload_filename(request)
+        if extract is not None and extract < 0:
+            raise HTTPException(status_code=400, detail="Extract offset cannot be negative")
+        
+        spool_path, _ = await spool_stream(request.stream())
+        try:
+            # Signatures are located in the same worker pass as the security summary
+            summary = await run_analysis(summarize_path, str(spool_path), True)
+            security_analysis = validate_report(summary, safe_filename)
+            
+            security_logger.log_file_upload(
+                filename=safe_filename,
+                size=summary["file_size"],
+                mime_type=summary["mime_type"],
+                client_ip=client_ip,
+                issues=security_analysis.get('issues', [])
+            )
+            
+            if not security_analysis['is_safe']:
+                raise HTTPException(status_code=400, detail="File failed security validation")
+            
+            if extract is None:
+                return {
+                    "filename": safe_filename,
+                    "file_size": summary["file_size"],
+                    "mime_type": summary["mime_type"],
+                    "embedded_files": summary["embedded_files"],
+                }
+            
+            found = member_range(summary["embedded_files"], extract, summary["file_size"])
+            if found is None:
+                raise HTTPException(status_code=404, detail="No embedded file at this offset")
+            start, end, member = found
+            
+            # The spooled upload is removed once the member has been sent
+            response = StreamingResponse(
+                read_file_range(spool_path, start, end),
+                media_type="application/octet-stream",
+                headers={
+                    "Content-Disposition":
+                        f'attachment; filename="{Path(safe_filename).stem}-{start:x}.{member["extension"]}"'
+                },
+                background=BackgroundTask(spool_path.unlink, missing_ok=True)
+            )
+            spool_path = None
+            return response
+        finally:
+            if spool_path is not None:
+                spool_path.unlink(missing_ok=True)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        security_logger.log_error(
+            client_ip=client_ip,
+            error_type="FILE_CARVING_ERROR",
+            details=str(e)[:200]
+        )
+        raise HTTPException(status_code=500, detail="Error carving file")
+
+# LSB/bit-plane steganalysis of the image in the request body. The bit
+# planes are rendered once and served by the route below
+@api_router.api_route("/stego-analysis/raw", methods=["POST", "PUT"])
+@limiter.limit("10/minute")
+async def stego_analysis_raw(request: Request):
+    client_ip = SecurityValidator.get_client_ip(request)
+    
+    try:
+        safe_filename = raw_upload_filename(request)
+        spool_path, sha256 = await spool_stream(request.stream())
+        try:
+            report = stego_cache.report(sha256)
+            cached = report is not None
+            if report is None:
+                staging = stego_cache.staging()
+                try:
+                    report = await run_analysis(analyze_stego_path, str(spool_path), str(staging))
+                    await asyncio.to_thread(stego_cache.store, sha256, staging)
+                except ImageBudgetExceeded as e:
+                    raise HTTPException(status_code=413, detail=str(e))
+                except (UnidentifiedImageError, Image.DecompressionBombError, ValueError):
+                    raise HTTPException(status_code=400, detail="Not a supported image")
+                finally:
+                    shutil.rmtree(staging, ignore_errors=True)
+            
+            security_logger.log_file_upload(
+                filename=safe_filename,
+                size=spool_path.stat().st_size,
+                mime_type=report["mime_type"],
+                client_ip=client_ip
+            )
+        finally:
+            spool_path.unlink(missing_ok=True)
+        
+        return {
+            "filename": safe_filename,
+            "sha256": sha256,
+            "cached": cached,
+            **report,
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        security_logger.log_error(
+            client_ip=client_ip,
+            error_type="STEGO_ANALYSIS_ERROR",
+            details=str(e)[:200]
+        )
+        raise HTTPException(status_code=500, detail="Error analyzing image")
+
+def stego_image_response(sha256: str, filename: str) -> FileResponse:
+    """A PNG rendered by /stego-analysis/raw, from the steganalysis cache"""
+    sha256 = sha256.lower()
+    if len(sha256) != 64 or any(c not in "0123456789abcdef" for c in sha256):
+        raise HTTPException(status_code=400, detail="sha256 must be a hex digest")
+    
+    path = stego_cache.rendered(sha256, filename)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    # Renders are addressed by content hash, so they never change
+    return FileResponse(path, media_type="image/png",
+                        headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+@api_router.get("/stego-analysis/{sha256}/planes/{plane}")
+@limiter.limit("600/minute")
+async def get_stego_plane(request: Request, sha256: str, plane: str):
+    """Rendered bit plane (e.g. R0.png) of an image analyzed by /stego-analysis/raw"""
+    if len(plane) != 6 or not plane[0].isalpha() or plane[1] not in "01234567" or not plane.endswith(".png"):
+        raise HTTPException(status_code=400, detail="Invalid bit plane")
+    return stego_image_response(sha256, plane)
+
+@api_router.get("/stego-analysis/{sha256}/preview.png")
+@limiter.limit("600/minute")
+async def get_stego_preview(request: Request, sha256: str):
+    """Downscaled preview of an image analyzed by /stego-analysis/raw"""
+    return stego_image_response(sha256, "preview.png")
+
+@api_router.get("/rules")
+@limiter.limit("30/minute")
+async def get_rules(request: Request):
+    """Rules of the rule library, and the rule files left out because they do not compile"""
+    rule_set = await asyncio.to_thread(rule_library.rule_set)
+    return {
+        "digest": rule_set.digest,
+        "rules": rule_set.describe(),
+        "errors": rule_library.errors,
+    }
+
+# Match an upload against ad-hoc rules, or against the rule library when no
+# rules are sent. Compiled rule sets are cached by the hash of their source,
+# so repeating a scan with the same rules does not compile them again
+@api_router.post("/rules/scan")
+@limiter.limit("10/minute")
+async def scan_rules(request: Request, file: UploadFile = File(...), rules: Optional[str] = Form(None)):
+    client_ip = SecurityValidator.get_client_ip(request)
+    
+    try:
+        if not file.filename:
+            raise HTTPException(status_code=400, detail="Filename is required")
+        safe_filename = SecurityValidator.sanitize_filename(file.filename)
+        
+        if rules is not None:
+            if len(rules) > SecurityConfig.MAX_RULES_SOURCE:
+                raise HTTPException(status_code=413, detail="Rules too large")
+            files = (("request.yar", rules),)
+            # Compile here first, so that rule errors are reported without a worker job
+            try:
+                await asyncio.to_thread(rule_set_cache.get, files)
+            except RuleSyntaxError as e:
+                raise HTTPException(status_code=400, detail=f"Invalid rules: {str(e)[:500]}")
+        else:
+            files = await asyncio.to_thread(rule_library.files)
+        
+        spool_path, sha256 = await spool_upload(file)
+        try:
+            result = await run_analysis(match_rules_path, str(spool_path), files)
+            security_logger.log_file_upload(
+                filename=safe_filename,
+                size=spool_path.stat().st_size,
+                mime_type=detect_mime_type(b"".join(read_file_range(spool_path, 0, 1024))),
+                client_ip=client_ip
+            )
+        finally:
+            spool_path.unlink(missing_ok=True)
+        
+        return {
+            "filename": safe_filename,
+            "sha256": sha256,
+            **result,
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        security_logger.log_error(
+            client_ip=client_ip,
+            error_type="RULE_SCAN_ERROR",
+            details=str(e)[:200]
+        )
+        raise HTTPException(status_code=500, detail="Error matching rules")
+
 # Enhanced tool usage logging
 @api_router.post("/tool-usage")
 @limiter.limit("60/minute")
@@ -503,39 +995,18 @@ async def log_tool_usage(request: Request, tool_name: str, input_data: str = "")
         raise HTTPException(status_code=500, detail="Failed to log tool usage")
 
 # Secure file upload for custom scripts
-@api_router.post("/upload-file-for-script")
-@limiter.limit("20/minute")
-async def upload_file_for_script(request: Request, file: UploadFile = File(...)):
-    """Upload a file to be used with custom scripts - with enhanced security"""
-    client_ip = SecurityValidator.get_client_ip(request)
-    
+async def store_script_upload(spool_path: Path, safe_filename: str, client_ip: str) -> Dict[str, Any]:
+    """Validate a spooled upload and move it into place for the custom scripts"""
     try:
-        if not file.filename:
-            raise HTTPException(status_code=400, detail="Filename is required")
-        
-        # Sanitize filename
-        safe_filename = SecurityValidator.sanitize_filename(file.filename)
-        
-        # Read file content with size limit
-        file_content = await file.read()
-        
-        # Check file size after reading
-        if len(file_content) > SecurityConfig.MAX_FILE_SIZE:
-            raise HTTPException(status_code=413, detail="File too large")
-        
-        # Get MIME type
-        mime_type = magic.from_buffer(file_content, mime=True)
-        
-        # Validate file content
-        security_analysis = SecurityValidator.validate_file_content(
-            file_content, safe_filename, mime_type
-        )
+        # Validate file content; the worker maps the spooled file instead of receiving its bytes
+        summary = await run_analysis(summarize_path, str(spool_path))
+        security_analysis = validate_report(summary, safe_filename)
         
         # Log the upload
         security_logger.log_file_upload(
             filename=safe_filename,
-            size=len(file_content),
-            mime_type=mime_type,
+            size=summary["file_size"],
+            mime_type=summary["mime_type"],
             client_ip=client_ip,
             issues=security_analysis.get('issues', [])
         )
@@ -545,27 +1016,61 @@ async def upload_file_for_script(request: Request, file: UploadFile = File(...))
             raise HTTPException(status_code=400, detail="File failed security validation")
         
         # Clear previous uploads securely
-        for old_file in UPLOADS_DIR.glob("*"):
-            try:
-                old_file.unlink()
-            except Exception:
-                pass  # Continue if file deletion fails
+        clear_script_uploads()
         
-        # Save the uploaded file with secure permissions
+        # Move the spooled file into place with restrictive permissions
         file_path = UPLOADS_DIR / safe_filename
-        with open(file_path, "wb") as buffer:
-            buffer.write(file_content)
+        os.chmod(spool_path, 0o600)
+        shutil.move(str(spool_path), str(file_path))
+    finally:
+        spool_path.unlink(missing_ok=True)
+    
+    return {
+        "message": "File uploaded successfully",
+        "filename": safe_filename,
+        "size": summary["file_size"],
+        "path": str(file_path),
+        "security_warnings": security_analysis.get('warnings', [])
+    }
+
+@api_router.post("/upload-file-for-script")
+@limiter.limit("20/minute")
+async def upload_file_for_script(request: Request, file: UploadFile = File(...)):
+    """Upload a file to be used with custom scripts - with enhanced security"""
+    client_ip = SecurityValidator.get_client_ip(request)
+    
+    try:
+        if not file.filename:
+            raise HTTPException(status_code=400, detail="Filename is required")
         
-        # Set restrictive permissions
-        os.chmod(file_path, 0o600)
+        # Sanitize filename
+        safe_filename = SecurityValidator.sanitize_filename(file.filename)
         
-        return {
-            "message": "File uploaded successfully",
-            "filename": safe_filename,
-            "size": len(file_content),
-            "path": str(file_path),
-            "security_warnings": security_analysis.get('warnings', [])
-        }
+        # Spool the upload (checking its size while reading) and validate it in a worker
+        spool_path, _ = await spool_upload(file)
+        return await store_script_upload(spool_path, safe_filename, client_ip)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        security_logger.log_error(
+            client_ip=client_ip,
+            error_type="FILE_UPLOAD_ERROR",
+            details=str(e)[:200]
+        )
+        raise HTTPException(status_code=500, detail="Error uploading file")
+
+# Raw-body variant of upload-file-for-script, streamed to disk without multipart parsing
+@api_router.api_route("/upload-file-for-script/raw", methods=["POST", "PUT"])
+@limiter.limit("20/minute")
+async def upload_raw_file_for_script(request: Request):
+    client_ip = SecurityValidator.get_client_ip(request)
+    
+    try:
+        safe_filename = raw_upload_filename(request)
+        
+        spool_path, _ = await spool_stream(request.stream())
+        return await store_script_upload(spool_path, safe_filename, client_ip)
         
     except HTTPException:
         raise
@@ -811,7 +1316,7 @@ app.add_middleware(
         "https://localhost:3000",
         "*"  # Allow all for now but we should restrict this in production
     ],  # Include the preview domain
-    allow_methods=["GET", "POST", "DELETE", "OPTIONS"],  # Add OPTIONS
+    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],  # Add OPTIONS
     allow_headers=["*"],  # Allow all headers
     max_age=600,  # Cache preflight for 10 minutes
 )
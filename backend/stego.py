@@ -0,0 +1,369 @@
+"""
+LSB and bit-plane steganography analysis for SectoolBox
+"""
+import json
+import math
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from entropy import chi_square_p_value
+from imaging import decode_preview, open_bounded, pixel_array
+
+# Bumped whenever the report or the rendered planes change, so cached
+# entries from an older analyzer are recomputed
+STEGO_VERSION = "2"
+
+# Rows of pixels processed at a time, bounding the working copies the
+# statistics make of a channel
+ANALYSIS_BLOCK_ROWS = 256
+
+# Prefixes of the pixel sequence the chi-square attack is repeated over:
+# sequential embedding shows as a high probability that drops off past the
+# end of the payload
+CHI_SQUARE_WINDOWS = 10
+
+# Pixel-pair categories with fewer expected values are left out of the
+# chi-square statistic
+CHI_SQUARE_MIN_EXPECTED = 5
+
+# A channel is flagged when its RS estimate of the embedding rate, or the
+# chi-square embedding probability over its first window, reaches these
+RS_SUSPICIOUS_RATE = 0.1
+CHI_SQUARE_SUSPICIOUS_PROBABILITY = 0.95
+
+# Largest bit plane rendered, in pixels. Planes of bigger images sample
+# pixels at a fixed stride (the statistics still cover every pixel): PNG
+# encoding costs about as much as all of the statistics put together, and
+# no display shows more than this anyway
+MAX_PLANE_PIXELS = 4 * 1024 * 1024
+
+# zlib level of the rendered bit-plane PNGs: noisy low planes barely
+# compress at any level, so the fastest one is used
+PLANE_COMPRESS_LEVEL = 1
+
+# Staging directories older than this are abandoned renders
+STALE_STAGING_SECONDS = 60 * 60
+
+# bit i of every byte value, as a (256, 8) matrix: a histogram times this
+# gives the number of set bits in each plane
+_BIT_TABLE = ((np.arange(256)[:, None] >> np.arange(8)) & 1).astype(np.int64)
+
+
+def _row_blocks(channel: np.ndarray, start: int = 0, end: Optional[int] = None):
+    """Contiguous copies of consecutive bands of ANALYSIS_BLOCK_ROWS rows"""
+    end = channel.shape[0] if end is None else end
+    for top in range(start, end, ANALYSIS_BLOCK_ROWS):
+        yield np.ascontiguousarray(channel[top:min(top + ANALYSIS_BLOCK_ROWS, end)])
+
+
+def bit_plane_stats(channel: np.ndarray) -> List[Dict[str, Any]]:
+    """Share of set bits and of horizontally agreeing neighbours in each bit plane.
+
+    Natural images have structured high planes (neighbours agree) and
+    noise-like low planes; an LSB plane whose neighbours agree about half
+    the time with a 0.5 ones ratio looks like random payload.
+    """
+    values = np.zeros(256, dtype=np.int64)
+    neighbours = np.zeros(256, dtype=np.int64)
+    for block in _row_blocks(channel):
+        values += np.bincount(block.ravel(), minlength=256)
+        neighbours += np.bincount((block[:, 1:] ^ block[:, :-1]).ravel(), minlength=256)
+    counted = channel.size
+    pairs = channel.shape[0] * max(channel.shape[1] - 1, 0)
+    ones = values @ _BIT_TABLE
+    changes = neighbours @ _BIT_TABLE
+    return [
+        {
+            "bit": bit,
+            "ones_ratio": round(float(ones[bit]) / counted, 4) if counted else 0.0,
+            "neighbour_agreement": round(1 - float(changes[bit]) / pairs, 4) if pairs else 0.0,
+        }
+        for bit in range(8)
+    ]
+
+
+def _pairs_of_values_probability(histogram: np.ndarray) -> Optional[float]:
+    """Westfeld-Pfitzmann chi-square attack on one histogram.
+
+    LSB replacement equalizes the counts of each pair of values 2k, 2k+1;
+    the result is the probability that the pairs are that even, i.e. that
+    the samples carry embedded data.
+    """
+    even = histogram[0::2].astype(np.float64)
+    odd = histogram[1::2].astype(np.float64)
+    expected = (even + odd) / 2
+    used = expected >= CHI_SQUARE_MIN_EXPECTED
+    categories = int(np.count_nonzero(used))
+    if categories < 2:
+        return None
+    statistic = float(np.sum((even[used] - expected[used]) ** 2 / expected[used]))
+    return chi_square_p_value(statistic, categories - 1)
+
+
+def chi_square_attack(channel: np.ndarray) -> Dict[str, Any]:
+    """Chi-square embedding probability over the whole channel and over growing prefixes of its rows"""
+    histogram = np.zeros(256, dtype=np.int64)
+    bounds = np.linspace(0, channel.shape[0], CHI_SQUARE_WINDOWS + 1).astype(np.int64)
+    windows = []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        for block in _row_blocks(channel, int(start), int(end)):
+            histogram += np.bincount(block.ravel(), minlength=256)
+        probability = _pairs_of_values_probability(histogram)
+        windows.append(None if probability is None else round(probability, 4))
+    return {
+        "probability": windows[-1],
+        "window_probabilities": windows,
+    }
+
+
+def _flip_positive(values: np.ndarray) -> np.ndarray:
+    return values ^ 1
+
+
+def _flip_negative(values: np.ndarray) -> np.ndarray:
+    return ((values + 1) ^ 1) - 1
+
+
+def _smoothness_tables(flip) -> Tuple[np.ndarray, np.ndarray]:
+    """Change in a group's smoothness from flipping its middle pixels, per pair of neighbours.
+
+    Indexed by (first << 8) | second: the edge table is for an outer pixel
+    followed by a flipped one, the middle table for two flipped pixels. A
+    group's change is the sum of its three pair terms, each within -2..2.
+    """
+    values = np.arange(256, dtype=np.int16)
+    flipped = flip(values)
+    unchanged = np.abs(values[None, :] - values[:, None])
+    edge = np.abs(flipped[None, :] - values[:, None]) - unchanged
+    middle = np.abs(flipped[None, :] - flipped[:, None]) - unchanged
+    return edge.astype(np.int8).ravel(), middle.astype(np.int8).ravel()
+
+
+def _inverted(table: np.ndarray) -> np.ndarray:
+    """The same table for the channel with every LSB inverted"""
+    swapped = np.arange(256) ^ 1
+    return table.reshape(256, 256)[swapped][:, swapped].ravel()
+
+
+# Smoothness tables for the positive and negative masks, for the channel
+# and for its LSB-inverted copy. Looking pairs up replaces flipping copies
+# of every group and recomputing their smoothness
+_RS_TABLES = tuple(_smoothness_tables(flip) for flip in (_flip_positive, _flip_negative))
+_RS_INVERTED_TABLES = tuple((_inverted(edge), _inverted(middle)) for edge, middle in _RS_TABLES)
+
+
+def rs_analysis(channel: np.ndarray) -> Optional[float]:
+    """Fridrich's RS estimate of the share of pixels carrying LSB payload.
+
+    Pixels are taken in horizontal groups of four with the flipping mask
+    [0, 1, 1, 0]. Regular/singular group counts under the positive and
+    negative masks, for the channel and for the channel with every LSB
+    inverted, give a quadratic whose smaller root is the embedding rate.
+    """
+    height, width = channel.shape
+    width -= width % 4
+    if not height or not width:
+        return None
+
+    counts = np.zeros((2, 2, 2), dtype=np.int64)  # [inverted][mask][regular, singular]
+    for top in range(0, height, ANALYSIS_BLOCK_ROWS):
+        groups = channel[top:top + ANALYSIS_BLOCK_ROWS, :width].reshape(-1, 4).astype(np.uint16)
+        left = (groups[:, 0] << 8) | groups[:, 1]
+        right = (groups[:, 3] << 8) | groups[:, 2]
+        middle = (groups[:, 1] << 8) | groups[:, 2]
+        for inverted, tables in enumerate((_RS_TABLES, _RS_INVERTED_TABLES)):
+            for mask, (edge_table, middle_table) in enumerate(tables):
+                change = edge_table[left] + edge_table[right] + middle_table[middle]
+                counts[inverted, mask] += (np.count_nonzero(change > 0), np.count_nonzero(change < 0))
+
+    total = height * (width // 4)
+    (r_m, s_m), (r_neg, s_neg) = counts[0] / total
+    (r_m1, s_m1), (r_neg1, s_neg1) = counts[1] / total
+    d0 = r_m - s_m
+    d1 = r_m1 - s_m1
+    dn0 = r_neg - s_neg
+    dn1 = r_neg1 - s_neg1
+
+    a = 2 * (d1 + d0)
+    b = dn0 - dn1 - d1 - 3 * d0
+    c = d0 - dn0
+    if abs(a) < 1e-12:
+        if abs(b) < 1e-12:
+            return None
+        root = -c / b
+    else:
+        discriminant = b * b - 4 * a * c
+        if discriminant < 0:
+            return None
+        roots = ((-b + math.sqrt(discriminant)) / (2 * a),
+                 (-b - math.sqrt(discriminant)) / (2 * a))
+        root = min(roots, key=abs)
+    if abs(root - 0.5) < 1e-12:
+        return None
+    return round(float(min(max(0.0, root / (root - 0.5)), 1.0)), 4)
+
+
+def plane_filename(channel: str, bit: int) -> str:
+    return f"{channel}{bit}.png"
+
+
+def plane_step(height: int, width: int) -> int:
+    """Stride the rendered planes sample pixels at, to fit MAX_PLANE_PIXELS"""
+    return max(1, math.ceil(math.sqrt(height * width / MAX_PLANE_PIXELS)))
+
+
+def render_bit_planes(pixels: np.ndarray, bands: List[str], output_dir: Path, step: int = 1) -> None:
+    """Write every bit plane of every channel as a 1-bit PNG, sampling every step-th pixel"""
+    sampled = pixels[::step, ::step]
+    height, width = sampled.shape[:2]
+    for index, band in enumerate(bands):
+        channel = np.ascontiguousarray(sampled[:, :, index])
+        for bit in range(8):
+            packed = np.packbits((channel >> bit) & 1, axis=1)
+            plane = Image.frombytes('1', (width, height), packed.tobytes())
+            plane.save(output_dir / plane_filename(band, bit), format='PNG',
+                       compress_level=PLANE_COMPRESS_LEVEL)
+
+
+def analyze_stego_path(path: str, output_dir: str) -> Dict[str, Any]:
+    """Steganalysis report of an image file, with its bit planes and a preview rendered into output_dir.
+
+    The image is decoded once, within the pixel budget (large JPEGs at a
+    reduced scale, reported as such); every statistic is computed over all
+    of the decoded pixels. The report is also written to output_dir as
+    report.json, so the directory can be moved into a StegoPlaneCache as is.
+    """
+    output = Path(output_dir)
+    image, scale, (width, height) = open_bounded(path)
+    with image:
+        mode, image_format = image.mode, image.format
+        pixels, bands = pixel_array(image)
+        # Pixels are copied out, so the decoded image can be shrunk in place
+        decode_preview(path, image).save(output / "preview.png", format='PNG',
+                                         compress_level=PLANE_COMPRESS_LEVEL)
+
+    channels = []
+    for index, band in enumerate(bands):
+        channel = pixels[:, :, index]
+        chi_square = chi_square_attack(channel)
+        rs_rate = rs_analysis(channel)
+        first_window = chi_square["window_probabilities"][0]
+        channels.append({
+            "name": band,
+            "bit_planes": bit_plane_stats(channel),
+            "chi_square": chi_square,
+            "rs_embedding_rate": rs_rate,
+            "suspicious": bool(
+                (rs_rate is not None and rs_rate >= RS_SUSPICIOUS_RATE)
+                or (first_window is not None and first_window >= CHI_SQUARE_SUSPICIOUS_PROBABILITY)
+            ),
+        })
+
+    step = plane_step(*pixels.shape[:2])
+    render_bit_planes(pixels, bands, output, step)
+
+    rates = [channel["rs_embedding_rate"] for channel in channels
+             if channel["rs_embedding_rate"] is not None]
+    report = {
+        "version": STEGO_VERSION,
+        "format": image_format,
+        "mime_type": Image.MIME.get(image_format or "", "application/octet-stream"),
+        "width": width,
+        "height": height,
+        "scale": scale,
+        "plane_step": step,
+        "mode": mode,
+        "channels": channels,
+        "planes": [plane_filename(band, bit) for band in bands for bit in range(8)],
+        "estimated_embedding_rate": max(rates) if rates else None,
+        "suspicious": any(channel["suspicious"] for channel in channels),
+    }
+    (output / "report.json").write_text(json.dumps(report))
+    return report
+
+
+class StegoPlaneCache:
+    """On-disk cache of steganalysis reports and rendered bit planes.
+
+    Each analyzed image gets a directory named by its SHA-256 holding
+    report.json, a preview and one PNG per bit plane. Workers render into a staging
+    directory that is renamed into place, so readers never see a partial
+    entry. Least recently used entries are removed past max_entries.
+    """
+
+    def __init__(self, directory: Path, max_entries: int = 64):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.directory.mkdir(exist_ok=True, mode=0o700)
+
+    def _entry(self, sha256: str) -> Path:
+        return self.directory / sha256
+
+    def report(self, sha256: str) -> Optional[Dict[str, Any]]:
+        """Cached report for this content, if any"""
+        entry = self._entry(sha256)
+        try:
+            report = json.loads((entry / "report.json").read_text())
+            os.utime(entry)
+        except (OSError, ValueError):
+            report = None
+        if report is None or report.get("version") != STEGO_VERSION:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return report
+
+    def rendered(self, sha256: str, filename: str) -> Optional[Path]:
+        """Path of a rendered bit plane or preview, if it is cached"""
+        path = self._entry(sha256) / filename
+        return path if path.is_file() else None
+
+    def staging(self) -> Path:
+        """A fresh directory for a worker to render into"""
+        return Path(tempfile.mkdtemp(dir=self.directory, prefix=".staging-"))
+
+    def store(self, sha256: str, staging: Path) -> None:
+        """Move a rendered staging directory into place and evict old entries"""
+        entry = self._entry(sha256)
+        with self._lock:
+            if entry.exists():
+                shutil.rmtree(entry, ignore_errors=True)
+            os.replace(staging, entry)
+            self._evict()
+
+    def _evict(self) -> None:
+        entries = []
+        stale = time.time() - STALE_STAGING_SECONDS
+        for path in self.directory.iterdir():
+            try:
+                modified = path.stat().st_mtime
+            except OSError:
+                continue
+            if not path.name.startswith("."):
+                entries.append((modified, path))
+            elif modified < stale:
+                # Left behind by an interrupted process; other processes
+                # sharing the directory may still be rendering younger ones
+                shutil.rmtree(path, ignore_errors=True)
+        entries.sort()
+        for _, path in entries[:max(len(entries) - self.max_entries, 0)]:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": sum(1 for path in self.directory.iterdir() if not path.name.startswith(".")),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
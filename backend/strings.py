@@ -0,0 +1,297 @@
+"""
+Printable string extraction for SectoolBox
+"""
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+
+import numpy as np
+
+from entropy import byte_view
+
+DEFAULT_ENCODINGS = ('ascii', 'utf-8', 'utf-16le', 'utf-16be', 'utf-32le', 'utf-32be')
+
+# Largest block scanned at once; bigger inputs are scanned block by block
+SCAN_BLOCK_SIZE = 1024 * 1024
+
+# Open runs longer than this are reported in pieces instead of being carried over
+MAX_RUN_BYTES = 64 * 1024
+
+# Encodings and their bytes per character (4 for UTF-8: the longest sequence),
+# in priority order for runs of equal length that overlap. The UTF-8 scan also
+# reports the pure-ASCII runs.
+_ENCODING_WIDTHS = {
+    'utf-32le': 4,
+    'utf-32be': 4,
+    'utf-16le': 2,
+    'utf-16be': 2,
+    'utf-8': 4,
+    'ascii': 1,
+}
+_ENCODING_PRIORITY = {name: index for index, name in enumerate(_ENCODING_WIDTHS)}
+
+Span = Tuple[int, int, str]
+
+
+def _runs(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Start and end indices of the runs of True in a boolean array"""
+    edges = np.flatnonzero(np.diff(np.concatenate(([False], mask, [False])).view(np.int8)))
+    return edges[0::2], edges[1::2]
+
+
+def _count_in_runs(mask: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Number of True values of mask inside each [start, end) run"""
+    if not len(starts):
+        return np.zeros(0, dtype=np.int64)
+    bounds = np.empty(2 * len(starts), dtype=np.intp)
+    bounds[0::2] = starts
+    bounds[1::2] = ends
+    return np.add.reduceat(np.append(mask, False), bounds, dtype=np.int64)[0::2]
+
+
+def _shifted(mask: np.ndarray, distance: int) -> np.ndarray:
+    """mask[i + distance], padded with False past the end"""
+    return np.concatenate((mask[distance:], np.zeros(min(distance, len(mask)), dtype=bool)))
+
+
+def _fixed_width_spans(char_starts: np.ndarray, name: str, width: int, min_length: int) -> List[Span]:
+    """Runs of at least min_length adjacent fixed-width characters"""
+    spans = []
+    for alignment in range(width):
+        starts, ends = _runs(char_starts[alignment::width])
+        keep = ends - starts >= min_length
+        spans.extend(zip((alignment + starts[keep] * width).tolist(),
+                         (alignment + ends[keep] * width).tolist(),
+                         [name] * int(keep.sum())))
+    return spans
+
+
+def _utf8_spans(data: np.ndarray, printable: np.ndarray, min_length: int) -> List[Span]:
+    """Runs of at least min_length valid, printable UTF-8 characters"""
+    continuation = (data >= 0x80) & (data <= 0xbf)
+    next1, next2, next3 = (_shifted(continuation, k) for k in (1, 2, 3))
+    second = np.concatenate((data[1:], np.zeros(min(1, len(data)), dtype=np.uint8)))
+
+    # Lead bytes followed by valid continuations (no overlongs, surrogates or C1 controls)
+    lead2 = next1 & (((data == 0xc2) & (second >= 0xa0)) | ((data >= 0xc3) & (data <= 0xdf)))
+    lead3 = next1 & next2 & (((data == 0xe0) & (second >= 0xa0))
+                             | ((data >= 0xe1) & (data <= 0xef) & (data != 0xed))
+                             | ((data == 0xed) & (second <= 0x9f)))
+    lead4 = next1 & next2 & next3 & (((data == 0xf0) & (second >= 0x90))
+                                     | ((data >= 0xf1) & (data <= 0xf3))
+                                     | ((data == 0xf4) & (second <= 0x8f)))
+
+    char_starts = printable | lead2 | lead3 | lead4
+    covered = char_starts.copy()
+    covered[1:] |= (lead2 | lead3 | lead4)[:-1]
+    covered[2:] |= (lead3 | lead4)[:-2]
+    covered[3:] |= lead4[:-3]
+
+    starts, ends = _runs(covered)
+    keep = _count_in_runs(char_starts, starts, ends) >= min_length
+    return list(zip(starts[keep].tolist(), ends[keep].tolist(), ['utf-8'] * int(keep.sum())))
+
+
+class StringExtractor:
+    """Multi-encoding printable string extractor.
+
+    Character runs are located with vectorized run-length detection over the
+    raw bytes and reported with their absolute byte offset and encoding. When
+    runs of different encodings overlap, the longer run keeps the shared bytes
+    and the other is trimmed. Data can be fed in chunks; runs near a chunk
+    boundary are carried over to the next chunk.
+
+    offset is the position of the first fed byte in the whole file. When a
+    file is split between several extractors, each can be fed some context
+    around its part and given the part as bounds: only strings starting
+    inside the bounds are then counted and reported.
+    """
+
+    def __init__(self, min_length: int = 4, encodings: Iterable[str] = DEFAULT_ENCODINGS,
+                 max_strings: Optional[int] = None, offset: int = 0,
+                 bounds: Optional[Tuple[int, int]] = None):
+        encodings = set(encodings)
+        unknown = encodings - set(_ENCODING_WIDTHS)
+        if unknown:
+            raise ValueError(f"Unsupported string encodings: {', '.join(sorted(unknown))}")
+        if not encodings:
+            raise ValueError("At least one string encoding is required")
+
+        self.min_length = min_length
+        self.encodings = encodings
+        self.max_strings = max_strings
+        self.bounds = bounds
+        self.count = 0
+        self.strings: List[Dict[str, Any]] = []
+
+        self._widths = {}
+        for name, width in _ENCODING_WIDTHS.items():
+            if name == 'ascii' and 'utf-8' in encodings:
+                continue
+            if name in encodings:
+                self._widths[name] = width
+
+        self._tail = max(self._widths.values()) * (min_length + 1)
+        self._pending = b''
+        self._pending_offset = offset
+
+    def _find_spans(self, data: bytes) -> List[Span]:
+        """Maximal character runs of every selected encoding"""
+        view = byte_view(data)
+        printable = (view >= 0x20) & (view <= 0x7e)
+        zero = view == 0
+        spans = []
+
+        for name, width in self._widths.items():
+            if len(view) < width:
+                continue
+            if name == 'utf-8':
+                spans.extend(_utf8_spans(view, printable, self.min_length))
+                continue
+            if name == 'ascii':
+                char_starts = printable
+            elif name == 'utf-16le':
+                char_starts = printable[:-1] & zero[1:]
+            elif name == 'utf-16be':
+                char_starts = zero[:-1] & printable[1:]
+            elif name == 'utf-32le':
+                char_starts = printable[:-3] & zero[1:-2] & zero[2:-1] & zero[3:]
+            else:
+                char_starts = zero[:-3] & zero[1:-2] & zero[2:-1] & printable[3:]
+            spans.extend(_fixed_width_spans(char_starts, name, width, self.min_length))
+
+        return spans
+
+    def _trim_end(self, data: bytes, span: Span, limit: int) -> Span:
+        """Shorten a span to whole characters ending at or before limit"""
+        start, end, name = span
+        if name == 'utf-8':
+            # Variable width: back off any continuation bytes of a split character
+            end = max(min(limit, end), start)
+            while end > start and 0x80 <= data[end] <= 0xbf:
+                end -= 1
+        else:
+            width = self._widths[name]
+            end = max(start + (limit - start) // width * width, start)
+        return start, end, name
+
+    def _trim_start(self, data: bytes, span: Span, limit: int) -> Span:
+        """Shorten a span to whole characters starting at or after limit"""
+        start, end, name = span
+        width = self._widths[name]
+        if name == 'utf-8':
+            start = limit
+            while start < end and 0x80 <= data[start] <= 0xbf:
+                start += 1
+        else:
+            start += -(-(limit - start) // width) * width
+        return min(start, end), end, name
+
+    def _long_enough(self, data: bytes, span: Span) -> bool:
+        start, end, name = span
+        if name == 'utf-8':
+            return len(data[start:end].decode('utf-8')) >= self.min_length
+        return (end - start) // self._widths[name] >= self.min_length
+
+    def _resolve_overlaps(self, data: bytes, spans: List[Span]) -> List[Span]:
+        """Make sorted spans disjoint, the longer run keeping any shared bytes"""
+        kept = []
+        for span in spans:
+            while kept and kept[-1][1] > span[0]:
+                previous = kept[-1]
+                if span[1] - span[0] > previous[1] - previous[0]:
+                    previous = self._trim_end(data, previous, span[0])
+                    if self._long_enough(data, previous):
+                        kept[-1] = previous
+                        break
+                    kept.pop()
+                else:
+                    span = self._trim_start(data, span, previous[1])
+                    break
+            if self._long_enough(data, span):
+                kept.append(span)
+        return kept
+
+    def _scan(self, data: bytes, final: bool) -> int:
+        """Report runs in data and return the position up to which it is consumed"""
+        cut = len(data) if final else max(len(data) - self._tail, 0)
+        spans = self._find_spans(data)
+        forced = []
+
+        if not final:
+            closed = []
+            for span in spans:
+                start, end, name = span
+                if end <= len(data) - self._widths[name]:
+                    closed.append(span)
+                elif len(data) - start <= MAX_RUN_BYTES:
+                    # Run may continue in the next chunk
+                    cut = min(cut, start)
+                else:
+                    forced.append(span)
+            spans = closed
+
+        # Runs reaching past the cut are carried over whole, and overlong open
+        # runs are reported in pieces ending at the cut
+        by_end = sorted(spans, key=lambda span: span[1], reverse=True)
+        while True:
+            new_cut = cut
+            for start, end, _ in by_end:
+                if end <= new_cut:
+                    break
+                if start < new_cut:
+                    new_cut = start
+            for span in forced:
+                new_cut = min(new_cut, self._trim_end(data, span, new_cut)[1])
+            if new_cut == cut:
+                break
+            cut = new_cut
+
+        spans = [span for span in spans if span[1] <= cut]
+        spans.extend(self._trim_end(data, span, cut) for span in forced)
+        spans.sort(key=lambda span: (span[0], _ENCODING_PRIORITY[span[2]]))
+
+        for start, end, name in self._resolve_overlaps(data, spans):
+            if self.bounds and not self.bounds[0] <= self._pending_offset + start < self.bounds[1]:
+                continue
+            run = data[start:end]
+            encoding = name
+            if name == 'utf-8':
+                encoding = 'ascii' if run.isascii() else 'utf-8'
+                if encoding not in self.encodings:
+                    continue
+            self.count += 1
+            if self.max_strings is None or len(self.strings) < self.max_strings:
+                self.strings.append({
+                    'offset': self._pending_offset + start,
+                    'encoding': encoding,
+                    'value': run.decode(encoding),
+                })
+
+        return cut
+
+    def feed(self, chunk: bytes) -> None:
+        """Extract the strings completed by this chunk"""
+        if not chunk:
+            return
+
+        data = self._pending + chunk if self._pending else bytes(chunk)
+        cut = self._scan(data, final=False)
+        self._pending = data[cut:]
+        self._pending_offset += cut
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """Flush the carried-over bytes and return the extracted strings"""
+        if self._pending:
+            self._scan(self._pending, final=True)
+            self._pending_offset += len(self._pending)
+            self._pending = b''
+        return self.strings
+
+
+def extract_strings(data: bytes, min_length: int = 4, encodings: Iterable[str] = DEFAULT_ENCODINGS,
+                    max_strings: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Extract printable strings with their byte offsets and encodings"""
+    extractor = StringExtractor(min_length=min_length, encodings=encodings, max_strings=max_strings)
+    view = memoryview(data)
+    for offset in range(0, len(view), SCAN_BLOCK_SIZE):
+        extractor.feed(view[offset:offset + SCAN_BLOCK_SIZE])
+    return extractor.finish()
@@ -4,6 +4,7 @@ SectoolBox Backend Test Script
 Tests all backend API endpoints to verify functionality
 """
 import requests
+import io
 import json
 import os
 import time
@@ -11,6 +12,7 @@ import tempfile
 import random
 import string
 from datetime import datetime
+from PIL import Image
 
 # Get backend URL from frontend .env file
 with open('/app/frontend/.env', 'r') as f:
@@ -294,6 +296,245 @@ def test_tool_usage():
         print(f"❌ Tool usage logging failed: {response.text}")
         return False
 
+def test_analysis_lookup():
+    """Test looking up a stored analysis by SHA-256 instead of uploading again"""
+    print("\n=== Testing Analysis Lookup Endpoint ===")
+    
+    sample = f"lookup sample {datetime.now().isoformat()} {random.random()}".encode()
+    response = requests.post(f"{API_URL}/analyze-file", files={'file': ('sample.txt', sample)})
+    print(f"Status Code: {response.status_code}")
+    if response.status_code != 200:
+        print(f"❌ File analysis failed: {response.text}")
+        return False
+    uploaded = response.json()
+    
+    response = requests.post(f"{API_URL}/analyze-file/lookup",
+                             json={'sha256': uploaded['sha256_hash'].upper(), 'filename': 'renamed.txt'})
+    print(f"Status Code: {response.status_code}")
+    if response.status_code != 200:
+        print(f"❌ Lookup of a stored analysis failed: {response.text}")
+        return False
+    result = response.json()
+    if (result['filename'] != 'renamed.txt' or not result['metadata']['cached']
+            or result['hashes'] != uploaded['hashes'] or result['strings'] != uploaded['strings']):
+        print(f"❌ Lookup did not return the stored analysis: {result}")
+        return False
+    print("✅ Stored analysis returned under the new filename")
+    
+    response = requests.post(f"{API_URL}/analyze-file/lookup",
+                             json={'sha256': '0' * 64, 'filename': 'missing.txt'})
+    print(f"Status Code: {response.status_code}")
+    if response.status_code != 404:
+        print(f"❌ Unknown hash did not return 404: {response.text}")
+        return False
+    print("✅ Unknown hash returns 404")
+    
+    response = requests.post(f"{API_URL}/analyze-file/lookup",
+                             json={'sha256': 'z' * 64, 'filename': 'invalid.txt'})
+    print(f"Status Code: {response.status_code}")
+    if response.status_code != 422:
+        print(f"❌ Invalid hash was not rejected: {response.text}")
+        return False
+    print("✅ Invalid hash rejected")
+    return True
+
+def test_analysis_stats():
+    """Test the analysis cache and worker pool statistics endpoint"""
+    print("\n=== Testing Analysis Stats Endpoint ===")
+    
+    response = requests.get(f"{API_URL}/analysis/stats")
+    print(f"Status Code: {response.status_code}")
+    if response.status_code != 200:
+        print(f"❌ Failed to get analysis stats: {response.text}")
+        return False
+    before = response.json()
+    print(f"Stats: {before}")
+    if set(before) != {'cache', 'executor', 'stego_cache'}:
+        print(f"❌ Unexpected stats sections: {list(before)}")
+        return False
+    
+    # A new file is a cache miss analyzed by a worker, the same file again a cache hit
+    sample = f"stats sample {datetime.now().isoformat()} {random.random()}".encode()
+    for _ in range(2):
+        response = requests.post(f"{API_URL}/analyze-file", files={'file': ('stats.txt', sample)})
+        if response.status_code != 200:
+            print(f"❌ File analysis failed: {response.text}")
+            return False
+    after = requests.get(f"{API_URL}/analysis/stats").json()
+    print(f"Stats: {after}")
+    cache_hits = lambda stats: stats['cache']['memory_hits'] + stats['cache']['database_hits']
+    if (after['cache']['misses'] < before['cache']['misses'] + 1
+            or cache_hits(after) < cache_hits(before) + 1
+            or after['executor']['completed'] <= before['executor']['completed']):
+        print("❌ Stats did not count the analyses")
+        return False
+    print("✅ Analysis stats endpoint is working correctly")
+    return True
+
+def test_file_carving():
+    """Test listing embedded files and extracting one with ?extract=<offset>"""
+    print("\n=== Testing File Carving Endpoint ===")
+    
+    png = (b'\x89PNG\r\n\x1a\n' + b'\x00\x00\x00\x0dIHDR' + b'\x00\x00\x00\x01' * 2
+           + b'\x08\x02\x00\x00\x00\x90\x77\x53\xde' + b'\x00\x00\x00\x00IEND\xaeB`\x82')
+    padding = ''.join(random.choices(string.ascii_letters, k=1000)).encode()
+    container = padding + png + padding
+    headers = {'X-Filename': 'container.bin', 'Content-Type': 'application/octet-stream'}
+    
+    response = requests.post(f"{API_URL}/carve-file/raw", data=container, headers=headers)
+    print(f"Status Code: {response.status_code}")
+    if response.status_code != 200:
+        print(f"❌ File carving failed: {response.text}")
+        return False
+    members = response.json()['embedded_files']
+    print(f"Embedded files: {[(m['offset'], m['extension'], m['size']) for m in members]}")
+    if not any(m['offset'] == len(padding) and m['size'] == len(png) for m in members):
+        print("❌ Embedded PNG not found")
+        return False
+    
+    response = requests.post(f"{API_URL}/carve-file/raw", params={'extract': len(padding)},
+                             data=container, headers=headers)
+    print(f"Status Code: {response.status_code}")
+    if response.status_code != 200 or response.content != png:
+        print(f"❌ Extracted member does not match the embedded PNG: {response.content[:64]}")
+        return False
+    disposition = response.headers.get('content-disposition', '')
+    if f'container-{len(padding):x}.png' not in disposition:
+        print(f"❌ Unexpected Content-Disposition: {disposition}")
+        return False
+    print(f"✅ Embedded PNG extracted ({disposition})")
+    
+    for offset, status in ((1, 404), (-1, 400)):
+        response = requests.post(f"{API_URL}/carve-file/raw", params={'extract': offset},
+                                 data=container, headers=headers)
+        print(f"Status Code: {response.status_code}")
+        if response.status_code != status:
+            print(f"❌ Extract offset {offset} did not return {status}: {response.text}")
+            return False
+    print("✅ Invalid extract offsets rejected")
+    return True
+
+def test_stego_analysis():
+    """Test LSB steganalysis of an image and the bit planes rendered for it"""
+    print("\n=== Testing Stego Analysis Endpoints ===")
+    
+    # A checkerboard hidden in the red least significant bits
+    width, height = 64, 32
+    hidden = [(x // 8 + y // 8) % 2 for y in range(height) for x in range(width)]
+    pixels = [((x * 4) & 0xfe | hidden[y * width + x], y * 8, random.randrange(256))
+              for y in range(height) for x in range(width)]
+    image = Image.new('RGB', (width, height))
+    image.putdata(pixels)
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG')
+    headers = {'X-Filename': 'hidden.png', 'Content-Type': 'application/octet-stream'}
+    
+    response = requests.post(f"{API_URL}/stego-analysis/raw", data=buffer.getvalue(), headers=headers)
+    print(f"Status Code: {response.status_code}")
+    if response.status_code != 200:
+        print(f"❌ Stego analysis failed: {response.text}")
+        return False
+    report = response.json()
+    print(f"Report: {report['width']}x{report['height']} {report['mode']}, "
+          f"channels {[channel['name'] for channel in report['channels']]}, "
+          f"estimated embedding rate {report['estimated_embedding_rate']}")
+    if (report['width'], report['height']) != (width, height) or len(report['planes']) != 24:
+        print(f"❌ Unexpected stego report: {report}")
+        return False
+    
+    response = requests.get(f"{API_URL}/stego-analysis/{report['sha256']}/planes/R0.png")
+    print(f"Status Code: {response.status_code}")
+    if response.status_code != 200 or response.headers.get('content-type') != 'image/png':
+        print(f"❌ Failed to get the R0 bit plane: {response.text}")
+        return False
+    plane = [1 if value else 0 for value in Image.open(io.BytesIO(response.content)).getdata()]
+    if plane != hidden:
+        print("❌ R0 bit plane does not show the hidden bits")
+        return False
+    print("✅ R0 bit plane shows the hidden bits")
+    
+    response = requests.get(f"{API_URL}/stego-analysis/{report['sha256']}/preview.png")
+    print(f"Status Code: {response.status_code}")
+    if response.status_code != 200:
+        print(f"❌ Failed to get the preview: {response.text}")
+        return False
+    
+    response = requests.post(f"{API_URL}/stego-analysis/raw", data=buffer.getvalue(), headers=headers)
+    if response.status_code != 200 or not response.json()['cached']:
+        print(f"❌ Second analysis of the same image was not cached: {response.text}")
+        return False
+    print("✅ Second analysis served from the cache")
+    
+    for url, status in ((f"{report['sha256']}/planes/R8.png", 400),
+                        (f"{report['sha256']}/planes/Z0.png", 404),
+                        (f"{'0' * 64}/preview.png", 404)):
+        response = requests.get(f"{API_URL}/stego-analysis/{url}")
+        print(f"Status Code: {response.status_code}")
+        if response.status_code != status:
+            print(f"❌ {url} did not return {status}: {response.text}")
+            return False
+    
+    response = requests.post(f"{API_URL}/stego-analysis/raw", data=b'not an image', headers=headers)
+    print(f"Status Code: {response.status_code}")
+    if response.status_code != 400:
+        print(f"❌ Non-image was not rejected: {response.text}")
+        return False
+    print("✅ Invalid planes and images rejected")
+    return True
+
+def test_detection_rules():
+    """Test the detection rule endpoints and rule matches of analyzed uploads"""
+    print("\n=== Testing Detection Rules Endpoints ===")
+    
+    response = requests.get(f"{API_URL}/rules")
+    print(f"Status Code: {response.status_code}")
+    if response.status_code != 200:
+        print(f"❌ Failed to list rules: {response.text}")
+        return False
+    library = response.json()
+    print(f"Rule library {library['digest'][:12]}: {[rule['name'] for rule in library['rules']]}")
+    
+    # Ad-hoc rules sent with the file
+    rules = 'rule Hex_Jump { strings: $a = { 4D 5A [2-4] 50 45 } condition: $a at 0 }'
+    files = {'file': ('sample.bin', b'MZ\x00\x00\x00PE\x00\x00')}
+    response = requests.post(f"{API_URL}/rules/scan", files=files, data={'rules': rules})
+    print(f"Status Code: {response.status_code}")
+    if response.status_code != 200 or [m['rule'] for m in response.json()['matches']] != ['Hex_Jump']:
+        print(f"❌ Ad-hoc rule scan failed: {response.text}")
+        return False
+    print("✅ Ad-hoc rules matched")
+    
+    response = requests.post(f"{API_URL}/rules/scan", files=files, data={'rules': 'rule Broken {'})
+    print(f"Status Code: {response.status_code}")
+    if response.status_code != 400:
+        print(f"❌ Invalid rules were not rejected: {response.text}")
+        return False
+    print("✅ Invalid rules rejected")
+    
+    # The library's EICAR rule matches an upload, and a lookup by hash returns
+    # the same matches while the library is unchanged
+    eicar = b'X5O!P%@AP[4\\PZX54(P^)7CC)7}$EICAR-STANDARD-ANTIVIRUS-TEST-FILE!$H+H*'
+    sample = eicar + f"{datetime.now().isoformat()}".encode()
+    response = requests.post(f"{API_URL}/analyze-file", files={'file': ('eicar.txt', sample)})
+    print(f"Status Code: {response.status_code}")
+    if response.status_code != 200:
+        print(f"❌ File analysis failed: {response.text}")
+        return False
+    result = response.json()
+    if 'EICAR_Test_File' not in [m['rule'] for m in (result['rule_matches'] or {}).get('matches', [])]:
+        print(f"❌ EICAR rule did not match: {result['rule_matches']}")
+        return False
+    print("✅ Library rules matched on upload")
+    
+    response = requests.post(f"{API_URL}/analyze-file/lookup",
+                             json={'sha256': result['sha256_hash'], 'filename': 'eicar.txt'})
+    print(f"Status Code: {response.status_code}")
+    if response.status_code != 200 or response.json()['rule_matches'] != result['rule_matches']:
+        print(f"❌ Lookup did not return the stored rule matches: {response.text}")
+        return False
+    print("✅ Lookup returned the stored rule matches")
+    return True
+
 def main():
     """Main test function"""
     print(f"Testing SectoolBox Backend API at: {API_URL}")
@@ -344,6 +585,21 @@ def main():
     # Test tool usage logging
     results["Tool Usage Logging"] = test_tool_usage()
     
+    # Test analysis lookup by hash
+    results["Analysis Lookup"] = test_analysis_lookup()
+    
+    # Test analysis stats
+    results["Analysis Stats"] = test_analysis_stats()
+    
+    # Test file carving
+    results["File Carving"] = test_file_carving()
+    
+    # Test stego analysis
+    results["Stego Analysis"] = test_stego_analysis()
+    
+    # Test detection rules
+    results["Detection Rules"] = test_detection_rules()
+    
     # Clean up the test file
     try:
         os.unlink(test_file)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+SectoolBox Analysis Cache Test Script
+Tests the two-tier report cache against an in-memory collection
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from cache import AnalysisCache
+
+
+class MemoryCollection:
+    """Just enough of a Motor collection for AnalysisCache"""
+
+    def __init__(self):
+        self.documents = []
+
+    async def create_index(self, keys, unique=False):
+        return "sha256_1_analyzer_version_1"
+
+    async def find_one(self, query):
+        for document in self.documents:
+            if all(document.get(key) == value for key, value in query.items()):
+                return document
+        return None
+
+    async def update_one(self, query, update, upsert=False):
+        if await self.find_one(query) is None and upsert:
+            self.documents.append({**query, **update["$setOnInsert"]})
+
+
+def test_memory_and_database_hits():
+    """Reports are served from memory first, then from the collection after eviction"""
+    print("\n=== Testing Cache Hits ===")
+
+    async def scenario():
+        collection = MemoryCollection()
+        cache = AnalysisCache(collection, "11", max_entries=1)
+        assert await cache.get("a" * 64) is None
+        await cache.put("a" * 64, {"entropy": 1.0})
+        assert await cache.get("a" * 64) == {"entropy": 1.0}
+        await cache.put("b" * 64, {"entropy": 2.0})  # Evicts the first report from memory
+        assert await cache.get("a" * 64) == {"entropy": 1.0}
+        return cache.stats()
+
+    stats = asyncio.run(scenario())
+    print(f"Stats: {stats}")
+    assert stats["misses"] == 1
+    assert stats["memory_hits"] == 1
+    assert stats["database_hits"] == 1
+    assert stats["entries"] == 1
+    print("✅ Memory and database hits counted")
+    return True
+
+
+def test_analyzer_version_isolation():
+    """A report stored under one analyzer version is a miss for another"""
+    print("\n=== Testing Analyzer Version Isolation ===")
+
+    async def scenario():
+        collection = MemoryCollection()
+        old = AnalysisCache(collection, "10")
+        await old.put("c" * 64, {"entropy": 3.0})
+
+        new = AnalysisCache(collection, "11")
+        missed = await new.get("c" * 64)
+        await new.put("c" * 64, {"entropy": 4.0})
+
+        restarted = AnalysisCache(collection, "11")
+        return missed, await restarted.get("c" * 64), await old.get("c" * 64), len(collection.documents)
+
+    missed, current, previous, stored = asyncio.run(scenario())
+    assert missed is None
+    assert current == {"entropy": 4.0}
+    assert previous == {"entropy": 3.0}
+    assert stored == 2
+    print("✅ Each analyzer version keeps its own reports")
+    return True
+
+
+def test_put_keeps_first_report():
+    """Storing the same content twice keeps the first database document"""
+    print("\n=== Testing Duplicate Stores ===")
+
+    async def scenario():
+        collection = MemoryCollection()
+        await AnalysisCache(collection, "11").put("d" * 64, {"entropy": 5.0})
+        await AnalysisCache(collection, "11").put("d" * 64, {"entropy": 6.0})
+        return collection.documents
+
+    documents = asyncio.run(scenario())
+    assert len(documents) == 1
+    assert documents[0]["report"] == {"entropy": 5.0}
+    print("✅ Duplicate stores are ignored")
+    return True
+
+
+def main():
+    """Main test function"""
+    print("Testing SectoolBox analysis cache")
+    print("=" * 80)
+
+    results = {}
+    results["Cache Hits"] = test_memory_and_database_hits()
+    results["Analyzer Version Isolation"] = test_analyzer_version_isolation()
+    results["Duplicate Stores"] = test_put_keeps_first_report()
+
+    print("\n" + "=" * 80)
+    print("TEST RESULTS SUMMARY")
+    print("=" * 80)
+
+    all_passed = True
+    for test_name, passed in results.items():
+        status = "✅ PASSED" if passed else "❌ FAILED"
+        print(f"{test_name}: {status}")
+        if not passed:
+            all_passed = False
+
+    print("\nOVERALL RESULT:", "✅ ALL TESTS PASSED" if all_passed else "❌ SOME TESTS FAILED")
+    print("=" * 80)
+
+    return 0 if all_passed else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+SectoolBox Entropy Test Script
+Tests the block entropy profile, its regions and the randomness tests directly, without a running server
+"""
+import math
+import os
+import random
+import sys
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+import numpy as np
+
+from entropy import (MONTE_CARLO_GROUP, EntropyProfile, RandomnessTests, block_histograms,
+                     byte_histogram, calculate_entropy, decode_profile, entropy_regions)
+
+BLOCK_SIZE = 1024
+
+
+def layered_data():
+    """Low, high and medium entropy blocks, in that order, with a partial block at the end"""
+    text = b'The quick brown fox jumps over the lazy dog. ' * 200
+    return b'\x00' * (4 * BLOCK_SIZE) + os.urandom(3 * BLOCK_SIZE) + text[:2 * BLOCK_SIZE + 100]
+
+
+def test_block_histograms():
+    """One bincount gives the histogram of every block, including a partial last block"""
+    print("\n=== Testing Block Histograms ===")
+    data = layered_data()
+    histograms = block_histograms(data, BLOCK_SIZE)
+    expected = [byte_histogram(data[start:start + BLOCK_SIZE]) for start in range(0, len(data), BLOCK_SIZE)]
+    print(f"Blocks: {len(histograms)}")
+    assert histograms.shape == (len(expected), 256)
+    assert all(np.array_equal(row, block) for row, block in zip(histograms, expected))
+    print("✅ Block histograms match per-block counts")
+    return True
+
+
+def test_profile_values():
+    """Profiles fed in chunks match the entropy of each block"""
+    print("\n=== Testing Entropy Profile ===")
+    data = layered_data()
+    expected = [calculate_entropy(data[start:start + BLOCK_SIZE]) for start in range(0, len(data), BLOCK_SIZE)]
+    for chunk_blocks in (1, 3, 100):
+        profile = EntropyProfile(BLOCK_SIZE)
+        chunk_size = chunk_blocks * BLOCK_SIZE
+        for offset in range(0, len(data), chunk_size):
+            profile.update(data[offset:offset + chunk_size])
+        values = decode_profile(profile.values.astype('<f2').tobytes())
+        assert len(values) == len(expected)
+        # float16 keeps about three significant digits
+        assert np.allclose(values, expected, atol=0.01), f"{chunk_blocks} blocks per chunk"
+    print(f"Profile: {values}")
+    print("✅ Profile values match block entropies")
+    return True
+
+
+def test_regions():
+    """Consecutive blocks of the same class form one region, clipped to the file size"""
+    print("\n=== Testing Entropy Regions ===")
+    data = layered_data()
+    profile = EntropyProfile(BLOCK_SIZE)
+    profile.update(data)
+    regions = entropy_regions(profile.values, BLOCK_SIZE, len(data))
+    print(f"Regions: {regions}")
+    assert [(region['start'], region['end'], region['class']) for region in regions] == [
+        (0, 4 * BLOCK_SIZE, 'low'),
+        (4 * BLOCK_SIZE, 7 * BLOCK_SIZE, 'high'),
+        (7 * BLOCK_SIZE, len(data), 'medium'),
+    ]
+    assert regions[0]['mean_entropy'] == 0.0
+    assert entropy_regions(profile.values, BLOCK_SIZE, len(data), max_regions=2) == regions[:2]
+    assert entropy_regions(EntropyProfile(BLOCK_SIZE).values, BLOCK_SIZE, 0) == []
+    print("✅ Regions classified")
+    return True
+
+
+def randomness(data, chunk_size=None):
+    tests = RandomnessTests()
+    chunk_size = chunk_size or len(data) or 1
+    for offset in range(0, len(data), chunk_size):
+        tests.update(data[offset:offset + chunk_size])
+    return tests.results(byte_histogram(data))
+
+
+def test_randomness_reference():
+    """Chi-square, mean, serial correlation and Monte Carlo pi match direct computations"""
+    print("\n=== Testing Randomness Tests ===")
+    data = random.Random(1).randbytes(100003)
+    results = randomness(data, 4096)
+    print(f"Results: { {key: value for key, value in results.items() if key != 'top_byte_pairs'} }")
+
+    values = np.frombuffer(data, dtype=np.uint8).astype(np.float64)
+    expected = len(data) / 256
+    chi_square = ((np.bincount(values.astype(np.intp), minlength=256) - expected) ** 2).sum() / expected
+    # ent's serial correlation pairs the last byte with the first
+    following = np.roll(values, -1)
+    correlation = (len(values) * (values * following).sum() - values.sum() ** 2) / (
+        len(values) * (values * values).sum() - values.sum() ** 2)
+    groups = values[:len(values) - len(values) % MONTE_CARLO_GROUP].reshape(-1, MONTE_CARLO_GROUP)
+    x = groups[:, 0] * 65536 + groups[:, 1] * 256 + groups[:, 2]
+    y = groups[:, 3] * 65536 + groups[:, 4] * 256 + groups[:, 5]
+    pi = 4 * np.count_nonzero(x * x + y * y <= (256 ** 3 - 1) ** 2) / len(groups)
+
+    assert results['total_bytes'] == len(data)
+    assert results['chi_square'] == round(chi_square, 2)
+    assert results['mean'] == round(values.mean(), 4)
+    assert math.isclose(results['serial_correlation'], correlation, rel_tol=1e-9, abs_tol=1e-12)
+    assert results['monte_carlo_pi'] == round(pi, 6)
+    assert randomness(data, 7) == results
+    print("✅ Randomness tests match direct computations")
+    return True
+
+
+def test_randomness_merge():
+    """Segments tested separately merge into the results of a single pass"""
+    print("\n=== Testing Randomness Merge ===")
+    data = random.Random(2).randbytes(50000) + b'\x00' * 5000
+    expected = randomness(data)
+    for bounds in ((0, 1001, 30007, len(data)), (0, 6, 12, 13, len(data))):
+        merged = RandomnessTests()
+        for start, end in zip(bounds, bounds[1:]):
+            segment = RandomnessTests(offset=start)
+            segment.update(data[start:end])
+            # Workers hand their accumulators back as plain data
+            merged.merge(RandomnessTests.from_state(segment.state()))
+        assert merged.results(byte_histogram(data)) == expected, f"segments {bounds}"
+    print("✅ Merged segments match a single pass")
+    return True
+
+
+def test_assessment():
+    """Random, compressed, structured and short data are told apart"""
+    print("\n=== Testing Randomness Assessment ===")
+    rng = random.Random(3)
+    words = [''.join(rng.choices('abcdefghijklmnopqrstuvwxyz', k=rng.randint(2, 9))) for _ in range(5000)]
+    text = ' '.join(rng.choice(words) for _ in range(100000)).encode()
+    samples = {
+        'random': rng.randbytes(1 << 18),
+        'compressed': zlib.compress(text, 9),
+        'structured': text,
+        'insufficient_data': rng.randbytes(1000),
+    }
+    for expected, data in samples.items():
+        assessment = randomness(data)['assessment']
+        print(f"{expected}: {assessment}")
+        assert assessment == expected
+    assert randomness(b'') == {'total_bytes': 0}
+    print("✅ Data assessed")
+    return True
+
+
+def main():
+    """Main test function"""
+    print("Testing SectoolBox entropy and randomness analysis")
+    print("=" * 80)
+
+    results = {}
+    results["Block Histograms"] = test_block_histograms()
+    results["Entropy Profile"] = test_profile_values()
+    results["Entropy Regions"] = test_regions()
+    results["Randomness Tests"] = test_randomness_reference()
+    results["Randomness Merge"] = test_randomness_merge()
+    results["Randomness Assessment"] = test_assessment()
+
+    print("\n" + "=" * 80)
+    print("TEST RESULTS SUMMARY")
+    print("=" * 80)
+
+    all_passed = True
+    for test_name, passed in results.items():
+        status = "✅ PASSED" if passed else "❌ FAILED"
+        print(f"{test_name}: {status}")
+        if not passed:
+            all_passed = False
+
+    print("\nOVERALL RESULT:", "✅ ALL TESTS PASSED" if all_passed else "❌ SOME TESTS FAILED")
+    print("=" * 80)
+
+    return 0 if all_passed else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
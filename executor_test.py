@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+SectoolBox Analysis Executor Test Script
+Tests the bounded worker pool and the 503 returned once its queue is full
+"""
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from fastapi import HTTPException
+
+import server
+from executor import AnalysisExecutor, AnalysisQueueFull, MAX_INLINE_ARG_BYTES
+
+
+async def saturate(executor, jobs, seconds):
+    """Start jobs sleeping in the workers and return their tasks once all are queued"""
+    tasks = [asyncio.create_task(executor.submit(time.sleep, seconds)) for _ in range(jobs)]
+    await asyncio.sleep(0)
+    return tasks
+
+
+def test_queue_full():
+    """Submissions beyond the workers and the wait queue are rejected at once"""
+    print("\n=== Testing Queue Saturation ===")
+
+    async def run():
+        executor = AnalysisExecutor(max_workers=1, max_queued=1)
+        try:
+            tasks = await saturate(executor, executor.capacity, 0.5)
+            assert executor.pending == executor.capacity
+            try:
+                await executor.submit(time.sleep, 0)
+                raise AssertionError("Submission to a full queue was accepted")
+            except AnalysisQueueFull as e:
+                print(f"Rejected: {e}")
+            await asyncio.gather(*tasks)
+            await executor.submit(time.sleep, 0)
+            return executor.stats()
+        finally:
+            executor.shutdown()
+
+    stats = asyncio.run(run())
+    print(f"Stats: {stats}")
+    assert stats["completed"] == 3 and stats["rejected"] == 1 and stats["pending"] == 0
+    print("✅ Full queue rejects jobs and recovers once they finish")
+    return True
+
+
+def test_inline_arguments():
+    """File contents must be passed to workers as a path, not as bytes"""
+    print("\n=== Testing Inline Argument Limit ===")
+    executor = AnalysisExecutor(max_workers=1, max_queued=0)
+    try:
+        asyncio.run(executor.submit(len, b'A' * (MAX_INLINE_ARG_BYTES + 1)))
+        raise AssertionError("Large inline argument was accepted")
+    except ValueError as e:
+        print(f"Rejected: {e}")
+    assert executor.stats()["rejected"] == 0 and executor.pending == 0
+    print("✅ Large inline arguments rejected")
+    return True
+
+
+def test_server_returns_503():
+    """The server maps a full analysis queue to 503, also for segmented analyses"""
+    print("\n=== Testing 503 on Full Queue ===")
+    default_executor = server.analysis_executor
+
+    async def run():
+        tasks = await saturate(server.analysis_executor, server.analysis_executor.capacity, 0.5)
+        try:
+            await server.run_analysis(time.sleep, 0)
+        except HTTPException as e:
+            status = e.status_code
+        else:
+            status = None
+        await asyncio.gather(*tasks)
+
+        # Segmented analyses are rejected up front if all their jobs do not fit
+        try:
+            await server.analyze_in_segments(Path(os.devnull), [(0, 1), (1, 2)], ())
+        except HTTPException as e:
+            segmented_status = e.status_code
+        else:
+            segmented_status = None
+        return status, segmented_status
+
+    server.analysis_executor = AnalysisExecutor(max_workers=1, max_queued=1)
+    try:
+        status, segmented_status = asyncio.run(run())
+    finally:
+        server.analysis_executor.shutdown()
+        server.analysis_executor = default_executor
+    print(f"Status Codes: {status}, {segmented_status}")
+    assert status == 503 and segmented_status == 503
+    print("✅ Full queue returns 503")
+    return True
+
+
+def main():
+    """Main test function"""
+    print("Testing SectoolBox analysis executor")
+    print("=" * 80)
+
+    results = {}
+    results["Queue Saturation"] = test_queue_full()
+    results["Inline Argument Limit"] = test_inline_arguments()
+    results["503 on Full Queue"] = test_server_returns_503()
+
+    print("\n" + "=" * 80)
+    print("TEST RESULTS SUMMARY")
+    print("=" * 80)
+
+    all_passed = True
+    for test_name, passed in results.items():
+        status = "✅ PASSED" if passed else "❌ FAILED"
+        print(f"{test_name}: {status}")
+        if not passed:
+            all_passed = False
+
+    print("\nOVERALL RESULT:", "✅ ALL TESTS PASSED" if all_passed else "❌ SOME TESTS FAILED")
+    print("=" * 80)
+
+    return 0 if all_passed else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
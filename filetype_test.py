@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+SectoolBox File Type Test Script
+Tests that FileTypeService's signature trie agrees with libmagic, without a running server
+"""
+import bz2
+import gzip
+import io
+import lzma
+import os
+import sqlite3
+import sys
+import tempfile
+import wave
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+import magic
+from PIL import Image
+
+from filetype import MAGIC_HEADER_SIZE, OFFSET_SIGNATURES, PREFIX_SIGNATURES, FileTypeService
+
+
+def image(image_format):
+    buffer = io.BytesIO()
+    Image.new('RGB', (16, 16), (200, 10, 10)).save(buffer, image_format)
+    return buffer.getvalue()
+
+
+def wav():
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as audio:
+        audio.setnchannels(1)
+        audio.setsampwidth(2)
+        audio.setframerate(8000)
+        audio.writeframes(b'\x00' * 1600)
+    return buffer.getvalue()
+
+
+def sqlite_database():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'sample.db')
+        connection = sqlite3.connect(path)
+        connection.execute('CREATE TABLE sample (value TEXT)')
+        connection.commit()
+        connection.close()
+        with open(path, 'rb') as f:
+            return f.read()
+
+
+def trie_samples():
+    """One realistic file per PREFIX_SIGNATURES entry"""
+    return {
+        'PNG': image('PNG'),
+        'JPEG': image('JPEG'),
+        'GIF89a': image('GIF'),
+        'GIF87a': b'GIF87a' + image('GIF')[6:],
+        'WebP': image('WEBP'),
+        'WAV': wav(),
+        'AVI': b'RIFF\x00\x01\x00\x00AVI LIST' + b'\x00' * 60,
+        'FLAC': b'fLaC\x00\x00\x00\x22' + b'\x00' * 60,
+        'PDF': b'%PDF-1.7\n1 0 obj\n<<>>\nendobj\n',
+        'gzip': gzip.compress(b'hello' * 100),
+        'bzip2': bz2.compress(b'hello' * 100),
+        'xz': lzma.compress(b'hello' * 100),
+        'zstd': bytes.fromhex('28b52ffd2005290000') + b'hello',
+        'LZ4': bytes.fromhex('04224d186440a705000080') + b'hello' + b'\x00' * 4,
+        '7z': b"7z\xbc\xaf'\x1c\x00\x04" + b'\x00' * 40,
+        'RAR': b'Rar!\x1a\x07\x01\x00' + b'\x00' * 60,
+        'SQLite': sqlite_database(),
+        'WebAssembly': b'\x00asm\x01\x00\x00\x00\x01\x04\x01\x60\x00\x00',
+    }
+
+
+def test_trie_matches_libmagic():
+    """Every format answered by the trie gets the MIME type libmagic gives it"""
+    print("\n=== Testing Trie/libmagic Agreement ===")
+    service = FileTypeService()
+    detected = set()
+    for name, data in trie_samples().items():
+        mime_type = service.mime_type(data)
+        expected = magic.from_buffer(data[:MAGIC_HEADER_SIZE], mime=True)
+        print(f"{name}: {mime_type} (libmagic: {expected})")
+        assert mime_type == expected, name
+        detected.add(mime_type)
+    assert detected == {mime_type for _, _, mime_type in PREFIX_SIGNATURES}
+    assert service.stats()["trie_hits"] == len(trie_samples()) and service.stats()["misses"] == 0
+    print("✅ Trie and libmagic agree on every signature")
+    return True
+
+
+def test_offset_signatures():
+    """Signatures past MAGIC_HEADER_SIZE agree with libmagic given the whole header"""
+    print("\n=== Testing Offset Signatures ===")
+    service = FileTypeService()
+    for offset, expected_bytes, mime_type in OFFSET_SIGNATURES:
+        # Volume descriptor type and version around the identifier
+        data = bytearray(offset + 2048)
+        data[offset - 1:offset + len(expected_bytes) + 1] = b'\x01' + expected_bytes + b'\x01'
+        data = bytes(data)
+        expected = magic.from_buffer(data, mime=True)
+        print(f"{mime_type} at {offset:#x}: libmagic {expected}")
+        assert service.mime_type(data) == mime_type == expected
+    print("✅ Offset signatures agree with libmagic")
+    return True
+
+
+def test_libmagic_fallback_cached():
+    """Headers the trie does not know go to libmagic once, then come from the cache"""
+    print("\n=== Testing libmagic Fallback ===")
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('readme.txt', 'hello')
+    samples = [b'plain text\n' * 10, buffer.getvalue(), b'\x7fELF\x02\x01\x01' + b'\x00' * 57]
+
+    service = FileTypeService(max_entries=2)
+    for data in samples + samples[-2:]:
+        mime_type = service.mime_type(data)
+        assert mime_type == magic.from_buffer(data[:MAGIC_HEADER_SIZE], mime=True)
+    stats = service.stats()
+    print(f"Stats: {stats}")
+    assert stats == {"entries": 2, "max_entries": 2, "trie_hits": 0, "cache_hits": 2, "misses": 3}
+    print("✅ libmagic verdicts cached")
+    return True
+
+
+def main():
+    """Main test function"""
+    print("Testing SectoolBox file type identification")
+    print("=" * 80)
+
+    results = {}
+    results["Trie/libmagic Agreement"] = test_trie_matches_libmagic()
+    results["Offset Signatures"] = test_offset_signatures()
+    results["libmagic Fallback"] = test_libmagic_fallback_cached()
+
+    print("\n" + "=" * 80)
+    print("TEST RESULTS SUMMARY")
+    print("=" * 80)
+
+    all_passed = True
+    for test_name, passed in results.items():
+        status = "✅ PASSED" if passed else "❌ FAILED"
+        print(f"{test_name}: {status}")
+        if not passed:
+            all_passed = False
+
+    print("\nOVERALL RESULT:", "✅ ALL TESTS PASSED" if all_passed else "❌ SOME TESTS FAILED")
+    print("=" * 80)
+
+    return 0 if all_passed else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
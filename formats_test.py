@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+SectoolBox Format Structure Test Script
+Tests PNG chunk walking, CRC checks and trailing data detection
+"""
+import io
+import os
+import struct
+import sys
+import tempfile
+import zipfile
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from PIL import Image
+
+import analysis
+from formats import validate_structure_bytes
+
+
+def make_png():
+    buffer = io.BytesIO()
+    Image.new('RGB', (16, 8), (200, 30, 30)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def png_chunk(kind, payload, crc=None):
+    """A PNG chunk with a correct CRC unless one is given"""
+    if crc is None:
+        crc = zlib.crc32(kind + payload)
+    return struct.pack('>I', len(payload)) + kind + payload + struct.pack('>I', crc)
+
+
+def with_chunk_after_ihdr(png, chunk):
+    """Insert a chunk right after IHDR (signature 8 bytes, IHDR chunk 25 bytes)"""
+    return png[:33] + chunk + png[33:]
+
+
+def test_valid_png():
+    """A clean PNG has every CRC correct and no issues"""
+    print("\n=== Testing Valid PNG ===")
+    png = make_png()
+    structure = validate_structure_bytes(png)
+    print(f"Issues: {structure['issues']}")
+    assert structure["format"] == 'png'
+    assert structure["valid"]
+    assert structure["image"] == {"width": 16, "height": 8, "bit_depth": 8, "color_type": 2}
+    assert [entry["type"] for entry in structure["entries"]][0] == 'IHDR'
+    assert structure["entries"][-1]["type"] == 'IEND'
+    assert all(entry["crc_ok"] for entry in structure["entries"])
+    assert structure["end"] == len(png)
+    assert structure["trailing_data"] is None
+    print("✅ Valid PNG has no issues")
+    return True
+
+
+def test_bad_crc():
+    """A chunk whose stored CRC does not match its data is flagged"""
+    print("\n=== Testing Bad CRC ===")
+    bad_crc = zlib.crc32(b'tEXtComment\x00hello') ^ 1
+    png = with_chunk_after_ihdr(make_png(), png_chunk(b'tEXt', b'Comment\x00hello', bad_crc))
+    structure = validate_structure_bytes(png)
+    print(f"Issues: {structure['issues']}")
+    text = [entry for entry in structure["entries"] if entry["type"] == 'tEXt']
+    assert text == [{"offset": 33, "type": 'tEXt', "length": 13, "crc_ok": False}]
+    assert "1 chunks with a bad CRC" in structure["issues"]
+    assert not structure["valid"]
+
+    assert validate_structure_bytes(with_chunk_after_ihdr(make_png(), png_chunk(b'tEXt', b'Comment\x00hello')))["valid"]
+    print("✅ Bad CRC detected")
+    return True
+
+
+def test_non_standard_chunk():
+    """Private chunks used to hide data are reported"""
+    print("\n=== Testing Non-Standard Chunk ===")
+    png = with_chunk_after_ihdr(make_png(), png_chunk(b'hiDe', b'flag{hidden}'))
+    structure = validate_structure_bytes(png)
+    print(f"Issues: {structure['issues']}")
+    assert structure["issues"] == ["Non-standard chunks: hiDe"]
+    print("✅ Non-standard chunk reported")
+    return True
+
+
+def test_trailing_data():
+    """Data after IEND is reported, zero padding is not an issue"""
+    print("\n=== Testing Trailing Data ===")
+    png = make_png()
+    structure = validate_structure_bytes(png + b'secret appended payload')
+    print(f"Trailing: {structure['trailing_data']}")
+    assert structure["end"] == len(png)
+    assert structure["trailing_data"]["offset"] == len(png)
+    assert structure["trailing_data"]["size"] == 23
+    assert not structure["trailing_data"]["padding"]
+    assert "23 bytes after the end of the PNG data" in structure["issues"]
+
+    padded = validate_structure_bytes(png + b'\x00' * 64)
+    assert padded["trailing_data"]["padding"]
+    assert padded["valid"]
+    print("✅ Trailing data detected")
+    return True
+
+
+def test_appended_zip():
+    """A ZIP appended after IEND makes the file a polyglot"""
+    print("\n=== Testing Appended ZIP ===")
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('flag.txt', 'secret')
+    structure = validate_structure_bytes(make_png() + buffer.getvalue())
+    print(f"Issues: {structure['issues']}")
+    assert "ZIP archive" in structure["polyglot"]
+    assert not structure["valid"]
+    print("✅ Appended ZIP detected")
+    return True
+
+
+def test_truncated_png():
+    """A chunk running past the end of the file is reported as truncated"""
+    print("\n=== Testing Truncated PNG ===")
+    png = make_png()
+    truncated = png[:-20]  # Cuts into IDAT, just before the 12-byte IEND chunk
+    structure = validate_structure_bytes(truncated)
+    print(f"Issues: {structure['issues']}")
+    assert structure["issues"] == ["Truncated IDAT chunk at offset 33"]
+    assert structure["end"] == len(truncated)
+    assert structure["trailing_data"] is None
+    print("✅ Truncated chunk reported")
+    return True
+
+
+def test_pdf_long_startxref():
+    """A startxref with thousands of digits is reported, not converted whole"""
+    print("\n=== Testing Long startxref ===")
+    pdf = b'%PDF-1.7\n1 0 obj\n<< >>\nendobj\nstartxref\n' + b'9' * 5000 + b'\n%%EOF\n'
+    structure = validate_structure_bytes(pdf)
+    print(f"Issues: {structure['issues']}")
+    assert structure["format"] == 'pdf'
+    assert not structure["valid"]
+    print("✅ Long startxref handled")
+    return True
+
+
+def test_parser_error_recorded():
+    """A failing structure parser is recorded in the report instead of failing the analysis"""
+    print("\n=== Testing Parser Error ===")
+    def broken(path):
+        raise ValueError("unexpected structure")
+    with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as f:
+        f.write(make_png())
+    original = analysis.validate_structure
+    analysis.validate_structure = broken
+    try:
+        report = analysis.analyze_path(f.name)
+    finally:
+        analysis.validate_structure = original
+        os.unlink(f.name)
+    print(f"Structure: {report['structure']}")
+    assert report["structure"]["valid"] is False
+    assert report["structure"]["error"] == "Structure parsing failed: unexpected structure"
+    assert report["image_metadata"]["format"] == 'png'
+    print("✅ Parser error recorded")
+    return True
+
+
+def main():
+    """Main test function"""
+    print("Testing SectoolBox format structure validation")
+    print("=" * 80)
+
+    results = {}
+    results["Valid PNG"] = test_valid_png()
+    results["Bad CRC"] = test_bad_crc()
+    results["Non-Standard Chunk"] = test_non_standard_chunk()
+    results["Trailing Data"] = test_trailing_data()
+    results["Appended ZIP"] = test_appended_zip()
+    results["Truncated PNG"] = test_truncated_png()
+    results["Long startxref"] = test_pdf_long_startxref()
+    results["Parser Error"] = test_parser_error_recorded()
+
+    print("\n" + "=" * 80)
+    print("TEST RESULTS SUMMARY")
+    print("=" * 80)
+
+    all_passed = True
+    for test_name, passed in results.items():
+        status = "✅ PASSED" if passed else "❌ FAILED"
+        print(f"{test_name}: {status}")
+        if not passed:
+            all_passed = False
+
+    print("\nOVERALL RESULT:", "✅ ALL TESTS PASSED" if all_passed else "❌ SOME TESTS FAILED")
+    print("=" * 80)
+
+    return 0 if all_passed else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -15,9 +15,13 @@ import {
   X,
   HelpCircle,
   Shield,
-  AlertTriangle
+  AlertTriangle,
+  Layers,
+  ChevronLeft,
+  ChevronRight
 } from 'lucide-react';
 import toast from 'react-hot-toast';
+import axios from 'axios';
 import { 
   validateFile, 
   sanitizeTextInput, 
@@ -27,6 +31,9 @@ import {
   SECURITY_CONFIG 
 } from '../utils/security';
 
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+const API = `${BACKEND_URL}/api`;
+
 // Custom search icon without the specified paths
 const CustomSearchIcon = ({ size = 20, className = "" }) => (
   <svg 
@@ -77,6 +84,7 @@ const FileAnalysisPage = () => {
   const [lengthFilter, setLengthFilter] = useState({ min: '', max: '' });
   const [isSearching, setIsSearching] = useState(false);
   const [securityAnalysis, setSecurityAnalysis] = useState(null);
+  const [stegoAnalysis, setStegoAnalysis] = useState(null);
 
   // Debounced search values to prevent oversearching
   const debouncedSearchTerm = useDebounce(sanitizeTextInput(searchTerm, 100), 300);
@@ -130,6 +138,7 @@ const FileAnalysisPage = () => {
     }
 
     setFile(uploadedFile);
+    setStegoAnalysis(null);
     setIsUploading(true);
     setIsAnalyzing(true);
 
@@ -175,6 +184,20 @@ const FileAnalysisPage = () => {
           console.warn('EXIF extraction failed:', error);
           logSecurityEvent('EXIF_EXTRACTION_FAILED', { error: error.message });
         }
+
+        // Steganalysis needs the decoded pixels, so it runs on the backend
+        try {
+          const response = await axios.post(`${API}/stego-analysis/raw`, uploadedFile, {
+            headers: {
+              'Content-Type': 'application/octet-stream',
+              'X-Filename': encodeURIComponent(uploadedFile.name)
+            }
+          });
+          setStegoAnalysis(response.data);
+        } catch (error) {
+          console.warn('Steganalysis failed:', error);
+          logSecurityEvent('STEGO_ANALYSIS_FAILED', { error: error.message });
+        }
       }
 
       // Log successful analysis
@@ -491,7 +514,6 @@ const FileAnalysisPage = () => {
           'Aspect Ratio': calculateAspectRatio(uint8Array),
           'Bit Rate': `${(file.size * 8 / 1024).toFixed(2)} kbps`,
           'Entropy Level': calculateImageEntropy(uint8Array).toFixed(4),
-          'Steganography Risk': assessSteganographyRisk(uint8Array),
           'File Integrity': 'Valid'
         };
 
@@ -618,28 +640,6 @@ const FileAnalysisPage = () => {
     return entropy;
   };
 
-  const assessSteganographyRisk = (data) => {
-    const entropy = calculateImageEntropy(data);
-    const lsb_analysis = analyzeLSB(data);
-    
-    if (entropy > 7.8 && lsb_analysis > 0.5) return 'High (Suspicious patterns detected)';
-    if (entropy > 7.5) return 'Medium (High randomness)';
-    if (entropy > 6.5) return 'Low (Normal randomness)';
-    return 'Very Low (Low randomness)';
-  };
-
-  const analyzeLSB = (data) => {
-    // Analyze least significant bits for potential steganography
-    let lsbCount = 0;
-    const sampleSize = Math.min(1000, data.length);
-    
-    for (let i = 0; i < sampleSize; i++) {
-      if (data[i] & 1) lsbCount++; // Count LSB = 1
-    }
-    
-    return lsbCount / sampleSize; // Return ratio of set LSBs
-  };
-
   return (
     <div className="min-h-screen bg-gradient-to-br from-slate-950 via-blue-950 to-gray-950 px-4 sm:px-6 lg:px-8 py-8">
       <div className="max-w-7xl mx-auto">
@@ -664,7 +664,7 @@ const FileAnalysisPage = () => {
                   <span className="text-sm font-medium text-blue-300">Security Features</span>
                 </div>
                 <ul className="text-xs text-blue-200 space-y-1">
-                  <li>• Client-side processing only - no data transmitted</li>
+                  <li>• Client-side processing - only images are sent, for bit-plane analysis</li>
                   <li>• File type and size validation</li>
                   <li>• Content security analysis</li>
                   <li>• Maximum file size: {Math.round(SECURITY_CONFIG.MAX_FILE_SIZE / 1024 / 1024)}MB</li>
@@ -712,6 +712,7 @@ const FileAnalysisPage = () => {
                     setHashResults(null);
                     setExifData(null);
                     setEntropy(null);
+                    setStegoAnalysis(null);
                     setActiveTab('overview');
                     setSearchTerm('');
                     setLengthFilter({ min: '', max: '' });
@@ -751,7 +752,8 @@ const FileAnalysisPage = () => {
                   { id: 'strings', name: 'Strings', icon: FileText, count: extractedStrings.length },
                   { id: 'hex', name: 'Hex Dump', icon: Eye },
                   { id: 'hashes', name: 'Hashes', icon: Hash },
-                  { id: 'metadata', name: 'Metadata', icon: HelpCircle }
+                  { id: 'metadata', name: 'Metadata', icon: HelpCircle },
+                  ...(stegoAnalysis ? [{ id: 'stego', name: 'Bit Planes', icon: Layers }] : [])
                 ].map((tab) => {
                   const IconComponent = tab.icon;
                   return (
@@ -827,6 +829,10 @@ const FileAnalysisPage = () => {
                   onCopy={copyToClipboard}
                 />
               )}
+
+              {activeTab === 'stego' && stegoAnalysis && (
+                <StegoTab analysis={stegoAnalysis} />
+              )}
             </div>
           </div>
         )}
@@ -1188,6 +1194,125 @@ const HashesTab = ({ hashes, onCopy }) => (
   </div>
 );
 
+// Bit Planes Tab Component - steganalysis computed by the backend over every pixel
+const StegoTab = ({ analysis }) => {
+  const [planeIndex, setPlaneIndex] = useState(0);
+  const planes = analysis.planes;
+  const planeUrl = (index) => `${API}/stego-analysis/${analysis.sha256}/planes/${planes[index]}`;
+  const channel = analysis.channels[Math.floor(planeIndex / 8)];
+  const bit = planeIndex % 8;
+  const planeStats = channel.bit_planes[bit];
+
+  // Fetch the neighbouring planes ahead of time so paging is instant
+  useEffect(() => {
+    [planeIndex - 1, planeIndex + 1].forEach((index) => {
+      if (index >= 0 && index < planes.length) {
+        const preload = new window.Image();
+        preload.src = planeUrl(index);
+      }
+    });
+  }, [planeIndex]); // eslint-disable-line react-hooks/exhaustive-deps
+
+  const formatRate = (value) => (value === null || value === undefined ? 'N/A' : `${(value * 100).toFixed(1)}%`);
+
+  return (
+    <div className="tool-card">
+      <h3 className="heading-md mb-6 flex items-center">
+        <Layers size={20} className="mr-2 text-purple-400" />
+        Bit Plane Analysis
+      </h3>
+
+      <div className={`p-4 rounded-lg border mb-6 ${
+        analysis.suspicious
+          ? 'bg-red-900/20 border-red-500/30 text-red-300'
+          : 'bg-green-900/20 border-green-500/30 text-green-300'
+      }`}>
+        <div className="flex items-center space-x-2">
+          {analysis.suspicious ? <AlertTriangle size={16} /> : <CheckCircle size={16} />}
+          <span className="font-medium">
+            {analysis.suspicious ? 'LSB embedding suspected' : 'No sign of LSB embedding'}
+          </span>
+        </div>
+        <p className="text-sm mt-1 opacity-80">
+          Estimated embedding rate: {formatRate(analysis.estimated_embedding_rate)} •{' '}
+          {analysis.width}×{analysis.height} {analysis.format} ({analysis.mode})
+          {analysis.scale > 1 && ` • analyzed at 1/${analysis.scale} scale`}
+        </p>
+      </div>
+
+      <div className="overflow-x-auto mb-6">
+        <table className="w-full text-sm text-left text-gray-300">
+          <thead className="text-xs text-gray-400 uppercase">
+            <tr>
+              <th className="py-2 pr-4">Channel</th>
+              <th className="py-2 pr-4">RS Rate</th>
+              <th className="py-2 pr-4">Chi-Square</th>
+              <th className="py-2 pr-4">LSB Ones</th>
+              <th className="py-2 pr-4">LSB Neighbour Agreement</th>
+            </tr>
+          </thead>
+          <tbody>
+            {analysis.channels.map((item) => (
+              <tr key={item.name} className={`border-t border-gray-700 ${item.suspicious ? 'text-red-300' : ''}`}>
+                <td className="py-2 pr-4 font-mono">{item.name}</td>
+                <td className="py-2 pr-4">{formatRate(item.rs_embedding_rate)}</td>
+                <td className="py-2 pr-4">{formatRate(item.chi_square.probability)}</td>
+                <td className="py-2 pr-4">{formatRate(item.bit_planes[0].ones_ratio)}</td>
+                <td className="py-2 pr-4">{formatRate(item.bit_planes[0].neighbour_agreement)}</td>
+              </tr>
+            ))}
+          </tbody>
+        </table>
+      </div>
+
+      <div className="flex items-center justify-between mb-4">
+        <button
+          onClick={() => setPlaneIndex(planeIndex - 1)}
+          disabled={planeIndex === 0}
+          className="p-2 text-gray-400 hover:text-gray-200 disabled:opacity-30 transition-colors"
+        >
+          <ChevronLeft size={20} />
+        </button>
+        <div className="text-center text-sm text-gray-300">
+          <span className="font-mono">Channel {channel.name} • Bit {bit}</span>
+          <span className="block text-xs text-gray-500">
+            Ones {formatRate(planeStats.ones_ratio)} • Neighbour agreement {formatRate(planeStats.neighbour_agreement)}
+          </span>
+        </div>
+        <button
+          onClick={() => setPlaneIndex(planeIndex + 1)}
+          disabled={planeIndex === planes.length - 1}
+          className="p-2 text-gray-400 hover:text-gray-200 disabled:opacity-30 transition-colors"
+        >
+          <ChevronRight size={20} />
+        </button>
+      </div>
+
+      <div className="grid grid-cols-1 md:grid-cols-2 gap-4">
+        <div>
+          <p className="text-xs text-gray-500 mb-2">Original</p>
+          <img
+            src={`${API}/stego-analysis/${analysis.sha256}/preview.png`}
+            alt="Preview"
+            className="w-full bg-gray-900 border border-gray-700 rounded"
+          />
+        </div>
+        <div>
+          <p className="text-xs text-gray-500 mb-2">
+            Bit plane{analysis.plane_step > 1 && ` (every ${analysis.plane_step}th pixel)`}
+          </p>
+          <img
+            src={planeUrl(planeIndex)}
+            alt={`Bit ${bit} of channel ${channel.name}`}
+            className="w-full bg-gray-900 border border-gray-700 rounded"
+            style={{ imageRendering: 'pixelated' }}
+          />
+        </div>
+      </div>
+    </div>
+  );
+};
+
 // Enhanced Metadata Tab Component with advanced analysis
 const MetadataTab = ({ metadata, exifData, entropy, onCopy }) => {
   
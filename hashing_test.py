@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+SectoolBox Hashing Test Script
+Tests the threaded multi-digest hasher directly, without a running server
+"""
+import hashlib
+import os
+import sys
+import tempfile
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from hashing import (PARALLEL_MIN_CHUNK, SUPPORTED_DIGESTS, MultiHasher, hash_bytes, hash_file,
+                     normalize_digests)
+
+
+def reference(data):
+    """Every supported digest of data, computed one at a time"""
+    digests = {name: hashlib.new(name, data).hexdigest() for name in SUPPORTED_DIGESTS if name != 'crc32'}
+    digests['crc32'] = f"{zlib.crc32(data):08x}"
+    return digests
+
+
+def test_digests_match_hashlib():
+    """Inline and threaded hashing give the same digests as hashlib and zlib"""
+    print("\n=== Testing Digests ===")
+    for size in (0, 100, PARALLEL_MIN_CHUNK, 3 * PARALLEL_MIN_CHUNK + 7):
+        data = os.urandom(size)
+        assert hash_bytes(data, SUPPORTED_DIGESTS) == reference(data), f"{size} bytes"
+    print(f"✅ {len(SUPPORTED_DIGESTS)} digests match for inline and threaded chunks")
+    return True
+
+
+def test_chunked_updates():
+    """Feeding chunks of any size gives the digests of the whole stream"""
+    print("\n=== Testing Chunked Hashing ===")
+    data = os.urandom(5 * PARALLEL_MIN_CHUNK + 123)
+    expected = reference(data)
+    for chunk_size in (1000, PARALLEL_MIN_CHUNK, 2 * PARALLEL_MIN_CHUNK + 1):
+        hasher = MultiHasher(SUPPORTED_DIGESTS)
+        for offset in range(0, len(data), chunk_size):
+            hasher.update(data[offset:offset + chunk_size])
+        assert hasher.hexdigests() == expected, f"chunk size {chunk_size}"
+
+    with tempfile.NamedTemporaryFile(delete=False) as f:
+        f.write(data)
+    try:
+        assert hash_file(f.name, ('sha256', 'md5'), chunk_size=PARALLEL_MIN_CHUNK) == {
+            'sha256': expected['sha256'], 'md5': expected['md5']}
+    finally:
+        os.unlink(f.name)
+    print("✅ Chunked and file hashing match")
+    return True
+
+
+def test_digest_names():
+    """Digest names are normalized and deduplicated; unknown names are rejected"""
+    print("\n=== Testing Digest Names ===")
+    names = normalize_digests(['SHA256', ' sha3-256', 'md5', 'sha256', 'CRC32'])
+    print(f"Normalized: {names}")
+    assert names == ('sha256', 'sha3_256', 'md5', 'crc32')
+    assert MultiHasher(names).digests == names
+    try:
+        normalize_digests(['sha256', 'whirlpool'])
+        raise AssertionError("Unsupported digest accepted")
+    except ValueError as e:
+        print(f"Rejected: {e}")
+    print("✅ Digest names handled")
+    return True
+
+
+def main():
+    """Main test function"""
+    print("Testing SectoolBox hashing")
+    print("=" * 80)
+
+    results = {}
+    results["Digests"] = test_digests_match_hashlib()
+    results["Chunked Hashing"] = test_chunked_updates()
+    results["Digest Names"] = test_digest_names()
+
+    print("\n" + "=" * 80)
+    print("TEST RESULTS SUMMARY")
+    print("=" * 80)
+
+    all_passed = True
+    for test_name, passed in results.items():
+        status = "✅ PASSED" if passed else "❌ FAILED"
+        print(f"{test_name}: {status}")
+        if not passed:
+            all_passed = False
+
+    print("\nOVERALL RESULT:", "✅ ALL TESTS PASSED" if all_passed else "❌ SOME TESTS FAILED")
+    print("=" * 80)
+
+    return 0 if all_passed else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
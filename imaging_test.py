@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+SectoolBox Image Decoding Test Script
+Tests that images are only decoded within the pixel budget, without a running server
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from PIL import Image
+
+from imaging import ImageBudgetExceeded, decode_preview, open_bounded, pixel_array
+from security import SecurityConfig
+
+
+def image_file(image_format, size, mode='RGB'):
+    """Path of a temporary image with a gradient, so JPEG drafting has detail to drop"""
+    image = Image.linear_gradient('L').resize(size).convert(mode)
+    with tempfile.NamedTemporaryFile(suffix='.' + image_format.lower(), delete=False) as f:
+        image.save(f, image_format)
+    return f.name
+
+
+def refused(path, **kwargs):
+    try:
+        open_bounded(path, **kwargs)[0].close()
+    except ImageBudgetExceeded as e:
+        print(f"Refused: {e}")
+        return True
+    return False
+
+
+def test_within_budget():
+    """Images within the budget decode at full size"""
+    print("\n=== Testing Image Within Budget ===")
+    path = image_file('PNG', (64, 48))
+    try:
+        image, scale, declared = open_bounded(path, max_pixels=64 * 48)
+        with image:
+            pixels, bands = pixel_array(image)
+    finally:
+        os.unlink(path)
+    print(f"Scale {scale}, declared {declared}, decoded {pixels.shape}")
+    assert scale == 1 and declared == (64, 48)
+    assert pixels.shape == (48, 64, 3) and bands == ['R', 'G', 'B']
+    print("✅ Image decoded at full size")
+    return True
+
+
+def test_lossless_over_budget():
+    """Formats that only decode at full size are refused before decoding"""
+    print("\n=== Testing Lossless Image Over Budget ===")
+    path = image_file('PNG', (64, 48))
+    try:
+        assert refused(path, max_pixels=64 * 48 - 1)
+    finally:
+        os.unlink(path)
+    print("✅ Oversized PNG refused")
+    return True
+
+
+def test_jpeg_drafted():
+    """JPEGs over the budget decode at the smallest DCT scale that fits"""
+    print("\n=== Testing JPEG Draft Scale ===")
+    path = image_file('JPEG', (400, 300))
+    try:
+        for max_pixels, expected_scale in ((400 * 300, 1), (200 * 150, 2), (100 * 75, 4), (50 * 38, 8)):
+            image, scale, declared = open_bounded(path, max_pixels=max_pixels)
+            with image:
+                pixels, _ = pixel_array(image)
+            print(f"Budget {max_pixels}: scale {scale}, decoded {pixels.shape[1]}x{pixels.shape[0]}")
+            assert scale == expected_scale and declared == (400, 300)
+            assert pixels.shape[0] * pixels.shape[1] <= max_pixels
+        assert refused(path, max_pixels=49 * 37)
+    finally:
+        os.unlink(path)
+    print("✅ JPEGs drafted to fit the budget")
+    return True
+
+
+def test_declared_dimensions_limit():
+    """Headers declaring more than MAX_IMAGE_PIXELS are refused, also for previews"""
+    print("\n=== Testing Declared Dimensions Limit ===")
+    path = image_file('JPEG', (400, 300))
+    max_image_pixels = SecurityConfig.MAX_IMAGE_PIXELS
+    try:
+        SecurityConfig.MAX_IMAGE_PIXELS = 400 * 300 - 1
+        assert refused(path)
+        try:
+            decode_preview(path)
+            raise AssertionError("Preview of an oversized image was decoded")
+        except ImageBudgetExceeded as e:
+            print(f"Preview refused: {e}")
+    finally:
+        SecurityConfig.MAX_IMAGE_PIXELS = max_image_pixels
+        os.unlink(path)
+    print("✅ Oversized declared dimensions refused")
+    return True
+
+
+def test_preview_size():
+    """Previews fit in IMAGE_PREVIEW_SIZE on their longest side"""
+    print("\n=== Testing Preview Size ===")
+    for image_format, mode in (('JPEG', 'RGB'), ('PNG', 'RGBA'), ('TIFF', 'CMYK')):
+        path = image_file(image_format, (400, 300), mode)
+        try:
+            with decode_preview(path, size=100) as preview:
+                print(f"{image_format} {mode}: {preview.size} {preview.mode}")
+                assert max(preview.size) <= 100
+                assert preview.mode in ('RGB', 'RGBA')
+        finally:
+            os.unlink(path)
+    print("✅ Previews downscaled")
+    return True
+
+
+def main():
+    """Main test function"""
+    print("Testing SectoolBox image decoding")
+    print("=" * 80)
+
+    results = {}
+    results["Image Within Budget"] = test_within_budget()
+    results["Lossless Image Over Budget"] = test_lossless_over_budget()
+    results["JPEG Draft Scale"] = test_jpeg_drafted()
+    results["Declared Dimensions Limit"] = test_declared_dimensions_limit()
+    results["Preview Size"] = test_preview_size()
+
+    print("\n" + "=" * 80)
+    print("TEST RESULTS SUMMARY")
+    print("=" * 80)
+
+    all_passed = True
+    for test_name, passed in results.items():
+        status = "✅ PASSED" if passed else "❌ FAILED"
+        print(f"{test_name}: {status}")
+        if not passed:
+            all_passed = False
+
+    print("\nOVERALL RESULT:", "✅ ALL TESTS PASSED" if all_passed else "❌ SOME TESTS FAILED")
+    print("=" * 80)
+
+    return 0 if all_passed else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
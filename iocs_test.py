@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+SectoolBox IOC Extraction Test Script
+Tests typed indicator extraction, validation and chunked scanning
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from iocs import IOCScanner, extract_iocs, luhn_valid
+
+SAMPLES = {
+    'url': 'https://evil.example.com/payload.php?id=1',
+    'registry_key': 'HKEY_LOCAL_MACHINE\\Software\\Microsoft\\Windows\\CurrentVersion\\Run',
+    'unix_path': '/etc/cron.d/backdoor',
+    'ipv4': '192.168.10.254',
+    'credit_card': '4111 1111 1111 1111',
+    'email': 'attacker@mail.example.org',
+    'windows_path': 'C:\\Users\\Public\\svchost.exe',
+    'base64': 'ZmxhZ3t0aGlzX2lzX2FfZmxhZ30=',
+}
+
+
+def found(data):
+    return {(indicator['type'], indicator['value']) for indicator in extract_iocs(data)['indicators']}
+
+
+def test_each_type():
+    """One sample of every indicator type is found, typed and located"""
+    print("\n=== Testing Indicator Types ===")
+    for kind, value in SAMPLES.items():
+        prefix = b'junk\x00 '
+        result = extract_iocs(prefix + value.encode() + b' \x00tail')
+        print(f"{kind}: {result['indicators']}")
+        assert result['counts'] == {kind: 1}, kind
+        assert result['indicators'] == [
+            {'type': kind, 'value': value, 'count': 1, 'offsets': [len(prefix)]}
+        ], kind
+    print(f"✅ All {len(SAMPLES)} indicator types found")
+    return True
+
+
+def test_luhn_rejection():
+    """Card-like numbers failing the Luhn checksum are not reported"""
+    print("\n=== Testing Luhn Rejection ===")
+    assert luhn_valid('4111111111111111')
+    assert not luhn_valid('4111111111111112')
+    assert found(b'card 4111-1111-1111-1111 ') == {('credit_card', '4111-1111-1111-1111')}
+    assert found(b'card 4111-1111-1111-1112 ') == set()
+    print("✅ Luhn check applied")
+    return True
+
+
+def test_ipv4_octet_rejection():
+    """Dotted quads with an octet above 255 are not IPv4 addresses"""
+    print("\n=== Testing IPv4 Octet Rejection ===")
+    assert found(b'host 10.0.0.255 ') == {('ipv4', '10.0.0.255')}
+    assert found(b'host 10.0.0.256 ') == set()
+    assert found(b'host 300.1.2.3 ') == set()
+    assert found(b'version 1.2.3.4.5 ') == set()
+    print("✅ Invalid octets rejected")
+    return True
+
+
+def test_url_keeps_host():
+    """A URL is reported whole, not as the e-mail or path inside it"""
+    print("\n=== Testing URL Priority ===")
+    assert found(b'see ftp://user@files.example.net/pub/file.txt now') == {
+        ('url', 'ftp://user@files.example.net/pub/file.txt')
+    }
+    print("✅ URL reported whole")
+    return True
+
+
+def test_chunked_scan_matches_single_pass():
+    """Feeding data in small chunks finds the same indicators with the same offsets"""
+    print("\n=== Testing Chunked Scanning ===")
+    data = b'\x00'.join(value.encode() for value in SAMPLES.values()) * 20
+    expected = extract_iocs(data)
+    for chunk_size in (1, 7, 100, 4096):
+        scanner = IOCScanner()
+        for offset in range(0, len(data), chunk_size):
+            scanner.feed(data[offset:offset + chunk_size])
+        assert scanner.finish() == expected, f"chunk size {chunk_size}"
+    assert expected['counts'] == {kind: 20 for kind in SAMPLES}
+    print(f"✅ {sum(expected['counts'].values())} indicators found identically for every chunk size")
+    return True
+
+
+def main():
+    """Main test function"""
+    print("Testing SectoolBox IOC extraction")
+    print("=" * 80)
+
+    results = {}
+    results["Indicator Types"] = test_each_type()
+    results["Luhn Rejection"] = test_luhn_rejection()
+    results["IPv4 Octet Rejection"] = test_ipv4_octet_rejection()
+    results["URL Priority"] = test_url_keeps_host()
+    results["Chunked Scanning"] = test_chunked_scan_matches_single_pass()
+
+    print("\n" + "=" * 80)
+    print("TEST RESULTS SUMMARY")
+    print("=" * 80)
+
+    all_passed = True
+    for test_name, passed in results.items():
+        status = "✅ PASSED" if passed else "❌ FAILED"
+        print(f"{test_name}: {status}")
+        if not passed:
+            all_passed = False
+
+    print("\nOVERALL RESULT:", "✅ ALL TESTS PASSED" if all_passed else "❌ SOME TESTS FAILED")
+    print("=" * 80)
+
+    return 0 if all_passed else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+SectoolBox Image Metadata Test Script
+Tests EXIF IFD parsing, including damaged and truncated IFD offsets
+"""
+import io
+import os
+import struct
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from PIL import Image
+from PIL.TiffImagePlugin import IFDRational
+
+from metadata import exif_summary, read_metadata_bytes
+
+MAKE = b'Canon\x00'
+
+
+def tiff(entries, next_ifd=0, tail=b''):
+    """Little-endian TIFF with IFD0 at offset 8 followed by tail.
+
+    Entries are (tag, type, count, value) with value the 4 raw bytes of the
+    entry's value field; tail starts at offset tail_offset(len(entries)).
+    """
+    data = struct.pack('<2sHI', b'II', 42, 8) + struct.pack('<H', len(entries))
+    for tag, field_type, count, value in entries:
+        data += struct.pack('<HHI', tag, field_type, count) + value
+    return data + struct.pack('<I', next_ifd) + tail
+
+
+def tail_offset(entry_count):
+    return 8 + 2 + entry_count * 12 + 4
+
+
+def offset(value):
+    return struct.pack('<I', value)
+
+
+def test_exif_ifds():
+    """IFD0, EXIF and GPS IFDs written by PIL are read with GPS in decimal degrees"""
+    print("\n=== Testing EXIF IFDs ===")
+    exif = Image.Exif()
+    exif[0x010F] = 'Canon'
+    exif[0x0132] = '2024:01:02 03:04:05'
+    exif.get_ifd(0x8769)[0x829A] = IFDRational(1, 250)
+    gps = exif.get_ifd(0x8825)
+    gps.update({1: 'N', 2: (48.0, 51.0, 29.6), 3: 'W', 4: (2.0, 17.0, 40.2)})
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8)).save(buffer, 'JPEG', exif=exif)
+    metadata = read_metadata_bytes(buffer.getvalue())
+    print(f"Metadata: {metadata}")
+    assert metadata["format"] == 'jpeg'
+    assert metadata["exif"]["IFD0"]["Make"] == 'Canon'
+    assert metadata["exif"]["Exif"]["ExposureTime"] == 0.004
+    assert round(metadata["gps"]["latitude"], 6) == 48.858222
+    assert metadata["gps"]["longitude"] == -2.2945
+    assert "errors" not in metadata
+    assert exif_summary(metadata)["DateTime"] == '2024:01:02 03:04:05'
+    print("✅ EXIF and GPS IFDs read")
+    return True
+
+
+def test_sub_ifd_offset_past_end():
+    """An EXIF pointer past the end of the data only loses that IFD"""
+    print("\n=== Testing Sub-IFD Offset Past End ===")
+    data = tiff([(0x010F, 2, 6, offset(tail_offset(2))), (0x8769, 4, 1, offset(5000))], tail=MAKE)
+    metadata = read_metadata_bytes(data)
+    print(f"Metadata: {metadata}")
+    assert metadata["exif"] == {"IFD0": {"Make": 'Canon'}}
+    assert metadata["errors"] == ["EXIF: IFD offset 5000 is past the end of the data"]
+    print("✅ IFD0 kept")
+    return True
+
+
+def test_truncated_ifd():
+    """An IFD declaring more entries than the data holds keeps the complete ones"""
+    print("\n=== Testing Truncated IFD ===")
+    exposure = tail_offset(2) + len(MAKE)
+    exif_ifd = exposure + 8
+    # The EXIF IFD declares two entries but the data ends halfway through the second
+    exif_entries = struct.pack('<H', 2) + struct.pack('<HHI', 0x829A, 5, 1) + offset(exposure) + b'\x00' * 6
+    data = tiff([(0x010F, 2, 6, offset(tail_offset(2))), (0x8769, 4, 1, offset(exif_ifd))],
+                tail=MAKE + struct.pack('<2I', 1, 250) + exif_entries)
+    metadata = read_metadata_bytes(data)
+    print(f"Metadata: {metadata}")
+    assert metadata["exif"]["IFD0"] == {"Make": 'Canon'}
+    assert metadata["exif"]["Exif"] == {"ExposureTime": 0.004}
+    assert metadata["errors"] == [f"EXIF: IFD at offset {exif_ifd} truncated to 1 of 2 entries"]
+    print("✅ Complete entries of a truncated IFD kept")
+    return True
+
+
+def test_value_offset_past_end():
+    """Entries whose value lies past the end of the data are skipped"""
+    print("\n=== Testing Value Offset Past End ===")
+    data = tiff([(0x010F, 2, 6, offset(tail_offset(2))), (0x0110, 2, 32, offset(9000))], tail=MAKE)
+    metadata = read_metadata_bytes(data)
+    print(f"Metadata: {metadata}")
+    assert metadata["exif"] == {"IFD0": {"Make": 'Canon'}}
+    assert "errors" not in metadata
+    print("✅ Out-of-range value skipped")
+    return True
+
+
+def test_ifd_cycle():
+    """An IFD chain pointing back to itself is followed once"""
+    print("\n=== Testing IFD Cycle ===")
+    data = tiff([(0x010F, 2, 6, offset(tail_offset(2))), (0x8769, 4, 1, offset(8))], next_ifd=8, tail=MAKE)
+    metadata = read_metadata_bytes(data)
+    print(f"Metadata: {metadata}")
+    assert metadata["exif"] == {"IFD0": {"Make": 'Canon'}}
+    print("✅ Cycle stopped")
+    return True
+
+
+def test_truncated_jpeg():
+    """Every prefix of a JPEG with EXIF parses without raising"""
+    print("\n=== Testing Truncated JPEG ===")
+    exif = Image.Exif()
+    exif[0x010F] = 'Canon'
+    exif.get_ifd(0x8769)[0x829A] = IFDRational(1, 250)
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8)).save(buffer, 'JPEG', exif=exif)
+    data = buffer.getvalue()
+    for end in range(len(data)):
+        metadata = read_metadata_bytes(data[:end])
+        assert metadata is None or isinstance(metadata, dict)
+    print(f"✅ {len(data)} prefixes parsed")
+    return True
+
+
+def main():
+    """Main test function"""
+    print("Testing SectoolBox image metadata parsing")
+    print("=" * 80)
+
+    results = {}
+    results["EXIF IFDs"] = test_exif_ifds()
+    results["Sub-IFD Offset Past End"] = test_sub_ifd_offset_past_end()
+    results["Truncated IFD"] = test_truncated_ifd()
+    results["Value Offset Past End"] = test_value_offset_past_end()
+    results["IFD Cycle"] = test_ifd_cycle()
+    results["Truncated JPEG"] = test_truncated_jpeg()
+
+    print("\n" + "=" * 80)
+    print("TEST RESULTS SUMMARY")
+    print("=" * 80)
+
+    all_passed = True
+    for test_name, passed in results.items():
+        status = "✅ PASSED" if passed else "❌ FAILED"
+        print(f"{test_name}: {status}")
+        if not passed:
+            all_passed = False
+
+    print("\nOVERALL RESULT:", "✅ ALL TESTS PASSED" if all_passed else "❌ SOME TESTS FAILED")
+    print("=" * 80)
+
+    return 0 if all_passed else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
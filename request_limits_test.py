@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+SectoolBox Request Size Limit Test Script
+Tests RequestSizeLimitMiddleware on declared and chunked request bodies
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from security import RequestSizeLimitMiddleware
+
+LIMIT = 1024
+
+app = FastAPI()
+app.add_middleware(RequestSizeLimitMiddleware, route_limits={'/upload': LIMIT}, default_limit=64)
+
+
+@app.post("/upload")
+async def upload(request: Request):
+    return {"received": len(await request.body())}
+
+
+@app.post("/echo")
+async def echo(request: Request):
+    return {"received": len(await request.body())}
+
+
+client = TestClient(app)
+
+
+def chunks(total, size=256):
+    """Yield a body without a Content-Length so it is sent chunked"""
+    for offset in range(0, total, size):
+        yield b"A" * min(size, total - offset)
+
+
+def test_body_within_limit():
+    """Bodies up to the route limit reach the handler"""
+    print("\n=== Testing Body Within Limit ===")
+    response = client.post("/upload", content=b"A" * LIMIT)
+    print(f"Status Code: {response.status_code}")
+    assert response.status_code == 200
+    assert response.json() == {"received": LIMIT}
+    response = client.post("/upload", content=chunks(LIMIT))
+    assert response.status_code == 200
+    print("✅ Bodies within the limit are accepted")
+    return True
+
+
+def test_content_length_over_limit():
+    """A declared Content-Length over the limit is rejected with 413"""
+    print("\n=== Testing Content-Length Over Limit ===")
+    response = client.post("/upload", content=b"A" * (LIMIT + 1))
+    print(f"Status Code: {response.status_code}")
+    assert response.status_code == 413
+    print("✅ Oversized declared body rejected")
+    return True
+
+
+def test_chunked_body_over_limit():
+    """A chunked body is rejected with 413 once it crosses the limit"""
+    print("\n=== Testing Chunked Body Over Limit ===")
+    response = client.post("/upload", content=chunks(LIMIT * 4))
+    print(f"Status Code: {response.status_code}")
+    assert "content-length" not in response.request.headers
+    assert response.status_code == 413
+    print("✅ Oversized chunked body rejected")
+    return True
+
+
+def test_default_limit():
+    """Routes without their own limit use the default one"""
+    print("\n=== Testing Default Limit ===")
+    assert client.post("/echo", content=b"A" * 64).status_code == 200
+    assert client.post("/echo/", content=b"A" * 65).status_code == 413
+    print("✅ Default limit applied to other routes")
+    return True
+
+
+def main():
+    """Main test function"""
+    print("Testing SectoolBox request size limits")
+    print("=" * 80)
+
+    results = {}
+    results["Body Within Limit"] = test_body_within_limit()
+    results["Content-Length Over Limit"] = test_content_length_over_limit()
+    results["Chunked Body Over Limit"] = test_chunked_body_over_limit()
+    results["Default Limit"] = test_default_limit()
+
+    print("\n" + "=" * 80)
+    print("TEST RESULTS SUMMARY")
+    print("=" * 80)
+
+    all_passed = True
+    for test_name, passed in results.items():
+        status = "✅ PASSED" if passed else "❌ FAILED"
+        print(f"{test_name}: {status}")
+        if not passed:
+            all_passed = False
+
+    print("\nOVERALL RESULT:", "✅ ALL TESTS PASSED" if all_passed else "❌ SOME TESTS FAILED")
+    print("=" * 80)
+
+    return 0 if all_passed else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
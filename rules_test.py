@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+SectoolBox Detection Rules Test Script
+Tests compiling and matching YARA-style rules, without a running server
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from rules import RuleSet, RuleSyntaxError, rules_digest
+
+
+def compile_rules(source):
+    files = (('test.yar', source),)
+    return RuleSet(files, rules_digest(files))
+
+
+def matched(rule_set, data):
+    return [match['rule'] for match in rule_set.match(data)]
+
+
+def test_hex_jumps():
+    """Hex strings with fixed, ranged and unbounded jumps and wildcards"""
+    print("\n=== Testing Hex Jumps ===")
+    rule_set = compile_rules('''
+        rule Fixed { strings: $a = { 4D 5A [2] 90 } condition: $a }
+        rule Ranged { strings: $a = { 6A 40 [1-3] 68 ?? 30 } condition: $a }
+        rule Unbounded { strings: $a = { DE AD [4-] BE EF } condition: $a }
+    ''')
+    assert matched(rule_set, b'xxMZ\x01\x02\x90yy') == ['Fixed']
+    assert matched(rule_set, b'MZ\x01\x90') == []
+    assert matched(rule_set, b'\x6a\x40\x00\x00\x68\x11\x30') == ['Ranged']
+    assert matched(rule_set, b'\x6a\x40\x68\x11\x30') == []
+    assert matched(rule_set, b'\x6a\x40\x00\x00\x00\x00\x68\x11\x30') == []
+    assert matched(rule_set, b'\xde\xad' + b'\x00' * 1000 + b'\xbe\xef') == ['Unbounded']
+    assert matched(rule_set, b'\xde\xad\x00\x00\x00\xbe\xef') == []
+
+    match = rule_set.match(b'--\x6a\x40\x01\x68\x22\x30--')[0]
+    print(f"Match: {match}")
+    assert match['strings'][0]['matches'][0]['offset'] == 2
+    assert match['strings'][0]['matches'][0]['length'] == 6
+    print("✅ Hex jumps matched")
+    return True
+
+
+def test_nocase():
+    """nocase strings match any case, in ASCII and wide forms"""
+    print("\n=== Testing nocase ===")
+    rule_set = compile_rules('''
+        rule Ascii { strings: $a = "invoke-expression" nocase condition: $a }
+        rule Wide { strings: $a = "CmD.eXe" nocase wide condition: $a }
+        rule CaseSensitive { strings: $a = "Invoke-Expression" condition: $a }
+    ''')
+    assert matched(rule_set, b'x INVOKE-Expression y') == ['Ascii']
+    assert matched(rule_set, b'Invoke-Expression') == ['Ascii', 'CaseSensitive']
+    assert matched(rule_set, 'run cmd.EXE now'.encode('utf-16le')) == ['Wide']
+    assert matched(rule_set, b'run cmd.EXE now') == []
+    print("✅ nocase strings matched")
+    return True
+
+
+def test_at_and_counts():
+    """at anchors a string to an offset; # and @ give its count and match offsets"""
+    print("\n=== Testing at ===")
+    rule_set = compile_rules('''
+        rule AtZero { strings: $mz = "MZ" condition: $mz at 0 }
+        rule AtOffset { strings: $pe = "PE\\x00\\x00" condition: $pe at 0x80 }
+        rule SecondMatch { strings: $a = "flag" condition: #a >= 2 and @a[2] == 10 }
+    ''')
+    pe = b'MZ' + b'\x00' * 0x7e + b'PE\x00\x00'
+    assert matched(rule_set, pe) == ['AtZero', 'AtOffset']
+    assert matched(rule_set, b'\x00' + pe) == []
+    assert matched(rule_set, b'flag......flag') == ['SecondMatch']
+    assert matched(rule_set, b'flag.......flag') == []
+    print("✅ at and match offsets applied")
+    return True
+
+
+def test_syntax_errors():
+    """Invalid rules are rejected with their location"""
+    print("\n=== Testing Syntax Errors ===")
+    for source in ('rule Broken { condition: nope }', 'rule A { strings: $a = { 4D ZZ } condition: $a }'):
+        try:
+            compile_rules(source)
+        except RuleSyntaxError as e:
+            print(f"Error: {e}")
+            assert str(e).startswith('test.yar:')
+        else:
+            raise AssertionError(f"compiled: {source}")
+    print("✅ Invalid rules rejected")
+    return True
+
+
+def main():
+    """Main test function"""
+    print("Testing SectoolBox detection rules")
+    print("=" * 80)
+
+    results = {}
+    results["Hex Jumps"] = test_hex_jumps()
+    results["nocase"] = test_nocase()
+    results["at"] = test_at_and_counts()
+    results["Syntax Errors"] = test_syntax_errors()
+
+    print("\n" + "=" * 80)
+    print("TEST RESULTS SUMMARY")
+    print("=" * 80)
+
+    all_passed = True
+    for test_name, passed in results.items():
+        status = "✅ PASSED" if passed else "❌ FAILED"
+        print(f"{test_name}: {status}")
+        if not passed:
+            all_passed = False
+
+    print("\nOVERALL RESULT:", "✅ ALL TESTS PASSED" if all_passed else "❌ SOME TESTS FAILED")
+    print("=" * 80)
+
+    return 0 if all_passed else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+SectoolBox Script Pattern Test Script
+Tests the single-pass script content scanner directly, without a running server
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from security import ScriptContentScanner
+
+
+def scan(data, chunk_size=None, **kwargs):
+    scanner = ScriptContentScanner(**kwargs)
+    chunk_size = chunk_size or len(data) or 1
+    for offset in range(0, len(data), chunk_size):
+        scanner.feed(data[offset:offset + chunk_size])
+    return [(match['offset'], match['pattern']) for match in scanner.matches]
+
+
+def test_offsets_and_case():
+    """Every pattern is found case-insensitively at its offset"""
+    print("\n=== Testing Pattern Offsets ===")
+    data = b'<p>hi</p><SCRIPT>x</script> href="JavaScript:go()" <?PHP echo ${a}; eval(b) <% %>'
+    found = scan(data)
+    print(f"Matches: {found}")
+    assert found == [(9, '<script'), (34, 'javascript:'), (51, '<?php'), (62, '${'),
+                     (68, 'eval('), (76, '<%')]
+    assert all(data[offset:offset + len(pattern)].lower() == pattern.encode()
+               for offset, pattern in found)
+    print("✅ Patterns found at their offsets")
+    return True
+
+
+def test_chunk_boundaries():
+    """Patterns split across chunks are found once, as in a single pass"""
+    print("\n=== Testing Chunk Boundaries ===")
+    data = (b'xx<script>vbscript:yy${z}<?php' * 40) + b'javascript:'
+    expected = scan(data)
+    for chunk_size in (1, 2, 5, 7, 64, 1000):
+        assert scan(data, chunk_size) == expected, f"chunk size {chunk_size}"
+    print(f"✅ {len(expected)} matches found identically for every chunk size")
+    return True
+
+
+def test_max_matches():
+    """Scanning stops once max_matches matches are kept"""
+    print("\n=== Testing Match Limit ===")
+    data = b'eval(' * 50
+    found = scan(data, 7, max_matches=10)
+    print(f"Matches: {len(found)}, last at {found[-1][0]}")
+    assert found == [(offset * 5, 'eval(') for offset in range(10)]
+    assert scan(b'plain text only') == []
+    print("✅ Matches limited")
+    return True
+
+
+def main():
+    """Main test function"""
+    print("Testing SectoolBox script content scanning")
+    print("=" * 80)
+
+    results = {}
+    results["Pattern Offsets"] = test_offsets_and_case()
+    results["Chunk Boundaries"] = test_chunk_boundaries()
+    results["Match Limit"] = test_max_matches()
+
+    print("\n" + "=" * 80)
+    print("TEST RESULTS SUMMARY")
+    print("=" * 80)
+
+    all_passed = True
+    for test_name, passed in results.items():
+        status = "✅ PASSED" if passed else "❌ FAILED"
+        print(f"{test_name}: {status}")
+        if not passed:
+            all_passed = False
+
+    print("\nOVERALL RESULT:", "✅ ALL TESTS PASSED" if all_passed else "❌ SOME TESTS FAILED")
+    print("=" * 80)
+
+    return 0 if all_passed else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -552,6 +552,54 @@ def test_error_handling():
         print("\n❌ Error handling has security issues")
         return False
 
+def test_request_size_limits():
+    """Test that oversized request bodies are rejected with 413"""
+    print("\n=== Testing Request Size Limits ===")
+    
+    results = {}
+    oversized = 2 * 1024 * 1024  # Over the 1MB limit on JSON endpoints
+    headers = {"Content-Type": "application/json"}
+    
+    # 1. Declared Content-Length over the limit
+    print("\nTesting oversized Content-Length...")
+    response = requests.post(f"{API_URL}/announcements", data=b"A" * oversized, headers=headers)
+    print(f"Status Code: {response.status_code}")
+    if response.status_code == 413:
+        print("✅ Oversized request rejected before reaching the endpoint")
+        results["content_length"] = True
+    else:
+        print(f"❌ Unexpected status code for oversized request: {response.status_code}")
+        results["content_length"] = False
+    
+    # 2. Chunked body without a Content-Length
+    print("\nTesting oversized chunked body...")
+    
+    def chunks():
+        for _ in range(oversized // 65536):
+            yield b"A" * 65536
+    
+    try:
+        response = requests.post(f"{API_URL}/announcements", data=chunks(), headers=headers)
+        print(f"Status Code: {response.status_code}")
+        results["chunked"] = response.status_code == 413
+    except requests.exceptions.ConnectionError:
+        # The server may close the connection while the client is still sending
+        print("Connection closed by server while sending")
+        results["chunked"] = True
+    
+    if results["chunked"]:
+        print("✅ Oversized chunked request rejected")
+    else:
+        print("❌ Oversized chunked request was not rejected")
+    
+    # Overall result
+    if all(results.values()):
+        print("\n✅ Request size limits are enforced")
+        return True
+    else:
+        print("\n❌ Request size limits are not enforced")
+        return False
+
 def test_security_logging():
     """Test that security events are being logged properly"""
     print("\n=== Testing Security Logging ===")
@@ -647,6 +695,9 @@ def main():
     # Test error handling
     results["Error Handling"] = test_error_handling()
     
+    # Test request size limits
+    results["Request Size Limits"] = test_request_size_limits()
+    
     # Test security logging
     results["Security Logging"] = test_security_logging()
     
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+SectoolBox Segmented Analysis Test Script
+Tests that segments analyzed separately merge into the same report as one pass
+"""
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+import analysis
+from analysis import (ANALYSIS_CHUNK_SIZE, analyze_format, analyze_path, analyze_segment,
+                      hash_path, merge_segments, plan_segments)
+
+
+def mixed_file():
+    """A few MB of random, text, UTF-16 and repeated data with runs crossing chunk edges"""
+    rng = random.Random(3)
+    data = bytearray(b'%PDF-1.4\n')
+    while len(data) < 6 * ANALYSIS_CHUNK_SIZE + 12345:
+        kind = rng.random()
+        if kind < 0.3:
+            data += rng.randbytes(rng.randint(1, 200000))
+        elif kind < 0.6:
+            data += ('héllo wörld <script>eval(x)</script> http://example.com/a '
+                     * rng.randint(1, 2000)).encode()
+        elif kind < 0.8:
+            data += ('wide text ' * rng.randint(1, 2000)).encode('utf-16le')
+        else:
+            data += b'A' * rng.randint(1, 100000) + b'\x00'
+    with tempfile.NamedTemporaryFile(delete=False) as f:
+        f.write(data)
+    return f.name
+
+
+def segmented(path, parts):
+    """analyze_path's report built from per-segment results, as the server does"""
+    segments = plan_segments(os.path.getsize(path), parts)
+    results = [analyze_segment(path, start, end) for start, end in segments]
+    return merge_segments(hash_path(path), analyze_format(path), results), segments
+
+
+def test_plan_segments():
+    """Segments are chunk-aligned, cover the whole file and respect the minimum size"""
+    print("\n=== Testing Segment Planning ===")
+    size = 100 * ANALYSIS_CHUNK_SIZE + 17
+    for parts in (1, 2, 3, 4, 7):
+        segments = plan_segments(size, parts)
+        assert segments[0][0] == 0 and segments[-1][1] == size
+        assert all(end == next_start for (_, end), (next_start, _) in zip(segments, segments[1:]))
+        assert all(start % ANALYSIS_CHUNK_SIZE == 0 for start, _ in segments)
+        assert len(segments) <= parts
+    assert plan_segments(analysis.MIN_SEGMENT_SIZE, 4) == [(0, analysis.MIN_SEGMENT_SIZE)]
+    assert plan_segments(0, 4) == []
+    print(f"Segments of 4: {plan_segments(size, 4)}")
+    print("✅ Segments planned")
+    return True
+
+
+def test_merged_report_matches():
+    """Merging segment results gives exactly the report of analyze_path"""
+    print("\n=== Testing Segment Merge ===")
+    min_segment_size = analysis.MIN_SEGMENT_SIZE
+    path = mixed_file()
+    try:
+        analysis.MIN_SEGMENT_SIZE = ANALYSIS_CHUNK_SIZE
+        expected = analyze_path(path)
+        for parts in (2, 3, 4):
+            report, segments = segmented(path, parts)
+            differences = [key for key in expected if report.get(key) != expected[key]]
+            print(f"{len(segments)} segments: {differences or 'identical'}")
+            assert len(segments) == parts
+            assert report.keys() == expected.keys()
+            assert not differences
+    finally:
+        analysis.MIN_SEGMENT_SIZE = min_segment_size
+        os.unlink(path)
+    print(f"✅ Merged reports match ({expected['strings_count']} strings)")
+    return True
+
+
+def main():
+    """Main test function"""
+    print("Testing SectoolBox segmented analysis")
+    print("=" * 80)
+
+    results = {}
+    results["Segment Planning"] = test_plan_segments()
+    results["Segment Merge"] = test_merged_report_matches()
+
+    print("\n" + "=" * 80)
+    print("TEST RESULTS SUMMARY")
+    print("=" * 80)
+
+    all_passed = True
+    for test_name, passed in results.items():
+        status = "✅ PASSED" if passed else "❌ FAILED"
+        print(f"{test_name}: {status}")
+        if not passed:
+            all_passed = False
+
+    print("\nOVERALL RESULT:", "✅ ALL TESTS PASSED" if all_passed else "❌ SOME TESTS FAILED")
+    print("=" * 80)
+
+    return 0 if all_passed else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+SectoolBox String Extraction Test Script
+Tests the multi-encoding string extractor directly, without a running server
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from strings import StringExtractor, extract_strings
+
+
+def values(strings):
+    return [(entry['offset'], entry['encoding'], entry['value']) for entry in strings]
+
+
+def test_ascii_before_utf16_overlap():
+    """An ASCII run trimmed against an overlapping UTF-16 run keeps all its characters"""
+    print("\n=== Testing ASCII/UTF-16 Overlap ===")
+    found = values(extract_strings(b'\x01hello' + 'world'.encode('utf-16le') + b'\x01'))
+    print(f"Strings: {found}")
+    assert found == [(1, 'ascii', 'hello'), (6, 'utf-16le', 'world')]
+    print("✅ Overlapping runs are split without losing characters")
+    return True
+
+
+def test_utf8_overlap_keeps_whole_characters():
+    """A UTF-8 run trimmed against a UTF-16 run never ends inside a multi-byte character"""
+    print("\n=== Testing UTF-8/UTF-16 Overlap ===")
+    found = values(extract_strings(b'\x01caf\xc3\xa9' + 'world'.encode('utf-16le') + b'\x01'))
+    print(f"Strings: {found}")
+    assert found == [(1, 'utf-8', 'café'), (6, 'utf-16le', 'world')]
+    print("✅ UTF-8 runs end on a character boundary")
+    return True
+
+
+def test_utf16_strings():
+    """UTF-16LE and UTF-16BE strings are found with their offsets"""
+    print("\n=== Testing UTF-16 Strings ===")
+    data = b'\xff\xfe' + 'Wide string'.encode('utf-16le') + b'\x00\x00\xff' + 'Big endian'.encode('utf-16be')
+    found = values(extract_strings(data))
+    print(f"Strings: {found}")
+    assert (2, 'utf-16le', 'Wide string') in found
+    assert (27, 'utf-16be', 'Big endian') in found
+    print("✅ UTF-16 strings found in both byte orders")
+    return True
+
+
+def test_min_length():
+    """Runs shorter than min_length are not reported"""
+    print("\n=== Testing Minimum Length ===")
+    found = values(extract_strings(b'abc\x00abcd\x00', min_length=4))
+    print(f"Strings: {found}")
+    assert found == [(4, 'ascii', 'abcd')]
+    print("✅ Short runs are skipped")
+    return True
+
+
+def test_chunked_feed_matches_single_pass():
+    """Feeding a buffer in small chunks gives the same strings as one pass"""
+    print("\n=== Testing Chunked Extraction ===")
+    data = (b'\x00\x01' + b'plain ascii text' + 'ünïcödé'.encode('utf-8') + b'\x02'
+            + 'wide text here'.encode('utf-16le') + b'\x03') * 50
+    expected = extract_strings(data)
+    for chunk_size in (1, 3, 7, 64):
+        extractor = StringExtractor()
+        for offset in range(0, len(data), chunk_size):
+            extractor.feed(data[offset:offset + chunk_size])
+        assert extractor.finish() == expected, f"chunk size {chunk_size}"
+    print(f"✅ {len(expected)} strings found identically for every chunk size")
+    return True
+
+
+def main():
+    """Main test function"""
+    print("Testing SectoolBox string extraction")
+    print("=" * 80)
+
+    results = {}
+    results["ASCII/UTF-16 Overlap"] = test_ascii_before_utf16_overlap()
+    results["UTF-8/UTF-16 Overlap"] = test_utf8_overlap_keeps_whole_characters()
+    results["UTF-16 Strings"] = test_utf16_strings()
+    results["Minimum Length"] = test_min_length()
+    results["Chunked Extraction"] = test_chunked_feed_matches_single_pass()
+
+    print("\n" + "=" * 80)
+    print("TEST RESULTS SUMMARY")
+    print("=" * 80)
+
+    all_passed = True
+    for test_name, passed in results.items():
+        status = "✅ PASSED" if passed else "❌ FAILED"
+        print(f"{test_name}: {status}")
+        if not passed:
+            all_passed = False
+
+    print("\nOVERALL RESULT:", "✅ ALL TESTS PASSED" if all_passed else "❌ SOME TESTS FAILED")
+    print("=" * 80)
+
+    return 0 if all_passed else 1
+
+if __name__ == "__main__":
+    sys.exit(main())